@@ -5,26 +5,102 @@ Can run on Dataproc without PyFlink dependency
 """
 import os
 import json
+import threading
 import time
 from datetime import datetime
 from google.cloud import pubsub_v1
 from google.cloud import firestore
-from concurrent.futures import ThreadPoolExecutor
-from collections import defaultdict
+
+class CounterShard:
+    """Counts written by one thread in one window"""
+
+    __slots__ = ('window', 'counts', 'lock', 'closed')
+
+    def __init__(self, window):
+        self.window = window
+        self.counts = {}
+        self.lock = threading.Lock()  # Only contended by the window close
+        self.closed = False
+
+class CounterWindow:
+    """The shards of one aggregation window"""
+
+    __slots__ = ('shards', 'lock', 'closed')
+
+    def __init__(self):
+        self.shards = []
+        self.lock = threading.Lock()
+        self.closed = False
+
+class ShardedCounter:
+    """
+    Per-key counts incremented concurrently from many threads.
+
+    Each thread increments its own shard of the current window, so ingestion
+    threads never contend with each other. swap() replaces the window with one
+    reference assignment, then closes and merges the shards of the old one. A
+    thread still holding the old window sees it closed and retries on the new
+    one, so every increment is counted in exactly one window, and publishing a
+    closed window never holds a lock ingestion needs.
+    """
+
+    def __init__(self):
+        self.window = CounterWindow()
+        self.local = threading.local()
+        self.swap_lock = threading.Lock()
+
+    def _shard(self, window):
+        """This thread's shard of `window`, or None once the window is closed"""
+        shard = getattr(self.local, 'shard', None)
+        if shard is not None and shard.window is window:
+            return shard
+        with window.lock:
+            if window.closed:
+                return None
+            shard = CounterShard(window)
+            window.shards.append(shard)
+        self.local.shard = shard
+        return shard
+
+    def add(self, key, amount=1):
+        while True:
+            shard = self._shard(self.window)
+            if shard is None:
+                continue
+            with shard.lock:
+                if not shard.closed:
+                    shard.counts[key] = shard.counts.get(key, 0) + amount
+                    return
+
+    def swap(self):
+        """Start a new window and return the merged counts of the one it replaces"""
+        with self.swap_lock:
+            window = self.window
+            self.window = CounterWindow()
+        with window.lock:
+            window.closed = True
+        totals = {}
+        for shard in window.shards:
+            with shard.lock:
+                shard.closed = True
+            for key, count in shard.counts.items():
+                totals[key] = totals.get(key, 0) + count
+        return totals
 
 class RideAnalyticsProcessor:
     """Process ride events from Pub/Sub and aggregate by city"""
     
-    def __init__(self, project_id, subscription_name, results_topic, firestore_collection):
+    def __init__(self, project_id, subscription_name, results_topic, firestore_collection,
+                 subscriber=None, publisher=None, db=None):
         self.project_id = project_id
         self.subscription_name = subscription_name
         self.results_topic = results_topic
         self.firestore_collection = firestore_collection
         
         # Initialize clients
-        self.subscriber = pubsub_v1.SubscriberClient()
-        self.publisher = pubsub_v1.PublisherClient()
-        self.db = firestore.Client(project=project_id)
+        self.subscriber = subscriber or pubsub_v1.SubscriberClient()
+        self.publisher = publisher or pubsub_v1.PublisherClient()
+        self.db = db or firestore.Client(project=project_id)
         
         # Subscription path
         self.subscription_path = self.subscriber.subscription_path(
@@ -36,8 +112,11 @@ class RideAnalyticsProcessor:
         
         # Aggregation window (1 minute)
         self.window_size = 60  # seconds
-        self.aggregates = defaultdict(int)  # city -> count
+        # city -> count, written from the subscriber's callback threads
+        self.aggregates = ShardedCounter()
         self.last_window_end = time.time()
+        # Windows are closed by one thread at a time, in order
+        self.flush_lock = threading.Lock()
         
     def process_message(self, message):
         """Process a single Pub/Sub message"""
@@ -46,25 +125,31 @@ class RideAnalyticsProcessor:
             city = data.get('city', 'unknown')
             
             # Add to current window aggregate
-            self.aggregates[city] += 1
+            self.aggregates.add(city)
             
             # Acknowledge message
             message.ack()
             
-            print(f"Processed ride event: city={city}")
-            
         except Exception as e:
             print(f"Error processing message: {e}")
             message.nack()
     
     def flush_aggregates(self):
-        """Flush current aggregates to Pub/Sub and Firestore"""
-        if not self.aggregates:
-            return
-        
+        """Close the current window and flush its aggregates to Pub/Sub and Firestore"""
+        with self.flush_lock:
+            # Ingestion continues into the new window while this one is published
+            aggregates = self.aggregates.swap()
+            self.last_window_end = time.time()
+            if not aggregates:
+                return
+            self.publish_window(aggregates)
+    
+    def publish_window(self, aggregates):
+        """Write one closed window: a result per city"""
         window_end = datetime.now().isoformat()
+        print(f"Window closed: {sum(aggregates.values())} ride events in {len(aggregates)} cities")
         
-        for city, count in self.aggregates.items():
+        for city, count in aggregates.items():
             result = {
                 'city': city,
                 'count': count,
@@ -94,10 +179,6 @@ class RideAnalyticsProcessor:
                 print(f"Written to Firestore: {doc_id}")
             except Exception as e:
                 print(f"Error writing to Firestore: {e}")
-        
-        # Clear aggregates for next window
-        self.aggregates.clear()
-        self.last_window_end = time.time()
     
     def run(self):
         """Main processing loop"""
@@ -106,26 +187,18 @@ class RideAnalyticsProcessor:
         print(f"Results Topic: {self.topic_path}")
         print(f"Firestore Collection: {self.firestore_collection}")
         
-        def callback(message):
-            """Callback for Pub/Sub messages"""
-            self.process_message(message)
-            
-            # Check if we should flush aggregates
-            current_time = time.time()
-            if current_time - self.last_window_end >= self.window_size:
-                self.flush_aggregates()
-        
-        # Start streaming pull
+        # Start streaming pull; the callback runs on the subscriber's thread pool and
+        # only counts, windows are closed by the loop below
         streaming_pull_future = self.subscriber.subscribe(
-            self.subscription_path, callback=callback
+            self.subscription_path, callback=self.process_message
         )
         
         print("Listening for messages...")
         
         try:
-            # Keep running and flush aggregates periodically
+            # Keep running and flush aggregates at every window boundary
             while True:
-                time.sleep(self.window_size)
+                time.sleep(max(0.0, self.last_window_end + self.window_size - time.time()))
                 self.flush_aggregates()
         except KeyboardInterrupt:
             print("Stopping processor...")
@@ -0,0 +1,129 @@
+"""
+Stress check for RideAnalyticsProcessor's aggregation under concurrent ingestion.
+
+STRESS_THREADS threads feed STRESS_MESSAGES_PER_THREAD fake ride events each
+through process_message(), as the Pub/Sub callback pool does, while another
+thread closes a window every STRESS_FLUSH_INTERVAL seconds. The clients are
+in-memory fakes that record every published window. Passes only if the sum
+of all published windows equals the number of events sent, exactly, per city,
+and every event was acked once. Exits non-zero otherwise:
+
+    python stress_aggregation.py
+"""
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Future
+
+from ride_analytics_standalone import RideAnalyticsProcessor
+
+STRESS_THREADS = int(os.getenv('STRESS_THREADS', '16'))
+STRESS_MESSAGES_PER_THREAD = int(os.getenv('STRESS_MESSAGES_PER_THREAD', '100000'))
+STRESS_FLUSH_INTERVAL = float(os.getenv('STRESS_FLUSH_INTERVAL', '0.005'))
+STRESS_CITIES = ['Bangalore', 'Mumbai', 'Delhi', 'Hyderabad', 'Chennai', 'Pune', 'Kolkata', 'Jaipur']
+
+class FakeMessage:
+    __slots__ = ('data', 'acks')
+
+    def __init__(self, data, acks):
+        self.data = data
+        self.acks = acks
+
+    def ack(self):
+        self.acks[0] += 1  # Only the owning thread touches its own acks list
+
+    def nack(self):
+        raise AssertionError('message was nacked')
+
+class FakePublisher:
+    """Records published windows instead of sending them"""
+
+    def __init__(self):
+        self.results = []
+
+    def topic_path(self, project_id, topic):
+        return f'projects/{project_id}/topics/{topic}'
+
+    def publish(self, topic_path, data):
+        self.results.append(json.loads(data))
+        future = Future()
+        future.set_result('message-id')
+        return future
+
+class FakeSubscriber:
+    def subscription_path(self, project_id, subscription):
+        return f'projects/{project_id}/subscriptions/{subscription}'
+
+class FakeDocument:
+    def set(self, document):
+        pass
+
+class FakeFirestore:
+    def collection(self, name):
+        return self
+
+    def document(self, doc_id):
+        return FakeDocument()
+
+def main():
+    publisher = FakePublisher()
+    processor = RideAnalyticsProcessor(
+        'stress', 'rides', 'results', 'ride_analytics',
+        subscriber=FakeSubscriber(), publisher=publisher, db=FakeFirestore()
+    )
+    payloads = [json.dumps({'city': city}).encode('utf-8') for city in STRESS_CITIES]
+    acks = [[0] for _ in range(STRESS_THREADS)]
+    expected = {city: 0 for city in STRESS_CITIES}
+    for thread in range(STRESS_THREADS):
+        for i in range(STRESS_MESSAGES_PER_THREAD):
+            expected[STRESS_CITIES[(thread + i) % len(STRESS_CITIES)]] += 1
+
+    def ingest(thread):
+        for i in range(STRESS_MESSAGES_PER_THREAD):
+            processor.process_message(FakeMessage(payloads[(thread + i) % len(payloads)], acks[thread]))
+
+    done = threading.Event()
+    windows = [0]
+
+    def flusher():
+        while not done.is_set():
+            time.sleep(STRESS_FLUSH_INTERVAL)
+            processor.flush_aggregates()
+            windows[0] += 1
+
+    threads = [threading.Thread(target=ingest, args=(thread,)) for thread in range(STRESS_THREADS)]
+    flush_thread = threading.Thread(target=flusher)
+    start = time.perf_counter()
+    flush_thread.start()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    done.set()
+    flush_thread.join()
+    processor.flush_aggregates()
+
+    counted = {city: 0 for city in STRESS_CITIES}
+    for result in publisher.results:
+        counted[result['city']] += result['count']
+    total = STRESS_THREADS * STRESS_MESSAGES_PER_THREAD
+    acked = sum(ack[0] for ack in acks)
+
+    print(f'{total} events from {STRESS_THREADS} threads in {elapsed:.2f}s ({total / elapsed:,.0f} events/s), '
+          f'{windows[0] + 1} windows, {len(publisher.results)} results published')
+    failures = [
+        f'{city}: expected {expected[city]}, published {counted[city]}'
+        for city in STRESS_CITIES if counted[city] != expected[city]
+    ]
+    if acked != total:
+        failures.append(f'acked {acked} of {total} events')
+    if failures:
+        print('\n'.join(failures))
+        sys.exit(1)
+    print('All counts exact')
+
+if __name__ == '__main__':
+    main()
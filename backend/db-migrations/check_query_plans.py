@@ -0,0 +1,185 @@
+"""
+Query-plan regression check for the hot endpoint queries.
+
+Applies all migrations to the target database, seeds a synthetic dataset
+(PLAN_CHECK_RIDES rows, default 500k), then for every query below asserts
+that EXPLAIN uses the expected index, never sequentially scans the large
+tables, and that p95 latency stays inside its budget. Exits non-zero on
+any regression. Everything happens in a scratch database (PLAN_CHECK_DB,
+created next to DB_NAME and dropped afterwards, so the user needs CREATEDB);
+the tables of DB_NAME itself are never touched. Point it at a local
+Postgres, e.g. the one in docker-compose-test.yml:
+
+    DB_HOST=localhost python check_query_plans.py
+"""
+import os
+import sys
+import time
+import psycopg
+from psycopg import sql as pgsql
+from psycopg.conninfo import conninfo_to_dict, make_conninfo
+
+from migrate import get_conninfo, migrate
+
+PLAN_CHECK_RIDES = int(os.getenv("PLAN_CHECK_RIDES", "500000"))
+PLAN_CHECK_RUNS = int(os.getenv("PLAN_CHECK_RUNS", "50"))
+PLAN_CHECK_DB = os.getenv("PLAN_CHECK_DB", f"plan_check_{os.getpid()}")
+SEED_CITIES = ["Bangalore", "Mumbai", "Delhi", "Hyderabad", "Chennai", "Pune", "Kolkata", "Jaipur"]
+
+RIDE_COLUMNS = "id, rider_id, driver_id, pickup, drop_location, city, status, created_at"
+
+# (name, sql, params, expected index or None, tables that must not be seq-scanned, p95 budget ms)
+HOT_QUERIES = [
+    ("ride_by_id",
+     f"SELECT {RIDE_COLUMNS} FROM rides WHERE id = %s",
+     (12345,), "rides_pkey", ["rides"], 5),
+    ("rides_first_page",
+     f"SELECT {RIDE_COLUMNS} FROM rides ORDER BY created_at DESC, id DESC LIMIT 51",
+     (), "idx_rides_created_at_id", ["rides"], 10),
+    ("rides_next_page",
+     f"SELECT {RIDE_COLUMNS} FROM rides WHERE (created_at, id) < (LOCALTIMESTAMP - INTERVAL '30 days', %s) "
+     "ORDER BY created_at DESC, id DESC LIMIT 51",
+     (2 ** 31 - 1,), "idx_rides_created_at_id", ["rides"], 10),
+    ("rides_by_city",
+     f"SELECT {RIDE_COLUMNS} FROM rides WHERE city = %s ORDER BY created_at DESC, id DESC LIMIT 51",
+     ("Pune",), "idx_rides_city_created_at", ["rides"], 10),
+    ("rides_by_rider",
+     f"SELECT {RIDE_COLUMNS} FROM rides WHERE rider_id = %s ORDER BY created_at DESC, id DESC LIMIT 51",
+     (42,), "idx_rides_rider_created_at", ["rides"], 10),
+    ("rides_by_driver",
+     f"SELECT {RIDE_COLUMNS} FROM rides WHERE driver_id = %s ORDER BY created_at DESC, id DESC LIMIT 51",
+     (7,), "idx_rides_driver_created_at", ["rides"], 10),
+    # Same statement as RideAnalytics.resync in ride-service, with its default bucket and window
+    ("analytics_resync",
+     "SELECT city, "
+     "FLOOR(EXTRACT(EPOCH FROM (LOCALTIMESTAMP - created_at)) / %s)::int AS age, "
+     "COUNT(*) "
+     "FROM rides "
+     "WHERE created_at >= LOCALTIMESTAMP - %s * INTERVAL '1 second' "
+     "GROUP BY 1, 2",
+     (1, 3600), "idx_rides_created_at_id", ["rides"], 50),
+    ("outbox_pending",
+     "SELECT id, city, payload FROM ride_outbox WHERE delivered_at IS NULL "
+     "AND next_attempt_at <= CURRENT_TIMESTAMP ORDER BY id LIMIT 100",
+     (), None, ["ride_outbox"], 10),
+    ("driver_by_id",
+     "SELECT id, user_id, vehicle_number, vehicle_type, license_number, status FROM drivers WHERE id = %s",
+     (123,), "drivers_pkey", ["drivers"], 5),
+    ("drivers_by_ids",
+     "SELECT id, user_id, vehicle_number, vehicle_type, license_number, status, lat, lon "
+     "FROM drivers WHERE id = ANY(%s)",
+     (list(range(1, 1000, 7)),), "drivers_pkey", ["drivers"], 5),
+    ("drivers_online",
+     "SELECT id, status, lat, lon FROM drivers WHERE status = 'online' AND lat IS NOT NULL",
+     (), "idx_drivers_status", ["drivers"], 20),
+    ("supply_reconcile",
+     "SELECT city, status, COUNT(*) FROM drivers WHERE status = ANY(%s) GROUP BY city, status",
+     (["online", "busy"],), "idx_drivers_status", ["drivers"], 20),
+    ("drivers_changed_since",
+     "SELECT id, status, lat, lon FROM drivers WHERE updated_at > LOCALTIMESTAMP - INTERVAL '10 seconds'",
+     (), "idx_drivers_updated_at", ["drivers"], 5),
+    ("user_login",
+     "SELECT id, name, email, user_type, city, password FROM users WHERE email = %s",
+     ("user4242@example.com",), "users_email_key", ["users"], 5),
+    ("user_by_id",
+     "SELECT id, name, email, user_type, city FROM users WHERE id = %s",
+     (4242,), "users_pkey", ["users"], 5),
+]
+
+def seed(conn, rides):
+    """Replace table contents with a synthetic dataset sized relative to PLAN_CHECK_RIDES"""
+    if conn.info.dbname != PLAN_CHECK_DB:
+        raise RuntimeError(f"Refusing to seed {conn.info.dbname}: only the scratch database {PLAN_CHECK_DB} is truncated")
+    users = max(rides // 10, 1000)
+    drivers = max(rides // 50, 100)
+    with conn.transaction():
+        conn.execute("TRUNCATE users, cities, drivers, rides, ride_outbox RESTART IDENTITY")
+        conn.execute("""
+            INSERT INTO users (name, email, password, user_type, city)
+            SELECT 'User ' || g, 'user' || g || '@example.com', 'x',
+                   CASE WHEN g %% 10 = 0 THEN 'driver' ELSE 'rider' END,
+                   (%s::text[])[1 + g %% %s]
+            FROM generate_series(1, %s) g
+        """, (SEED_CITIES, len(SEED_CITIES), users))
+        conn.execute("INSERT INTO cities (name) SELECT unnest(%s::text[])", (SEED_CITIES,))
+        conn.execute("""
+            INSERT INTO drivers (user_id, vehicle_number, vehicle_type, license_number, status, lat, lon, updated_at)
+            SELECT g * 10, 'KA01-' || g, 'sedan', 'LIC' || g,
+                   CASE WHEN g %% 20 = 0 THEN 'online' ELSE 'offline' END,
+                   12.9 + random() * 0.3, 77.5 + random() * 0.3,
+                   LOCALTIMESTAMP - (random() * 30) * INTERVAL '1 day'
+            FROM generate_series(1, %s) g
+        """, (drivers,))
+        conn.execute("""
+            INSERT INTO rides (rider_id, driver_id, pickup, drop_location, city, status, created_at)
+            SELECT 1 + g %% %s, 1 + g %% %s, 'Pickup ' || g, 'Drop ' || g,
+                   (%s::text[])[1 + g %% %s], 'started',
+                   LOCALTIMESTAMP - (random() * 90) * INTERVAL '1 day'
+            FROM generate_series(1, %s) g
+        """, (users, drivers, SEED_CITIES, len(SEED_CITIES), rides))
+        conn.execute("""
+            INSERT INTO ride_outbox (event_type, city, payload, delivered_at)
+            SELECT 'ride_started', city, jsonb_build_object('ride_id', id), created_at
+            FROM rides
+        """)
+    for table in ("users", "cities", "drivers", "rides", "ride_outbox"):
+        conn.execute(f"ANALYZE {table}")
+
+def plan_nodes(node):
+    yield node
+    for child in node.get("Plans", []):
+        yield from plan_nodes(child)
+
+def check_query(conn, name, sql, params, expected_index, no_seq_scan, budget_ms):
+    """Return a list of failure messages for one query"""
+    failures = []
+    plan = conn.execute(f"EXPLAIN (FORMAT JSON) {sql}", params).fetchone()[0][0]["Plan"]
+    nodes = list(plan_nodes(plan))
+
+    for node in nodes:
+        if node["Node Type"] == "Seq Scan" and node.get("Relation Name") in no_seq_scan:
+            failures.append(f"{name}: sequential scan on {node['Relation Name']}")
+    if expected_index and not any(node.get("Index Name") == expected_index for node in nodes):
+        used = sorted({node["Index Name"] for node in nodes if "Index Name" in node}) or ["no index"]
+        failures.append(f"{name}: expected {expected_index}, plan used {', '.join(used)}")
+
+    timings = []
+    for _ in range(PLAN_CHECK_RUNS):
+        start = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    if p95 > budget_ms:
+        failures.append(f"{name}: p95 {p95:.2f} ms exceeds budget of {budget_ms} ms")
+
+    print(f"{'FAIL' if failures else 'ok':4} {name:20} p95={p95:7.2f} ms (budget {budget_ms} ms)")
+    return failures
+
+def main():
+    conninfo = get_conninfo()
+    if conninfo_to_dict(conninfo).get("dbname") == PLAN_CHECK_DB:
+        sys.exit("PLAN_CHECK_DB must differ from DB_NAME")
+    scratch = make_conninfo(conninfo, dbname=PLAN_CHECK_DB)
+    with psycopg.connect(conninfo, autocommit=True) as admin:
+        admin.execute(pgsql.SQL("CREATE DATABASE {}").format(pgsql.Identifier(PLAN_CHECK_DB)))
+    try:
+        with psycopg.connect(scratch) as conn:
+            migrate(conn)
+            print(f"Seeding {PLAN_CHECK_RIDES} rides into scratch database {PLAN_CHECK_DB}...")
+            seed(conn, PLAN_CHECK_RIDES)
+
+            failures = []
+            for query in HOT_QUERIES:
+                failures.extend(check_query(conn, *query))
+    finally:
+        with psycopg.connect(conninfo, autocommit=True) as admin:
+            admin.execute(pgsql.SQL("DROP DATABASE IF EXISTS {}").format(pgsql.Identifier(PLAN_CHECK_DB)))
+
+    if failures:
+        print("\n".join(failures))
+        sys.exit(1)
+    print("All query plans and latency budgets OK")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Versioned schema migrations for the ride booking database.
+
+Applies versions/NNNN_description.sql in order and records each one in
+schema_migrations. Runs once per deploy (Kubernetes Job / compose service)
+instead of on every pod start. A file whose first line is
+"-- migrate:no-transaction" runs statement by statement in autocommit mode
+(needed for CREATE INDEX CONCURRENTLY); every other file runs in a single
+transaction together with its schema_migrations row. An index such a file
+creates that an earlier, interrupted run left INVALID is dropped before the
+file is retried, and the file is only recorded once all of them are valid.
+"""
+import hashlib
+import os
+import re
+import sys
+import psycopg
+from psycopg import sql as pgsql
+from psycopg.conninfo import make_conninfo
+
+DB_HOST = os.getenv("DB_HOST", "localhost")
+DB_NAME = os.getenv("DB_NAME", "ridebooking")
+DB_USER = os.getenv("DB_USER", "admin")
+DB_PASSWORD = os.getenv("DB_PASSWORD", "password")
+DB_PORT = os.getenv("DB_PORT", "5432")
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "versions")
+NO_TRANSACTION_MARKER = "-- migrate:no-transaction"
+# Serializes concurrent runs (e.g. two deploys racing) across the whole database
+ADVISORY_LOCK_ID = 7241700
+CONCURRENT_INDEX = re.compile(
+    r"CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)", re.IGNORECASE
+)
+
+def get_conninfo():
+    return make_conninfo(
+        host=DB_HOST,
+        dbname=DB_NAME,
+        user=DB_USER,
+        password=DB_PASSWORD,
+        port=DB_PORT
+    )
+
+def load_migrations(directory=MIGRATIONS_DIR):
+    """Return [(version, name, sql, checksum)] sorted by version"""
+    migrations = []
+    for filename in sorted(os.listdir(directory)):
+        match = re.match(r"^(\d+)_(\w+)\.sql$", filename)
+        if not match:
+            continue
+        with open(os.path.join(directory, filename), encoding="utf-8") as f:
+            sql = f.read()
+        checksum = hashlib.sha256(sql.encode("utf-8")).hexdigest()
+        migrations.append((int(match.group(1)), match.group(2), sql, checksum))
+
+    versions = [migration[0] for migration in migrations]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError("Duplicate migration version numbers")
+    return migrations
+
+def split_statements(sql):
+    """Split a no-transaction migration on statement-terminating semicolons"""
+    statements = []
+    current = []
+    for line in sql.splitlines():
+        if line.strip().startswith("--") and not current:
+            continue
+        current.append(line)
+        if line.rstrip().endswith(";"):
+            statements.append("\n".join(current).strip())
+            current = []
+    if "\n".join(current).strip():
+        statements.append("\n".join(current).strip())
+    return statements
+
+def invalid_indexes(conn, names):
+    """Those of the named indexes left INVALID by a failed CREATE INDEX CONCURRENTLY"""
+    return [row[0] for row in conn.execute("""
+        SELECT c.relname
+        FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE NOT i.indisvalid AND c.relname = ANY(%s) AND pg_table_is_visible(c.oid)
+    """, (names,))]
+
+def migrate(conn):
+    """Apply pending migrations; returns the versions that were applied"""
+    conn.autocommit = True
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            checksum VARCHAR(64) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute("SELECT pg_advisory_lock(%s)", (ADVISORY_LOCK_ID,))
+    try:
+        applied = {
+            version: checksum
+            for version, checksum in conn.execute("SELECT version, checksum FROM schema_migrations")
+        }
+
+        newly_applied = []
+        for version, name, sql, checksum in load_migrations():
+            if version in applied:
+                if applied[version] != checksum:
+                    raise RuntimeError(f"Migration {version:04d}_{name} was modified after it was applied")
+                continue
+
+            print(f"Applying migration {version:04d}_{name}")
+            if sql.lstrip().startswith(NO_TRANSACTION_MARKER):
+                # IF NOT EXISTS would silently keep an INVALID leftover, so drop it first
+                indexes = [index.lower() for index in CONCURRENT_INDEX.findall(sql)]
+                for index in invalid_indexes(conn, indexes):
+                    print(f"Dropping invalid index {index} left by an earlier run")
+                    conn.execute(pgsql.SQL("DROP INDEX CONCURRENTLY IF EXISTS {}").format(pgsql.Identifier(index)))
+                for statement in split_statements(sql):
+                    conn.execute(statement)
+                invalid = invalid_indexes(conn, indexes)
+                if invalid:
+                    raise RuntimeError(f"Migration {version:04d}_{name} left invalid indexes: {', '.join(invalid)}")
+                conn.execute(
+                    "INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+                    (version, name, checksum)
+                )
+            else:
+                with conn.transaction():
+                    conn.execute(sql)
+                    conn.execute(
+                        "INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+                        (version, name, checksum)
+                    )
+            newly_applied.append(version)
+
+        return newly_applied
+    finally:
+        conn.execute("SELECT pg_advisory_unlock(%s)", (ADVISORY_LOCK_ID,))
+
+def main():
+    with psycopg.connect(get_conninfo()) as conn:
+        applied = migrate(conn)
+    if applied:
+        print(f"Applied migrations: {', '.join(str(version) for version in applied)}")
+    else:
+        print("Database schema is up to date")
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as exc:
+        print(f"Migration failed: {exc}")
+        sys.exit(1)
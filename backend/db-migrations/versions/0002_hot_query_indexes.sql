@@ -0,0 +1,23 @@
+-- migrate:no-transaction
+-- Indexes for the endpoint queries; built CONCURRENTLY so existing tables stay writable.
+
+-- GET /ride/all keyset pages and the analytics resync window
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_rides_created_at_id
+    ON rides (created_at DESC, id DESC);
+
+-- GET /ride/all?city=, ?rider_id=, ?driver_id=
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_rides_city_created_at
+    ON rides (city, created_at DESC, id DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_rides_rider_created_at
+    ON rides (rider_id, created_at DESC, id DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_rides_driver_created_at
+    ON rides (driver_id, created_at DESC, id DESC);
+
+-- Online driver lookups
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_drivers_status
+    ON drivers (status);
+
+-- Outbox relay: pending events only
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_ride_outbox_pending
+    ON ride_outbox (next_attempt_at, id)
+    WHERE delivered_at IS NULL;
@@ -0,0 +1,5 @@
+-- Last reported driver position, used by driver-service's nearest-driver index.
+-- updated_at is bumped on every status or location write so replicas can resync incrementally.
+ALTER TABLE drivers ADD COLUMN IF NOT EXISTS lat DOUBLE PRECISION;
+ALTER TABLE drivers ADD COLUMN IF NOT EXISTS lon DOUBLE PRECISION;
+ALTER TABLE drivers ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
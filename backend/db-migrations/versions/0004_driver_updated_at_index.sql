@@ -0,0 +1,4 @@
+-- migrate:no-transaction
+-- Incremental resync of the nearest-driver index: drivers changed since the last sync
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_drivers_updated_at
+    ON drivers (updated_at);
@@ -0,0 +1,4 @@
+-- Driver reservations: a booked driver is 'busy' and holds the reservation id of its ride
+ALTER TABLE drivers ADD COLUMN IF NOT EXISTS reservation_id UUID;
+ALTER TABLE drivers ADD COLUMN IF NOT EXISTS reserved_at TIMESTAMP;
+ALTER TABLE rides ADD COLUMN IF NOT EXISTS driver_reservation_id UUID;
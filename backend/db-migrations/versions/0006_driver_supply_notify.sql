@@ -0,0 +1,38 @@
+-- Drivers belong to a city (defaulting to their user's city) so supply can be counted per city.
+ALTER TABLE drivers ADD COLUMN IF NOT EXISTS city VARCHAR(100);
+
+UPDATE drivers d
+SET city = u.city
+FROM users u
+WHERE u.id = d.user_id AND d.city IS NULL;
+
+-- Every status or city change is announced on the driver_status channel so each driver-service
+-- replica can keep its per-city counts current. The transaction id lets a replica tell whether a
+-- change is already included in the snapshot it last reconciled against; the driver id keeps
+-- payloads unique, because Postgres folds identical notifications within a transaction.
+CREATE OR REPLACE FUNCTION notify_driver_status() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('driver_status', json_build_object(
+        'xid', txid_current(),
+        'id', CASE WHEN TG_OP = 'DELETE' THEN OLD.id ELSE NEW.id END,
+        'old_city', CASE WHEN TG_OP = 'INSERT' THEN NULL ELSE OLD.city END,
+        'old_status', CASE WHEN TG_OP = 'INSERT' THEN NULL ELSE OLD.status END,
+        'new_city', CASE WHEN TG_OP = 'DELETE' THEN NULL ELSE NEW.city END,
+        'new_status', CASE WHEN TG_OP = 'DELETE' THEN NULL ELSE NEW.status END
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS drivers_status_notify ON drivers;
+CREATE TRIGGER drivers_status_notify
+    AFTER INSERT OR DELETE ON drivers
+    FOR EACH ROW EXECUTE FUNCTION notify_driver_status();
+
+-- Location pings and other column updates do not fire
+DROP TRIGGER IF EXISTS drivers_status_update_notify ON drivers;
+CREATE TRIGGER drivers_status_update_notify
+    AFTER UPDATE OF status, city ON drivers
+    FOR EACH ROW
+    WHEN (OLD.status IS DISTINCT FROM NEW.status OR OLD.city IS DISTINCT FROM NEW.city)
+    EXECUTE FUNCTION notify_driver_status();
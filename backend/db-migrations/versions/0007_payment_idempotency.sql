@@ -0,0 +1,11 @@
+-- Results of payment requests sent with an Idempotency-Key. A row with a NULL response
+-- is a claim held by the replica currently executing the request.
+CREATE TABLE IF NOT EXISTS payment_idempotency (
+    key VARCHAR(255) PRIMARY KEY,
+    fingerprint VARCHAR(64) NOT NULL,
+    response JSONB,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Expired keys are pruned by age
+CREATE INDEX IF NOT EXISTS idx_payment_idempotency_created_at ON payment_idempotency (created_at);
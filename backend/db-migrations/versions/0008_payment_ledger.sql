@@ -0,0 +1,11 @@
+-- Payment ledger: one row per processed payment, written in group-committed batches
+CREATE TABLE IF NOT EXISTS payments (
+    id BIGSERIAL PRIMARY KEY,
+    transaction_id UUID NOT NULL UNIQUE,
+    ride_id INTEGER NOT NULL,
+    amount NUMERIC(12, 2) NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_payments_ride_id ON payments (ride_id);
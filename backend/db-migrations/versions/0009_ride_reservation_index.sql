@@ -0,0 +1,4 @@
+-- migrate:no-transaction
+-- Reservation sweep in driver-service: does a ride exist for this reservation?
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_rides_driver_reservation_id
+    ON rides (driver_reservation_id) WHERE driver_reservation_id IS NOT NULL;
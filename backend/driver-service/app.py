@@ -1,10 +1,29 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-import psycopg2
+from pydantic import BaseModel, Field
+import psycopg
+from psycopg.conninfo import make_conninfo
+from psycopg_pool import AsyncConnectionPool, PoolTimeout
 import os
-from typing import Optional
+import re
+import asyncio
+import base64
+import hashlib
+import heapq
+import hmac
+import json
+import math
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from collections import Counter as TallyCounter, OrderedDict, defaultdict
+from typing import List, Optional
+from uuid import UUID, uuid4
 import uvicorn
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+import redis.asyncio
 
 app = FastAPI(title="Driver Service", version="1.0.0")
 
@@ -17,6 +36,155 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Metrics (scraped from /metrics by Prometheus)
+SERVICE_NAME = "driver-service"
+
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests served", ["service", "method", "route", "status"])
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ["service", "method", "route"]
+)
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests being served", ["service"]).labels(SERVICE_NAME)
+DB_QUERY_SECONDS = Histogram(
+    "db_query_duration_seconds", "Database statement latency", ["service", "statement"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+
+@lru_cache(maxsize=512)
+def statement_label(query: str) -> str:
+    """Short label such as "select:rides" for a SQL statement"""
+    match = re.search(r"\b(INSERT\s+INTO|UPDATE|DELETE\s+FROM|FROM)\s+(\w+)", query, re.IGNORECASE)
+    if not match:
+        return "other"
+    verb = match.group(1).split()[0].lower()
+    return f"{'select' if verb == 'from' else verb}:{match.group(2).lower()}"
+
+class TimedCursor(psycopg.AsyncCursor):
+    """Cursor that records statement latency, labelled by statement_label()"""
+
+    async def execute(self, query, params=None, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await super().execute(query, params, **kwargs)
+        finally:
+            label = statement_label(query) if isinstance(query, str) else "other"
+            DB_QUERY_SECONDS.labels(SERVICE_NAME, label).observe(time.perf_counter() - start)
+
+    async def executemany(self, query, params_seq, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await super().executemany(query, params_seq, **kwargs)
+        finally:
+            label = statement_label(query) if isinstance(query, str) else "other"
+            DB_QUERY_SECONDS.labels(SERVICE_NAME, label).observe(time.perf_counter() - start)
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording per-route latency, status counts and in-flight requests"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            # The router stores the matched route in the scope; use its template to bound cardinality
+            route = scope.get("route")
+            path = route.path if route is not None else "unmatched"
+            HTTP_REQUEST_SECONDS.labels(SERVICE_NAME, scope["method"], path).observe(time.perf_counter() - start)
+            HTTP_REQUESTS.labels(SERVICE_NAME, scope["method"], path, str(status)).inc()
+
+class StatsCollector:
+    """Exposes components' stats() dicts as gauges, read at scrape time instead of on the hot path"""
+
+    def __init__(self):
+        self.sources = {}
+
+    def register(self, component: str, stats):
+        self.sources[component] = stats
+
+    def describe(self):
+        return []
+
+    def collect(self):
+        for component, stats in self.sources.items():
+            for key, value in stats().items():
+                name = f"{component}_{key}"
+                if isinstance(value, (bool, int, float)):
+                    family = GaugeMetricFamily(name, f"{component} {key}", labels=["service"])
+                    family.add_metric([SERVICE_NAME], float(value))
+                    yield family
+                elif isinstance(value, str):
+                    family = GaugeMetricFamily(name, f"{component} {key}", labels=["service", "value"])
+                    family.add_metric([SERVICE_NAME, value], 1.0)
+                    yield family
+
+stats_collector = StatsCollector()
+REGISTRY.register(stats_collector)
+
+# Callers send their remaining budget in X-Request-Timeout-Ms; work past it is abandoned,
+# since nobody is waiting for the answer any more
+request_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+deadline_stats = {"expired": 0}
+stats_collector.register("deadline", lambda: deadline_stats)
+
+class DeadlineMiddleware:
+    """Pure ASGI middleware bounding a request, including its DB queries, by the caller's budget"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        budget_ms = dict(scope.get("headers", ())).get(b"x-request-timeout-ms") if scope["type"] == "http" else None
+        try:
+            budget = int(budget_ms) / 1000 if budget_ms is not None else None
+        except ValueError:
+            budget = None
+        if budget is None:
+            await self.app(scope, receive, send)
+            return
+
+        request_deadline.set(time.monotonic() + budget)
+        started = False
+
+        async def send_tracking(message):
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        try:
+            # Cancelling an awaited query makes psycopg cancel it on the server too
+            async with asyncio.timeout(budget):
+                await self.app(scope, receive, send_tracking)
+        except TimeoutError:
+            deadline_stats["expired"] += 1
+            if started:
+                raise
+            await send({
+                "type": "http.response.start",
+                "status": 504,
+                "headers": [(b"content-type", b"application/json")],
+            })
+            await send({"type": "http.response.body", "body": b'{"detail":"Request deadline exceeded"}'})
+
+app.add_middleware(DeadlineMiddleware)
+app.add_middleware(MetricsMiddleware)
+
 # Database connection
 DB_HOST = os.getenv("DB_HOST", "localhost")
 DB_NAME = os.getenv("DB_NAME", "ridebooking")
@@ -24,14 +192,743 @@ DB_USER = os.getenv("DB_USER", "admin")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "password")
 DB_PORT = os.getenv("DB_PORT", "5432")
 
-def get_db_connection():
-    return psycopg2.connect(
-        host=DB_HOST,
-        database=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD,
-        port=DB_PORT
-    )
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+DB_PREPARE_THRESHOLD = int(os.getenv("DB_PREPARE_THRESHOLD", "1"))
+
+async def configure_connection(conn):
+    # Server-side prepare hot statements after their first execution
+    conn.prepare_threshold = DB_PREPARE_THRESHOLD
+    conn.cursor_factory = TimedCursor
+
+DB_CONNINFO = make_conninfo(
+    host=DB_HOST,
+    dbname=DB_NAME,
+    user=DB_USER,
+    password=DB_PASSWORD,
+    port=DB_PORT
+)
+
+db_pool = AsyncConnectionPool(
+    conninfo=DB_CONNINFO,
+    min_size=DB_POOL_MIN_SIZE,
+    max_size=DB_POOL_MAX_SIZE,
+    timeout=DB_POOL_TIMEOUT,
+    configure=configure_connection,
+    check=AsyncConnectionPool.check_connection,
+    open=False,
+)
+
+@asynccontextmanager
+async def db_cursor():
+    """Borrow a pooled connection; commits on success, rolls back on error"""
+    try:
+        async with db_pool.connection() as conn:
+            async with conn.cursor() as cursor:
+                yield cursor
+    except PoolTimeout:
+        raise HTTPException(status_code=503, detail="Database busy, please retry")
+
+def db_pool_stats():
+    stats = db_pool.get_stats()
+    return {
+        "size": stats.get("pool_size", 0),
+        "available": stats.get("pool_available", 0),
+        "waiting": stats.get("requests_waiting", 0),
+        "max_size": DB_POOL_MAX_SIZE,
+    }
+
+stats_collector.register("db_pool", db_pool_stats)
+
+# Entity cache: in-process LRU with TTL in front of an optional shared Redis tier
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+CACHE_LOCAL_TTL = float(os.getenv("CACHE_LOCAL_TTL", "5"))
+CACHE_SHARED_TTL = float(os.getenv("CACHE_SHARED_TTL", "60"))
+CACHE_NEGATIVE_TTL = float(os.getenv("CACHE_NEGATIVE_TTL", "2"))
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "")
+
+class RedisCacheTier:
+    """Shared cache tier so replicas do not each go to Postgres for the same row"""
+
+    def __init__(self, url: str):
+        self.client = redis.asyncio.from_url(url)
+
+    async def get(self, key: str):
+        return await self.client.get(key)
+
+    async def set(self, key: str, value: str, ttl: float):
+        await self.client.set(key, value, px=int(ttl * 1000))
+
+    async def delete(self, *keys: str):
+        await self.client.delete(*keys)
+
+    async def close(self):
+        await self.client.aclose()
+
+class EntityCache:
+    """Read-through cache for rows looked up by id.
+
+    Not-found results are cached for CACHE_NEGATIVE_TTL, concurrent misses on the same
+    key share a single load, and writers call invalidate() after they commit.
+    """
+
+    def __init__(self, name: str, max_entries: int, ttl: float, negative_ttl: float):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.shared = None
+        self.entries = OrderedDict()
+        self.loading = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+
+    async def get_or_load(self, key, loader):
+        """Return the cached value for key, calling loader() on a miss; None means not found"""
+        key = f"{self.name}:{key}"
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+        pending = self.loading.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self.loading[key] = future
+        try:
+            value = await self._load(key, loader, future)
+            future.set_result(value)
+            return value
+        except BaseException as exc:
+            future.set_exception(exc)
+            future.exception()  # Mark retrieved when no other caller is waiting
+            raise
+        finally:
+            if self.loading.get(key) is future:
+                del self.loading[key]
+
+    async def _load(self, key: str, loader, future):
+        if self.shared is not None:
+            try:
+                raw = await self.shared.get(key)
+                if raw is not None:
+                    value = json.loads(raw)
+                    self._store(key, value, future)
+                    self.hits += 1
+                    return value
+            except Exception as exc:
+                print(f"Shared cache read failed for {key}: {exc}")
+
+        self.misses += 1
+        value = await loader()
+        # A write that invalidated this key while we were loading wins over our result
+        if self._store(key, value, future) and self.shared is not None:
+            try:
+                await self.shared.set(key, json.dumps(value), CACHE_SHARED_TTL if value is not None else self.negative_ttl)
+            except Exception as exc:
+                print(f"Shared cache write failed for {key}: {exc}")
+        return value
+
+    def _store(self, key: str, value, future) -> bool:
+        if self.loading.get(key) is not future:
+            return False
+        ttl = self.ttl if value is not None else self.negative_ttl
+        self.entries[key] = (time.monotonic() + ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+        return True
+
+    async def invalidate(self, *keys):
+        """Drop keys from both tiers; several keys cost one shared-tier round trip"""
+        keys = [f"{self.name}:{key}" for key in keys]
+        for key in keys:
+            self.entries.pop(key, None)
+            self.loading.pop(key, None)
+        if self.shared is not None and keys:
+            try:
+                await self.shared.delete(*keys)
+            except Exception as exc:
+                print(f"Shared cache invalidation failed for {len(keys)} key(s), first {keys[0]}: {exc}")
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "coalesced": self.coalesced,
+            "shared": self.shared is not None,
+        }
+
+driver_cache = EntityCache("driver", CACHE_MAX_ENTRIES, CACHE_LOCAL_TTL, CACHE_NEGATIVE_TTL)
+stats_collector.register("cache", driver_cache.stats)
+
+# Nearest-driver index: online drivers' last reported positions, bucketed into lat/lon grid cells
+DRIVER_INDEX_CELL_DEGREES = float(os.getenv("DRIVER_INDEX_CELL_DEGREES", "0.01"))  # ~1.1 km
+DRIVER_INDEX_RESYNC_INTERVAL = float(os.getenv("DRIVER_INDEX_RESYNC_INTERVAL", "5"))
+DRIVER_INDEX_RESYNC_OVERLAP = float(os.getenv("DRIVER_INDEX_RESYNC_OVERLAP", "5"))
+NEAREST_MAX_K = int(os.getenv("NEAREST_MAX_K", "50"))
+NEAREST_MAX_RADIUS_KM = float(os.getenv("NEAREST_MAX_RADIUS_KM", "10"))
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+class DriverLocationIndex:
+    """Grid index of online drivers with a known position.
+
+    nearest() scans square rings of cells outward from the query point and stops as
+    soon as no unscanned cell can hold a driver closer than the k-th best so far, so
+    lookups touch a handful of cells regardless of how many drivers are online.
+    Rebuilt from Postgres on startup, kept current by this replica's writes and
+    resynced every DRIVER_INDEX_RESYNC_INTERVAL for writes made on other replicas.
+    """
+
+    def __init__(self, cell_degrees: float):
+        self.cell_degrees = cell_degrees
+        self.cells = {}  # (row, col) -> {driver_id: (lat, lon)}
+        self.positions = {}  # driver_id -> (row, col)
+        self.synced_at = None
+        self.task = None
+
+    def cell_of(self, lat: float, lon: float):
+        return (math.floor(lat / self.cell_degrees), math.floor(lon / self.cell_degrees))
+
+    def apply(self, driver_id: int, status: str, lat: Optional[float], lon: Optional[float]):
+        """Reflect a driver row: online drivers with a position are indexed, all others dropped"""
+        if status != "online" or lat is None or lon is None:
+            self.remove(driver_id)
+            return
+
+        cell = self.cell_of(lat, lon)
+        previous = self.positions.get(driver_id)
+        if previous is not None and previous != cell:
+            self._discard(driver_id, previous)
+        self.cells.setdefault(cell, {})[driver_id] = (lat, lon)
+        self.positions[driver_id] = cell
+
+    def move(self, driver_id: int, lat: float, lon: float):
+        """Update the position of a driver that is already indexed (online)"""
+        if driver_id in self.positions:
+            self.apply(driver_id, "online", lat, lon)
+
+    def remove(self, driver_id: int):
+        cell = self.positions.pop(driver_id, None)
+        if cell is not None:
+            self._discard(driver_id, cell)
+
+    def _discard(self, driver_id: int, cell):
+        bucket = self.cells.get(cell)
+        if bucket is not None:
+            bucket.pop(driver_id, None)
+            if not bucket:
+                del self.cells[cell]
+
+    def ring(self, row: int, col: int, radius: int):
+        if radius == 0:
+            yield (row, col)
+            return
+        for c in range(col - radius, col + radius + 1):
+            yield (row - radius, c)
+            yield (row + radius, c)
+        for r in range(row - radius + 1, row + radius):
+            yield (r, col - radius)
+            yield (r, col + radius)
+
+    def nearest(self, lat: float, lon: float, k: int, max_radius_km: float):
+        """Up to k (distance_km, driver_id, lat, lon) tuples within max_radius_km, closest first"""
+        row, col = self.cell_of(lat, lon)
+        # Longitude cells narrow towards the poles; use the narrowest width inside the search radius
+        widest_lat = min(abs(lat) + max_radius_km / KM_PER_DEGREE, 89.9)
+        cell_km = self.cell_degrees * KM_PER_DEGREE * math.cos(math.radians(widest_lat))
+        max_ring = math.ceil(max_radius_km / cell_km) + 1
+
+        # Rank candidates on a local flat projection (exact enough at city scale and much cheaper
+        # than haversine per driver); only the k results get a great-circle distance
+        lon_km = KM_PER_DEGREE * math.cos(math.radians(lat))
+        max_squared = max_radius_km * max_radius_km
+        best = []  # max-heap of the k closest so far, as (-squared_km, driver_id, lat, lon)
+        for radius in range(max_ring + 1):
+            for cell in self.ring(row, col, radius):
+                bucket = self.cells.get(cell)
+                if not bucket:
+                    continue
+                for driver_id, (driver_lat, driver_lon) in bucket.items():
+                    dy = (driver_lat - lat) * KM_PER_DEGREE
+                    dx = (driver_lon - lon) * lon_km
+                    squared = dx * dx + dy * dy
+                    if squared > max_squared:
+                        continue
+                    if len(best) < k:
+                        heapq.heappush(best, (-squared, driver_id, driver_lat, driver_lon))
+                    elif squared < -best[0][0]:
+                        heapq.heapreplace(best, (-squared, driver_id, driver_lat, driver_lon))
+            # Every unscanned cell is at least `radius` whole cells away from the query point
+            if len(best) == k and -best[0][0] <= (radius * cell_km) ** 2:
+                break
+
+        return sorted(
+            (haversine_km(lat, lon, driver_lat, driver_lon), driver_id, driver_lat, driver_lon)
+            for _, driver_id, driver_lat, driver_lon in best
+        )
+
+    async def sync(self):
+        """Full rebuild on the first call, afterwards only drivers changed since the last sync"""
+        async with db_cursor() as cursor:
+            await cursor.execute("SELECT LOCALTIMESTAMP")
+            started_at = (await cursor.fetchone())[0]
+            if self.synced_at is None:
+                await cursor.execute("""
+                    SELECT id, status, lat, lon FROM drivers
+                    WHERE status = 'online' AND lat IS NOT NULL
+                """)
+            else:
+                # Overlap the previous sync so rows committed late with an older updated_at are not missed
+                await cursor.execute("""
+                    SELECT id, status, lat, lon FROM drivers
+                    WHERE updated_at > %s - make_interval(secs => %s)
+                """, (self.synced_at, DRIVER_INDEX_RESYNC_OVERLAP))
+            rows = await cursor.fetchall()
+
+        if self.synced_at is None:
+            self.cells.clear()
+            self.positions.clear()
+        for driver_id, status, lat, lon in rows:
+            # Pings not yet flushed are newer than what the database has
+            lat, lon = location_ingestor.latest(driver_id) or (lat, lon)
+            self.apply(driver_id, status, lat, lon)
+        self.synced_at = started_at
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(DRIVER_INDEX_RESYNC_INTERVAL)
+            try:
+                await self.sync()
+            except Exception as exc:
+                print(f"Driver index resync failed: {exc}")
+
+    def stats(self):
+        return {"online_drivers": len(self.positions), "cells": len(self.cells)}
+
+driver_index = DriverLocationIndex(DRIVER_INDEX_CELL_DEGREES)
+stats_collector.register("driver_index", driver_index.stats)
+
+# Location ingestion: pings are coalesced per driver in memory and written in bulk
+LOCATION_FLUSH_INTERVAL = float(os.getenv("LOCATION_FLUSH_INTERVAL", "0.5"))
+LOCATION_FLUSH_SIZE = int(os.getenv("LOCATION_FLUSH_SIZE", "5000"))
+LOCATION_MAX_PENDING = int(os.getenv("LOCATION_MAX_PENDING", "100000"))
+LOCATION_BATCH_MAX_SIZE = int(os.getenv("LOCATION_BATCH_MAX_SIZE", "1000"))
+LOCATION_RETRY_AFTER = int(os.getenv("LOCATION_RETRY_AFTER", "1"))
+
+class LocationBackpressure(Exception):
+    pass
+
+class LocationIngestor:
+    """Buffers driver pings and writes them with one UPDATE per flush.
+
+    Only the latest position per driver is kept (last write wins), so a flush costs
+    one row per active driver however often they report. The nearest-driver index
+    is updated on accept; the database catches up on the next flush, which then
+    invalidates the cached reads of the drivers it wrote. Once LOCATION_MAX_PENDING drivers are waiting, new drivers' pings
+    are refused so callers back off instead of growing the buffer without bound.
+    """
+
+    def __init__(self, flush_interval: float, flush_size: int, max_pending: int):
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.max_pending = max_pending
+        self.pending = {}  # driver_id -> (lat, lon)
+        self.flushing = {}
+        self.wakeup = asyncio.Event()
+        self.task = None
+        self.accepted = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.written = 0
+        self.flushes = 0
+        self.flush_failures = 0
+        self.last_flush_ms = 0.0
+
+    def offer(self, pings) -> int:
+        """Buffer (driver_id, lat, lon) pings; raises LocationBackpressure if the buffer is full"""
+        new_drivers = len({driver_id for driver_id, _, _ in pings if driver_id not in self.pending})
+        if len(self.pending) + new_drivers > self.max_pending:
+            self.rejected += len(pings)
+            raise LocationBackpressure()
+
+        before = len(self.pending)
+        for driver_id, lat, lon in pings:
+            self.pending[driver_id] = (lat, lon)
+            driver_index.move(driver_id, lat, lon)
+        self.accepted += len(pings)
+        self.coalesced += len(pings) - (len(self.pending) - before)
+        if len(self.pending) >= self.flush_size:
+            self.wakeup.set()
+        return len(pings)
+
+    def latest(self, driver_id: int):
+        """Newest position not yet in the database, or None"""
+        return self.pending.get(driver_id) or self.flushing.get(driver_id)
+
+    def discard(self, driver_id: int):
+        self.pending.pop(driver_id, None)
+
+    async def flush(self):
+        if not self.pending:
+            return
+        self.flushing, self.pending = self.pending, {}
+        # Sorted ids keep row lock order consistent across replicas flushing at the same time
+        ids = sorted(self.flushing)
+        start = time.perf_counter()
+        try:
+            async with db_cursor() as cursor:
+                await cursor.execute("""
+                    UPDATE drivers d
+                    SET lat = u.lat, lon = u.lon, updated_at = CURRENT_TIMESTAMP
+                    FROM unnest(%s::int[], %s::float8[], %s::float8[]) AS u(id, lat, lon)
+                    WHERE d.id = u.id
+                """, (ids, [self.flushing[i][0] for i in ids], [self.flushing[i][1] for i in ids]))
+            self.written += len(ids)
+            self.flushes += 1
+            await driver_cache.invalidate(*ids)
+        except BaseException:
+            self.flush_failures += 1
+            # Put the batch back unless a newer ping arrived meanwhile
+            for driver_id, position in self.flushing.items():
+                self.pending.setdefault(driver_id, position)
+            raise
+        finally:
+            self.flushing = {}
+            self.last_flush_ms = (time.perf_counter() - start) * 1000
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        try:
+            await self.flush()
+        except Exception as exc:
+            print(f"Final location flush failed, {len(self.pending)} positions dropped: {exc}")
+
+    async def run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as exc:
+                print(f"Location flush failed: {exc}")
+
+    def stats(self):
+        return {
+            "pending": len(self.pending),
+            "accepted": self.accepted,
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+            "written": self.written,
+            "flushes": self.flushes,
+            "flush_failures": self.flush_failures,
+            "last_flush_ms": self.last_flush_ms,
+        }
+
+location_ingestor = LocationIngestor(LOCATION_FLUSH_INTERVAL, LOCATION_FLUSH_SIZE, LOCATION_MAX_PENDING)
+stats_collector.register("location_ingest", location_ingestor.stats)
+
+# Supply: online/busy drivers per city, fed by the driver_status NOTIFY channel (migration 0006)
+SUPPLY_CHANNEL = "driver_status"
+SUPPLY_STATUSES = ("online", "busy")
+SUPPLY_RECONCILE_INTERVAL = float(os.getenv("SUPPLY_RECONCILE_INTERVAL", "60"))
+SUPPLY_LISTEN_MAX_BACKOFF = float(os.getenv("SUPPLY_LISTEN_MAX_BACKOFF", "30"))
+
+class TxidSnapshot:
+    """Parsed txid_current_snapshot(): which transactions a snapshot already sees"""
+
+    def __init__(self, text: str):
+        xmin, xmax, xip = text.split(":")
+        self.xmin = int(xmin)
+        self.xmax = int(xmax)
+        self.xip = {int(xid) for xid in xip.split(",") if xid}
+
+    def sees(self, xid: int) -> bool:
+        return xid < self.xmin or (xid < self.xmax and xid not in self.xip)
+
+class DriverSupply:
+    """Per-city counts of online and busy drivers, maintained without scanning the table.
+
+    Every replica LISTENs on the driver_status channel, which a trigger on drivers
+    notifies on each status or city change, whoever made it. reconcile() recounts
+    from the table on startup, after a dropped listener connection and every
+    SUPPLY_RECONCILE_INTERVAL. Each recount is tied to its transaction snapshot, so a
+    change is applied exactly once whether it lands before, inside or after it.
+    """
+
+    def __init__(self):
+        self.counts = defaultdict(TallyCounter)  # city -> status -> drivers
+        self.snapshot = None
+        self.recording = None
+        self.lock = asyncio.Lock()
+        self.listening = False
+        self.tasks = []
+        self.events = 0
+        self.reconciles = 0
+        self.drift = 0
+        self.reconciled_at = None
+
+    def apply(self, counts, event: dict):
+        if event["old_status"] in SUPPLY_STATUSES:
+            counts[event["old_city"]][event["old_status"]] -= 1
+        if event["new_status"] in SUPPLY_STATUSES:
+            counts[event["new_city"]][event["new_status"]] += 1
+
+    def on_notify(self, payload: str):
+        event = json.loads(payload)
+        self.events += 1
+        if self.recording is not None:
+            self.recording.append(event)
+        if self.snapshot is None or not self.snapshot.sees(event["xid"]):
+            self.apply(self.counts, event)
+
+    async def reconcile(self):
+        async with self.lock:
+            # Changes seen while the recount runs are replayed unless its snapshot has them
+            self.recording = []
+            try:
+                async with db_cursor() as cursor:
+                    await cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+                    await cursor.execute("SELECT txid_current_snapshot()::text")
+                    snapshot = TxidSnapshot((await cursor.fetchone())[0])
+                    await cursor.execute("""
+                        SELECT city, status, COUNT(*) FROM drivers
+                        WHERE status = ANY(%s)
+                        GROUP BY city, status
+                    """, (list(SUPPLY_STATUSES),))
+                    rows = await cursor.fetchall()
+
+                counts = defaultdict(TallyCounter)
+                for city, status, count in rows:
+                    counts[city][status] = count
+                for event in self.recording:
+                    if not snapshot.sees(event["xid"]):
+                        self.apply(counts, event)
+            finally:
+                recorded, self.recording = self.recording, None
+
+            if self.snapshot is not None:
+                # Non-zero only if notifications were lost, e.g. while the listener was down
+                cities = set(counts) | set(self.counts)
+                self.drift += sum(
+                    abs(counts[city][status] - self.counts[city][status])
+                    for city in cities for status in SUPPLY_STATUSES
+                )
+            self.counts = counts
+            self.snapshot = snapshot
+            self.reconciles += 1
+            self.reconciled_at = time.time()
+
+    async def listen(self):
+        backoff = 1.0
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(DB_CONNINFO, autocommit=True) as conn:
+                    await conn.execute(f"LISTEN {SUPPLY_CHANNEL}")
+                    # Anything missed while disconnected is picked up by recounting after LISTEN
+                    await self.reconcile()
+                    self.listening = True
+                    backoff = 1.0
+                    async for notify in conn.notifies():
+                        self.on_notify(notify.payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                print(f"Driver supply listener failed, reconnecting in {backoff:.0f}s: {exc}")
+            finally:
+                self.listening = False
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, SUPPLY_LISTEN_MAX_BACKOFF)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(SUPPLY_RECONCILE_INTERVAL)
+            try:
+                await self.reconcile()
+            except Exception as exc:
+                print(f"Driver supply reconcile failed: {exc}")
+
+    def start(self):
+        self.tasks = [asyncio.create_task(self.listen()), asyncio.create_task(self.run())]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    def by_city(self) -> dict:
+        return {
+            city: {status: counts[status] for status in SUPPLY_STATUSES}
+            for city, counts in self.counts.items()
+            if city is not None and any(counts[status] for status in SUPPLY_STATUSES)
+        }
+
+    def stats(self):
+        return {
+            "listening": self.listening,
+            "events": self.events,
+            "reconciles": self.reconciles,
+            "drift": self.drift,
+            "cities": len(self.counts),
+        }
+
+driver_supply = DriverSupply()
+stats_collector.register("supply", driver_supply.stats)
+
+# Session tokens are issued by user-service ("<kid>.<claims>.<signature>", HMAC-SHA256) and
+# verified here without a users lookup. SESSION_SIGNING_KEYS lists every key that may verify
+# ("kid:secret,..."), so it must match user-service's list across a rotation. Anonymous calls
+# are still accepted unless AUTH_REQUIRED is set.
+SESSION_SIGNING_KEYS = os.getenv("SESSION_SIGNING_KEYS", "dev:insecure-dev-session-key")
+SESSION_CACHE_MAX_ENTRIES = int(os.getenv("SESSION_CACHE_MAX_ENTRIES", "10000"))
+AUTH_REQUIRED = os.getenv("AUTH_REQUIRED", "false").lower() == "true"
+# The reservation endpoints are called by ride-service, not by users, so they take a shared
+# service credential (X-Service-Token) instead of a session. SERVICE_TOKENS lists every token
+# accepted ("new,old" during a rotation). With none configured they stay open unless
+# AUTH_REQUIRED is set, in which case they are closed.
+SERVICE_TOKENS = [token for token in os.getenv("SERVICE_TOKENS", "").split(",") if token]
+
+def parse_signing_keys(value: str) -> dict:
+    keys = {}
+    for entry in value.split(","):
+        kid, _, secret = entry.strip().partition(":")
+        if kid and secret:
+            keys[kid] = secret.encode()
+    return keys
+
+def b64url_decode(value: str) -> bytes:
+    return base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+
+class InvalidToken(Exception):
+    pass
+
+class SessionVerifier:
+    """Checks session token signatures and expiry locally.
+
+    Verified claims are kept in a bounded LRU keyed by the token string, so a client
+    presenting the same token again costs a dict lookup instead of an HMAC and a JSON
+    parse. Entries are dropped once their token expires.
+    """
+
+    def __init__(self, keys: dict, max_entries: int):
+        self.keys = keys
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+
+    def _check(self, token: str, now: float) -> dict:
+        try:
+            kid, body, signature = token.split(".")
+            key = self.keys.get(kid)
+            if key is None:
+                raise InvalidToken("Unknown signing key")
+            expected = hmac.new(key, f"{kid}.{body}".encode(), hashlib.sha256).digest()
+            if not hmac.compare_digest(expected, b64url_decode(signature)):
+                raise InvalidToken("Invalid token signature")
+            claims = json.loads(b64url_decode(body))
+        except ValueError:
+            raise InvalidToken("Malformed token")
+        if claims.get("exp", 0) <= now:
+            raise InvalidToken("Token expired")
+        return claims
+
+    def verify(self, token: str) -> dict:
+        now = time.time()
+        claims = self.entries.get(token)
+        if claims is not None:
+            if claims["exp"] > now:
+                self.entries.move_to_end(token)
+                self.hits += 1
+                return claims
+            del self.entries[token]
+
+        self.misses += 1
+        try:
+            claims = self._check(token, now)
+        except InvalidToken:
+            self.rejected += 1
+            raise
+
+        self.entries[token] = claims
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return claims
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "rejected": self.rejected,
+            "keys": len(self.keys),
+        }
+
+session_verifier = SessionVerifier(parse_signing_keys(SESSION_SIGNING_KEYS), SESSION_CACHE_MAX_ENTRIES)
+stats_collector.register("session", session_verifier.stats)
+
+def authenticate(authorization: Optional[str] = Header(None)) -> Optional[dict]:
+    """Session claims from the Authorization header; None for anonymous calls when AUTH_REQUIRED is off"""
+    if not authorization:
+        if AUTH_REQUIRED:
+            raise HTTPException(status_code=401, detail="Authentication required", headers={"WWW-Authenticate": "Bearer"})
+        return None
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(status_code=401, detail="Expected a Bearer token", headers={"WWW-Authenticate": "Bearer"})
+    try:
+        return session_verifier.verify(token.strip())
+    except InvalidToken as e:
+        raise HTTPException(status_code=401, detail=str(e), headers={"WWW-Authenticate": "Bearer"})
+
+def authenticate_service(x_service_token: Optional[str] = Header(None)):
+    """Reject calls that do not carry one of SERVICE_TOKENS"""
+    if not SERVICE_TOKENS:
+        if AUTH_REQUIRED:
+            raise HTTPException(status_code=401, detail="Service token required")
+        return
+    if not x_service_token or not any(
+        hmac.compare_digest(x_service_token.encode(), token.encode()) for token in SERVICE_TOKENS
+    ):
+        raise HTTPException(status_code=401, detail="Invalid service token")
 
 # Models
 class DriverCreate(BaseModel):
@@ -39,11 +936,17 @@ class DriverCreate(BaseModel):
     vehicle_number: str
     vehicle_type: str
     license_number: str
+    city: Optional[str] = None  # Defaults to the user's city
 
 class DriverStatus(BaseModel):
     driver_id: int
     status: str  # "online" or "offline"
 
+class DriverLocation(BaseModel):
+    driver_id: int
+    lat: float = Field(ge=-90, le=90)
+    lon: float = Field(ge=-180, le=180)
+
 class DriverResponse(BaseModel):
     id: int
     user_id: int
@@ -51,132 +954,685 @@ class DriverResponse(BaseModel):
     vehicle_type: str
     license_number: str
     status: str
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+    city: Optional[str] = None
+
+class LocationBatchResponse(BaseModel):
+    accepted: int
+    pending: int
+    rejected: int = 0  # Pings for drivers the signed-in user does not own
+
+class NearbyDriver(BaseModel):
+    driver_id: int
+    lat: float
+    lon: float
+    distance_km: float
+
+class DriverReservation(BaseModel):
+    driver_id: int
+
+class NearestReservation(BaseModel):
+    lat: float = Field(ge=-90, le=90)
+    lon: float = Field(ge=-180, le=180)
+    radius_km: float = Field(NEAREST_MAX_RADIUS_KM, gt=0, le=NEAREST_MAX_RADIUS_KM)
+
+class ReservationEnd(BaseModel):
+    driver_id: int
+    reservation_id: UUID
+
+class ReservationResponse(BaseModel):
+    driver_id: int
+    reservation_id: Optional[UUID] = None
+    status: str
 
 @app.on_event("startup")
 async def startup():
-    # Initialize database table
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS drivers (
-            id SERIAL PRIMARY KEY,
-            user_id INTEGER NOT NULL,
-            vehicle_number VARCHAR(50) NOT NULL,
-            vehicle_type VARCHAR(50) NOT NULL,
-            license_number VARCHAR(100) NOT NULL,
-            status VARCHAR(20) DEFAULT 'offline',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    conn.commit()
-    cursor.close()
-    conn.close()
+    # Tables and indexes are managed by backend/db-migrations, which runs once per deploy
+    await db_pool.open(wait=True)
+    if CACHE_REDIS_URL:
+        driver_cache.shared = RedisCacheTier(CACHE_REDIS_URL)
+    await driver_index.sync()
+    driver_index.start()
+    location_ingestor.start()
+    await driver_supply.reconcile()
+    driver_supply.start()
+    reservation_sweeper.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await reservation_sweeper.stop()
+    await driver_supply.stop()
+    await location_ingestor.stop()
+    await driver_index.stop()
+    if driver_cache.shared is not None:
+        await driver_cache.shared.close()
+    await db_pool.close()
 
 @app.post("/driver/create", response_model=DriverResponse)
 async def create_driver(driver: DriverCreate):
     """Create a new driver"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
     try:
-        cursor.execute("""
-            INSERT INTO drivers (user_id, vehicle_number, vehicle_type, license_number, status)
-            VALUES (%s, %s, %s, %s, 'offline')
-            RETURNING id, user_id, vehicle_number, vehicle_type, license_number, status
-        """, (driver.user_id, driver.vehicle_number, driver.vehicle_type, driver.license_number))
-        
-        result = cursor.fetchone()
-        conn.commit()
-        
+        async with db_cursor() as cursor:
+            await cursor.execute("""
+                INSERT INTO drivers (user_id, vehicle_number, vehicle_type, license_number, status, city)
+                VALUES (%s, %s, %s, %s, 'offline', COALESCE(%s, (SELECT city FROM users WHERE id = %s)))
+                RETURNING id, user_id, vehicle_number, vehicle_type, license_number, status, lat, lon, city
+            """, (driver.user_id, driver.vehicle_number, driver.vehicle_type, driver.license_number,
+                  driver.city, driver.user_id))
+
+            result = await cursor.fetchone()
+
+        # Drop any cached "not found" for the new id
+        await driver_cache.invalidate(result[0])
+
         return DriverResponse(
             id=result[0],
             user_id=result[1],
             vehicle_number=result[2],
             vehicle_type=result[3],
             license_number=result[4],
-            status=result[5]
+            status=result[5],
+            lat=result[6],
+            lon=result[7],
+            city=result[8]
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        cursor.close()
-        conn.close()
 
 @app.put("/driver/status", response_model=DriverResponse)
-async def update_driver_status(status: DriverStatus):
+async def update_driver_status(status: DriverStatus, session: Optional[dict] = Depends(authenticate)):
     """Update driver status (online/offline)"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
+    if status.status not in ["online", "offline"]:
+        raise HTTPException(status_code=400, detail="Status must be 'online' or 'offline'")
+
+    user_id = session["sub"] if session is not None else None
     try:
-        if status.status not in ["online", "offline"]:
-            raise HTTPException(status_code=400, detail="Status must be 'online' or 'offline'")
-        
-        cursor.execute("""
-            UPDATE drivers
-            SET status = %s
-            WHERE id = %s
-            RETURNING id, user_id, vehicle_number, vehicle_type, license_number, status
-        """, (status.status, status.driver_id))
-        
-        result = cursor.fetchone()
+        async with db_cursor() as cursor:
+            # A reserved driver cannot be made available again here (that would allow a second
+            # booking), but going offline always wins and drops the reservation. Signed-in
+            # callers may only change their own driver.
+            await cursor.execute("""
+                UPDATE drivers
+                SET status = %s, reservation_id = NULL, reserved_at = NULL, updated_at = CURRENT_TIMESTAMP
+                WHERE id = %s AND (status <> 'busy' OR %s = 'offline')
+                  AND (%s::int IS NULL OR user_id = %s)
+                RETURNING id, user_id, vehicle_number, vehicle_type, license_number, status, lat, lon, city
+            """, (status.status, status.driver_id, status.status, user_id, user_id))
+
+            result = await cursor.fetchone()
+            if not result:
+                await cursor.execute("SELECT status, user_id FROM drivers WHERE id = %s", (status.driver_id,))
+                current = await cursor.fetchone()
+
+        await driver_cache.invalidate(status.driver_id)
+
         if not result:
+            if current and user_id is not None and current[1] != user_id:
+                raise HTTPException(status_code=403, detail="Cannot update another user's driver")
+            if current:
+                raise HTTPException(status_code=409, detail="Driver is on a ride")
             raise HTTPException(status_code=404, detail="Driver not found")
-        
-        conn.commit()
-        
+
+        lat, lon = location_ingestor.latest(result[0]) or (result[6], result[7])
+        driver_index.apply(result[0], result[5], lat, lon)
+
         return DriverResponse(
             id=result[0],
             user_id=result[1],
             vehicle_number=result[2],
             vehicle_type=result[3],
             license_number=result[4],
-            status=result[5]
+            status=result[5],
+            lat=lat,
+            lon=lon,
+            city=result[8]
         )
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        cursor.close()
-        conn.close()
 
-@app.get("/driver/{driver_id}", response_model=DriverResponse)
-async def get_driver(driver_id: int):
-    """Get driver by ID"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
+@app.put("/driver/location", response_model=DriverResponse)
+async def update_driver_location(location: DriverLocation, session: Optional[dict] = Depends(authenticate)):
+    """Report a driver's current position"""
+    user_id = session["sub"] if session is not None else None
     try:
-        cursor.execute("""
-            SELECT id, user_id, vehicle_number, vehicle_type, license_number, status
-            FROM drivers
-            WHERE id = %s
-        """, (driver_id,))
-        
-        result = cursor.fetchone()
+        # This write is newer than anything buffered for the driver
+        location_ingestor.discard(location.driver_id)
+        async with db_cursor() as cursor:
+            await cursor.execute("""
+                UPDATE drivers
+                SET lat = %s, lon = %s, updated_at = CURRENT_TIMESTAMP
+                WHERE id = %s AND (%s::int IS NULL OR user_id = %s)
+                RETURNING id, user_id, vehicle_number, vehicle_type, license_number, status, lat, lon, city
+            """, (location.lat, location.lon, location.driver_id, user_id, user_id))
+
+            result = await cursor.fetchone()
+            if not result and user_id is not None:
+                await cursor.execute("SELECT 1 FROM drivers WHERE id = %s", (location.driver_id,))
+                if await cursor.fetchone():
+                    raise HTTPException(status_code=403, detail="Cannot update another user's driver")
+
+        await driver_cache.invalidate(location.driver_id)
+
         if not result:
             raise HTTPException(status_code=404, detail="Driver not found")
-        
+
+        driver_index.apply(result[0], result[5], result[6], result[7])
+
         return DriverResponse(
             id=result[0],
             user_id=result[1],
             vehicle_number=result[2],
             vehicle_type=result[3],
             license_number=result[4],
-            status=result[5]
+            status=result[5],
+            lat=result[6],
+            lon=result[7],
+            city=result[8]
         )
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        cursor.close()
-        conn.close()
+
+@app.post("/driver/location/batch", response_model=LocationBatchResponse, status_code=202)
+async def ingest_driver_locations(locations: List[DriverLocation], session: Optional[dict] = Depends(authenticate)):
+    """Accept many position pings at once; they are written to the database asynchronously.
+
+    Signed-in callers may only report their own drivers; other pings are dropped and
+    counted in `rejected`.
+    """
+    if len(locations) > LOCATION_BATCH_MAX_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {LOCATION_BATCH_MAX_SIZE} locations per batch")
+
+    rejected = 0
+    if session is not None and locations:
+        try:
+            async with db_cursor() as cursor:
+                await cursor.execute(
+                    "SELECT id FROM drivers WHERE id = ANY(%s) AND user_id = %s",
+                    (list({l.driver_id for l in locations}), session["sub"])
+                )
+                owned = {row[0] for row in await cursor.fetchall()}
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        allowed = [l for l in locations if l.driver_id in owned]
+        rejected = len(locations) - len(allowed)
+        locations = allowed
+
+    try:
+        accepted = location_ingestor.offer([(l.driver_id, l.lat, l.lon) for l in locations])
+    except LocationBackpressure:
+        raise HTTPException(
+            status_code=503,
+            detail="Location buffer full, please retry",
+            headers={"Retry-After": str(LOCATION_RETRY_AFTER)},
+        )
+
+    return LocationBatchResponse(accepted=accepted, pending=len(location_ingestor.pending), rejected=rejected)
+
+@app.get("/driver/supply", response_model=dict)
+async def get_driver_supply(city: Optional[str] = None):
+    """Online (available) and busy drivers per city, served from memory"""
+    cities = driver_supply.by_city()
+    if city is not None:
+        cities = {city: cities.get(city, {status: 0 for status in SUPPLY_STATUSES})}
+
+    return {
+        "cities": cities,
+        "total": {
+            status: sum(counts[status] for counts in driver_supply.counts.values())
+            for status in SUPPLY_STATUSES
+        },
+        "live": driver_supply.listening,
+        "reconciled_at": driver_supply.reconciled_at,
+    }
+
+@app.get("/driver/nearest", response_model=List[NearbyDriver])
+async def get_nearest_drivers(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    k: int = Query(5, ge=1, le=NEAREST_MAX_K),
+    radius_km: float = Query(NEAREST_MAX_RADIUS_KM, gt=0, le=NEAREST_MAX_RADIUS_KM),
+):
+    """The k closest online drivers to (lat, lon), served from the in-memory index"""
+    return [
+        NearbyDriver(driver_id=driver_id, lat=driver_lat, lon=driver_lon, distance_km=round(distance, 3))
+        for distance, driver_id, driver_lat, driver_lon in driver_index.nearest(lat, lon, k, radius_km)
+    ]
+
+# Reservations: a driver moves online -> busy with a reservation id when booked, and back to
+# online when that reservation is released or completed. Each transition is one conditional
+# UPDATE, so concurrent bookings of the same driver cannot both succeed and no lock is held
+# across requests.
+NEAREST_RESERVE_CANDIDATES = int(os.getenv("NEAREST_RESERVE_CANDIDATES", "10"))
+RESERVATION_BATCH_MAX_SIZE = int(os.getenv("RESERVATION_BATCH_MAX_SIZE", "500"))
+# A reservation with no ride after this long was abandoned (e.g. ride-service died between
+# reserving and inserting the ride) and is released by the sweep
+RESERVATION_ORPHAN_TIMEOUT = float(os.getenv("RESERVATION_ORPHAN_TIMEOUT", "60"))
+RESERVATION_SWEEP_INTERVAL = float(os.getenv("RESERVATION_SWEEP_INTERVAL", "30"))
+
+reservation_stats = {"reserved": 0, "conflicts": 0, "released": 0, "completed": 0, "expired": 0}
+stats_collector.register("reservations", lambda: reservation_stats)
+
+async def reservation_conflict(cursor, driver_id: int):
+    """404 or 409 for a reservation transition that matched no row"""
+    await cursor.execute("SELECT status FROM drivers WHERE id = %s", (driver_id,))
+    current = await cursor.fetchone()
+    if not current:
+        return HTTPException(status_code=404, detail="Driver not found")
+    reservation_stats["conflicts"] += 1
+    return HTTPException(status_code=409, detail=f"Driver is not available (status: {current[0]})")
+
+@app.post("/driver/reserve", response_model=ReservationResponse, dependencies=[Depends(authenticate_service)])
+async def reserve_driver(reservation: DriverReservation):
+    """Atomically book an online driver; 409 if someone else got there first"""
+    try:
+        reservation_id = uuid4()
+        async with db_cursor() as cursor:
+            await cursor.execute("""
+                UPDATE drivers
+                SET status = 'busy', reservation_id = %s, reserved_at = CURRENT_TIMESTAMP,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = %s AND status = 'online'
+                RETURNING id
+            """, (reservation_id, reservation.driver_id))
+
+            result = await cursor.fetchone()
+            if not result:
+                raise await reservation_conflict(cursor, reservation.driver_id)
+
+        reservation_stats["reserved"] += 1
+        driver_index.remove(reservation.driver_id)
+        await driver_cache.invalidate(reservation.driver_id)
+
+        return ReservationResponse(driver_id=reservation.driver_id, reservation_id=reservation_id, status="busy")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/driver/reserve/nearest", response_model=ReservationResponse, dependencies=[Depends(authenticate_service)])
+async def reserve_nearest_driver(reservation: NearestReservation):
+    """Book the closest available driver to a pickup point"""
+    candidates = [
+        driver_id for _, driver_id, _, _ in
+        driver_index.nearest(reservation.lat, reservation.lon, NEAREST_RESERVE_CANDIDATES, reservation.radius_km)
+    ]
+    if not candidates:
+        raise HTTPException(status_code=409, detail="No available driver nearby")
+
+    try:
+        reservation_id = uuid4()
+        async with db_cursor() as cursor:
+            # SKIP LOCKED: a candidate being booked by a concurrent request is passed over
+            # instead of waited on, so the next closest driver is taken
+            await cursor.execute("""
+                UPDATE drivers
+                SET status = 'busy', reservation_id = %s, reserved_at = CURRENT_TIMESTAMP,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = (
+                    SELECT id FROM drivers
+                    WHERE id = ANY(%s) AND status = 'online'
+                    ORDER BY array_position(%s, id)
+                    LIMIT 1
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING id
+            """, (reservation_id, candidates, candidates))
+
+            result = await cursor.fetchone()
+
+        if not result:
+            reservation_stats["conflicts"] += 1
+            raise HTTPException(status_code=409, detail="No available driver nearby")
+
+        reservation_stats["reserved"] += 1
+        driver_index.remove(result[0])
+        await driver_cache.invalidate(result[0])
+
+        return ReservationResponse(driver_id=result[0], reservation_id=reservation_id, status="busy")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/driver/reserve/batch", response_model=dict, dependencies=[Depends(authenticate_service)])
+async def reserve_drivers_batch(reservations: List[DriverReservation]):
+    """Book many drivers in one statement; per-item results in request order"""
+    if len(reservations) > RESERVATION_BATCH_MAX_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {RESERVATION_BATCH_MAX_SIZE} reservations per batch")
+
+    try:
+        reservation_ids = [uuid4() for _ in reservations]
+        async with db_cursor() as cursor:
+            # SKIP LOCKED: a driver being booked or updated by a concurrent request is
+            # reported unavailable instead of stalling the whole batch behind its lock; a
+            # driver requested twice goes to its first occurrence
+            await cursor.execute("""
+                WITH requested AS (
+                    SELECT DISTINCT ON (id) id, reservation_id
+                    FROM unnest(%s::int[], %s::uuid[]) WITH ORDINALITY AS t(id, reservation_id, ord)
+                    ORDER BY id, ord
+                ), locked AS (
+                    SELECT d.id, r.reservation_id
+                    FROM drivers d JOIN requested r ON r.id = d.id
+                    WHERE d.status = 'online'
+                    ORDER BY d.id
+                    FOR UPDATE OF d SKIP LOCKED
+                )
+                UPDATE drivers d
+                SET status = 'busy', reservation_id = l.reservation_id, reserved_at = CURRENT_TIMESTAMP,
+                    updated_at = CURRENT_TIMESTAMP
+                FROM locked l
+                WHERE d.id = l.id
+                RETURNING d.id, d.reservation_id
+            """, ([r.driver_id for r in reservations], reservation_ids))
+
+            reserved = dict(await cursor.fetchall())
+            missing = [r.driver_id for r in reservations if r.driver_id not in reserved]
+            existing = set()
+            if missing:
+                await cursor.execute("SELECT id FROM drivers WHERE id = ANY(%s)", (missing,))
+                existing = {row[0] for row in await cursor.fetchall()}
+
+        results = []
+        for index, (reservation, reservation_id) in enumerate(zip(reservations, reservation_ids)):
+            if reserved.get(reservation.driver_id) == reservation_id:
+                status = "busy"
+            elif reservation.driver_id in reserved or reservation.driver_id in existing:
+                status = "unavailable"
+            else:
+                status = "not_found"
+            results.append({
+                "index": index,
+                "driver_id": reservation.driver_id,
+                "reservation_id": str(reservation_id) if status == "busy" else None,
+                "status": status,
+            })
+
+        reservation_stats["reserved"] += len(reserved)
+        reservation_stats["conflicts"] += sum(1 for result in results if result["status"] == "unavailable")
+        for driver_id in reserved:
+            driver_index.remove(driver_id)
+            await driver_cache.invalidate(driver_id)
+
+        return {"results": results}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def end_reservation(reservation: ReservationEnd, outcome: str) -> ReservationResponse:
+    """Return a reserved driver to online, only if the reservation is still theirs"""
+    try:
+        async with db_cursor() as cursor:
+            await cursor.execute("""
+                UPDATE drivers
+                SET status = 'online', reservation_id = NULL, reserved_at = NULL, updated_at = CURRENT_TIMESTAMP
+                WHERE id = %s AND status = 'busy' AND reservation_id = %s
+                RETURNING id, lat, lon
+            """, (reservation.driver_id, reservation.reservation_id))
+
+            result = await cursor.fetchone()
+            if not result:
+                raise await reservation_conflict(cursor, reservation.driver_id)
+
+        reservation_stats[outcome] += 1
+        lat, lon = location_ingestor.latest(result[0]) or (result[1], result[2])
+        driver_index.apply(result[0], "online", lat, lon)
+        await driver_cache.invalidate(reservation.driver_id)
+
+        return ReservationResponse(driver_id=reservation.driver_id, status="online")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+class ReservationSweeper:
+    """Periodically frees drivers whose reservation never got a ride"""
+
+    def __init__(self):
+        self.task = None
+
+    async def sweep(self):
+        async with db_cursor() as cursor:
+            await cursor.execute("""
+                UPDATE drivers d
+                SET status = 'online', reservation_id = NULL, reserved_at = NULL, updated_at = CURRENT_TIMESTAMP
+                WHERE d.status = 'busy'
+                  AND d.reserved_at < LOCALTIMESTAMP - make_interval(secs => %s)
+                  AND NOT EXISTS (SELECT 1 FROM rides r WHERE r.driver_reservation_id = d.reservation_id)
+                RETURNING d.id, d.lat, d.lon
+            """, (RESERVATION_ORPHAN_TIMEOUT,))
+            rows = await cursor.fetchall()
+
+        for driver_id, lat, lon in rows:
+            lat, lon = location_ingestor.latest(driver_id) or (lat, lon)
+            driver_index.apply(driver_id, "online", lat, lon)
+            await driver_cache.invalidate(driver_id)
+        if rows:
+            reservation_stats["expired"] += len(rows)
+            print(f"Released {len(rows)} abandoned driver reservations")
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(RESERVATION_SWEEP_INTERVAL)
+            try:
+                await self.sweep()
+            except Exception as exc:
+                print(f"Reservation sweep failed: {exc}")
+
+reservation_sweeper = ReservationSweeper()
+
+@app.post("/driver/release", response_model=ReservationResponse, dependencies=[Depends(authenticate_service)])
+async def release_driver(reservation: ReservationEnd):
+    """Cancel a reservation (booking failed or was abandoned)"""
+    return await end_reservation(reservation, "released")
+
+@app.post("/driver/complete", response_model=ReservationResponse, dependencies=[Depends(authenticate_service)])
+async def complete_driver_ride(reservation: ReservationEnd):
+    """Finish the reserved ride; the driver becomes available again"""
+    return await end_reservation(reservation, "completed")
+
+def driver_row_to_dict(row) -> dict:
+    return {
+        "id": row[0],
+        "user_id": row[1],
+        "vehicle_number": row[2],
+        "vehicle_type": row[3],
+        "license_number": row[4],
+        "status": row[5],
+        "lat": row[6],
+        "lon": row[7],
+        "city": row[8]
+    }
+
+async def load_driver(driver_id: int):
+    async with db_cursor() as cursor:
+        await cursor.execute("""
+            SELECT id, user_id, vehicle_number, vehicle_type, license_number, status, lat, lon, city
+            FROM drivers
+            WHERE id = %s
+        """, (driver_id,))
+
+        result = await cursor.fetchone()
+
+    if not result:
+        return None
+
+    return driver_row_to_dict(result)
+
+DRIVER_BATCH_MAX_SIZE = int(os.getenv("DRIVER_BATCH_MAX_SIZE", "500"))
+
+def parse_driver_ids(ids: str) -> List[int]:
+    try:
+        driver_ids = [int(value) for value in ids.split(",") if value.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be a comma-separated list of integers")
+    if not driver_ids:
+        raise HTTPException(status_code=400, detail="ids must not be empty")
+    if len(driver_ids) > DRIVER_BATCH_MAX_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {DRIVER_BATCH_MAX_SIZE} ids per request")
+    return driver_ids
+
+@app.get("/driver/batch", response_model=dict)
+async def get_drivers_batch(ids: str = Query(..., description="Comma-separated driver ids")):
+    """Get many drivers with one query; per-id results in request order"""
+    driver_ids = parse_driver_ids(ids)
+
+    try:
+        async with db_cursor() as cursor:
+            await cursor.execute("""
+                SELECT id, user_id, vehicle_number, vehicle_type, license_number, status, lat, lon, city
+                FROM drivers
+                WHERE id = ANY(%s)
+            """, (driver_ids,))
+
+            drivers = {row[0]: driver_row_to_dict(row) for row in await cursor.fetchall()}
+
+        return {
+            "results": [
+                {
+                    "driver_id": driver_id,
+                    "status_code": 200 if driver_id in drivers else 404,
+                    "detail": None if driver_id in drivers else "Driver not found",
+                    "driver": drivers.get(driver_id),
+                }
+                for driver_id in driver_ids
+            ]
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.put("/driver/status/batch", response_model=dict)
+async def update_driver_status_batch(statuses: List[DriverStatus], session: Optional[dict] = Depends(authenticate)):
+    """Update many driver statuses in one statement; per-item results in request order.
+
+    Items follow the same rules as PUT /driver/status, including the ownership check
+    for signed-in callers (reported per item instead of failing the request); when a
+    driver appears more than once the last change wins.
+    """
+    if len(statuses) > DRIVER_BATCH_MAX_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {DRIVER_BATCH_MAX_SIZE} status changes per batch")
+
+    user_id = session["sub"] if session is not None else None
+    changes = {}
+    for status in statuses:
+        if status.status in ["online", "offline"]:
+            changes[status.driver_id] = status.status
+
+    try:
+        updated = {}
+        current = {}
+        if changes:
+            driver_ids = sorted(changes)
+            async with db_cursor() as cursor:
+                # Rows are locked in id order so concurrent batches cannot deadlock
+                await cursor.execute("""
+                    WITH requested AS (
+                        SELECT * FROM unnest(%s::int[], %s::text[]) AS t(id, status)
+                    ), locked AS (
+                        SELECT d.id, r.status
+                        FROM drivers d JOIN requested r ON r.id = d.id
+                        WHERE (d.status <> 'busy' OR r.status = 'offline')
+                          AND (%s::int IS NULL OR d.user_id = %s)
+                        ORDER BY d.id
+                        FOR UPDATE OF d
+                    )
+                    UPDATE drivers d
+                    SET status = l.status, reservation_id = NULL, reserved_at = NULL,
+                        updated_at = CURRENT_TIMESTAMP
+                    FROM locked l
+                    WHERE d.id = l.id
+                    RETURNING d.id, d.user_id, d.vehicle_number, d.vehicle_type, d.license_number,
+                              d.status, d.lat, d.lon, d.city
+                """, (driver_ids, [changes[driver_id] for driver_id in driver_ids], user_id, user_id))
+
+                updated = {row[0]: driver_row_to_dict(row) for row in await cursor.fetchall()}
+                missing = [driver_id for driver_id in driver_ids if driver_id not in updated]
+                if missing:
+                    await cursor.execute("SELECT id, user_id FROM drivers WHERE id = ANY(%s)", (missing,))
+                    current = dict(await cursor.fetchall())
+
+        for driver_id, driver in updated.items():
+            lat, lon = location_ingestor.latest(driver_id) or (driver["lat"], driver["lon"])
+            driver_index.apply(driver_id, driver["status"], lat, lon)
+            await driver_cache.invalidate(driver_id)
+
+        results = []
+        for index, status in enumerate(statuses):
+            if status.status not in ["online", "offline"]:
+                status_code, detail = 400, "Status must be 'online' or 'offline'"
+            elif status.driver_id in updated:
+                status_code, detail = 200, None
+            elif status.driver_id in current and user_id is not None and current[status.driver_id] != user_id:
+                status_code, detail = 403, "Cannot update another user's driver"
+            elif status.driver_id in current:
+                status_code, detail = 409, "Driver is on a ride"
+            else:
+                status_code, detail = 404, "Driver not found"
+            results.append({
+                "index": index,
+                "driver_id": status.driver_id,
+                "status_code": status_code,
+                "detail": detail,
+                "driver": updated.get(status.driver_id) if status_code == 200 else None,
+            })
+
+        return {"results": results}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/driver/{driver_id}", response_model=DriverResponse)
+async def get_driver(driver_id: int):
+    """Get driver by ID"""
+    try:
+        driver = await driver_cache.get_or_load(driver_id, lambda: load_driver(driver_id))
+        if driver is None:
+            raise HTTPException(status_code=404, detail="Driver not found")
+
+        return DriverResponse(**driver)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/metrics")
+async def metrics():
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
 
 @app.get("/health")
 async def health():
-    return {"status": "healthy", "service": "driver-service"}
+    return {
+        "status": "healthy",
+        "service": "driver-service",
+        "db_pool": db_pool_stats(),
+        "cache": driver_cache.stats(),
+        "driver_index": driver_index.stats(),
+        "location_ingest": location_ingestor.stats(),
+        "supply": driver_supply.stats(),
+        "session": session_verifier.stats(),
+    }
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8002)
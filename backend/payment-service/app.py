@@ -1,7 +1,27 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
+import psycopg
+from psycopg.conninfo import make_conninfo
+from psycopg.types.json import Jsonb
+from psycopg_pool import AsyncConnectionPool, PoolTimeout
+from typing import Any, List, Optional
+import os
+import re
+import asyncio
+import hashlib
+import json
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from enum import Enum
+from functools import lru_cache
+from collections import OrderedDict, deque
+from uuid import uuid4
 import uvicorn
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
 
 app = FastAPI(title="Payment Service", version="1.0.0")
 
@@ -14,6 +34,618 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Metrics (scraped from /metrics by Prometheus)
+SERVICE_NAME = "payment-service"
+
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests served", ["service", "method", "route", "status"])
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ["service", "method", "route"]
+)
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests being served", ["service"]).labels(SERVICE_NAME)
+DB_QUERY_SECONDS = Histogram(
+    "db_query_duration_seconds", "Database statement latency", ["service", "statement"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+
+@lru_cache(maxsize=512)
+def statement_label(query: str) -> str:
+    """Short label such as "select:rides" for a SQL statement"""
+    match = re.search(r"\b(INSERT\s+INTO|UPDATE|DELETE\s+FROM|FROM)\s+(\w+)", query, re.IGNORECASE)
+    if not match:
+        return "other"
+    verb = match.group(1).split()[0].lower()
+    return f"{'select' if verb == 'from' else verb}:{match.group(2).lower()}"
+
+class TimedCursor(psycopg.AsyncCursor):
+    """Cursor that records statement latency, labelled by statement_label()"""
+
+    async def execute(self, query, params=None, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await super().execute(query, params, **kwargs)
+        finally:
+            label = statement_label(query) if isinstance(query, str) else "other"
+            DB_QUERY_SECONDS.labels(SERVICE_NAME, label).observe(time.perf_counter() - start)
+
+    async def executemany(self, query, params_seq, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await super().executemany(query, params_seq, **kwargs)
+        finally:
+            label = statement_label(query) if isinstance(query, str) else "other"
+            DB_QUERY_SECONDS.labels(SERVICE_NAME, label).observe(time.perf_counter() - start)
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording per-route latency, status counts and in-flight requests"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            # The router stores the matched route in the scope; use its template to bound cardinality
+            route = scope.get("route")
+            path = route.path if route is not None else "unmatched"
+            HTTP_REQUEST_SECONDS.labels(SERVICE_NAME, scope["method"], path).observe(time.perf_counter() - start)
+            HTTP_REQUESTS.labels(SERVICE_NAME, scope["method"], path, str(status)).inc()
+
+class StatsCollector:
+    """Exposes components' stats() dicts as gauges, read at scrape time instead of on the hot path"""
+
+    def __init__(self):
+        self.sources = {}
+
+    def register(self, component: str, stats):
+        self.sources[component] = stats
+
+    def describe(self):
+        return []
+
+    def collect(self):
+        for component, stats in self.sources.items():
+            for key, value in stats().items():
+                name = f"{component}_{key}"
+                if isinstance(value, (bool, int, float)):
+                    family = GaugeMetricFamily(name, f"{component} {key}", labels=["service"])
+                    family.add_metric([SERVICE_NAME], float(value))
+                    yield family
+                elif isinstance(value, str):
+                    family = GaugeMetricFamily(name, f"{component} {key}", labels=["service", "value"])
+                    family.add_metric([SERVICE_NAME, value], 1.0)
+                    yield family
+
+stats_collector = StatsCollector()
+REGISTRY.register(stats_collector)
+
+# Callers send their remaining budget in X-Request-Timeout-Ms; work past it is abandoned,
+# since nobody is waiting for the answer any more
+request_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+deadline_stats = {"expired": 0}
+stats_collector.register("deadline", lambda: deadline_stats)
+
+class DeadlineMiddleware:
+    """Pure ASGI middleware bounding a request, including its DB queries, by the caller's budget"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        budget_ms = dict(scope.get("headers", ())).get(b"x-request-timeout-ms") if scope["type"] == "http" else None
+        try:
+            budget = int(budget_ms) / 1000 if budget_ms is not None else None
+        except ValueError:
+            budget = None
+        if budget is None:
+            await self.app(scope, receive, send)
+            return
+
+        request_deadline.set(time.monotonic() + budget)
+        started = False
+
+        async def send_tracking(message):
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        try:
+            # Cancelling an awaited query makes psycopg cancel it on the server too
+            async with asyncio.timeout(budget):
+                await self.app(scope, receive, send_tracking)
+        except TimeoutError:
+            deadline_stats["expired"] += 1
+            if started:
+                raise
+            await send({
+                "type": "http.response.start",
+                "status": 504,
+                "headers": [(b"content-type", b"application/json")],
+            })
+            await send({"type": "http.response.body", "body": b'{"detail":"Request deadline exceeded"}'})
+
+app.add_middleware(DeadlineMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+# Database connection
+DB_HOST = os.getenv("DB_HOST", "localhost")
+DB_NAME = os.getenv("DB_NAME", "ridebooking")
+DB_USER = os.getenv("DB_USER", "admin")
+DB_PASSWORD = os.getenv("DB_PASSWORD", "password")
+DB_PORT = os.getenv("DB_PORT", "5432")
+
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+DB_PREPARE_THRESHOLD = int(os.getenv("DB_PREPARE_THRESHOLD", "1"))
+
+async def configure_connection(conn):
+    # Server-side prepare hot statements after their first execution
+    conn.prepare_threshold = DB_PREPARE_THRESHOLD
+    conn.cursor_factory = TimedCursor
+
+db_pool = AsyncConnectionPool(
+    conninfo=make_conninfo(
+        host=DB_HOST,
+        dbname=DB_NAME,
+        user=DB_USER,
+        password=DB_PASSWORD,
+        port=DB_PORT
+    ),
+    min_size=DB_POOL_MIN_SIZE,
+    max_size=DB_POOL_MAX_SIZE,
+    timeout=DB_POOL_TIMEOUT,
+    configure=configure_connection,
+    check=AsyncConnectionPool.check_connection,
+    open=False,
+)
+
+@asynccontextmanager
+async def db_cursor():
+    """Borrow a pooled connection; commits on success, rolls back on error"""
+    try:
+        async with db_pool.connection() as conn:
+            async with conn.cursor() as cursor:
+                yield cursor
+    except PoolTimeout:
+        raise HTTPException(status_code=503, detail="Database busy, please retry")
+
+def db_pool_stats():
+    stats = db_pool.get_stats()
+    return {
+        "size": stats.get("pool_size", 0),
+        "available": stats.get("pool_available", 0),
+        "waiting": stats.get("requests_waiting", 0),
+        "max_size": DB_POOL_MAX_SIZE,
+    }
+
+stats_collector.register("db_pool", db_pool_stats)
+
+# Idempotency: results of requests sent with an Idempotency-Key are kept in an in-process
+# LRU in front of the payment_idempotency table, so a retried or hedged call gets the
+# first call's result instead of charging again
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "100000"))
+IDEMPOTENCY_TTL_HOURS = int(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+IDEMPOTENCY_CLAIM_TIMEOUT = float(os.getenv("IDEMPOTENCY_CLAIM_TIMEOUT", "30"))
+IDEMPOTENCY_WAIT = float(os.getenv("IDEMPOTENCY_WAIT", "2"))
+IDEMPOTENCY_POLL_INTERVAL = float(os.getenv("IDEMPOTENCY_POLL_INTERVAL", "0.05"))
+IDEMPOTENCY_PRUNE_INTERVAL = float(os.getenv("IDEMPOTENCY_PRUNE_INTERVAL", "300"))
+IDEMPOTENCY_PRUNE_BATCH = int(os.getenv("IDEMPOTENCY_PRUNE_BATCH", "10000"))
+
+def request_fingerprint(route: str, body) -> str:
+    return hashlib.sha256(f"{route}:{json.dumps(body, sort_keys=True)}".encode()).hexdigest()
+
+class ClaimState(Enum):
+    CLAIMED = "claimed"  # this call now owns the key and executes the request
+    IN_FLIGHT = "in_flight"  # another request holds the key; wait and claim again
+    COMPLETED = "completed"  # the key's response is stored and replayed
+
+@dataclass(frozen=True)
+class Claim:
+    """Outcome of an attempt to claim an Idempotency-Key"""
+    state: ClaimState
+    fingerprint: Optional[str] = None  # The holder's request fingerprint, when known
+    response: Any = None  # Set when COMPLETED
+
+class IdempotencyStore:
+    """Runs each Idempotency-Key at most once and replays its result.
+
+    Replays are served from the LRU when possible and from the table otherwise
+    (another replica, or after eviction). Concurrent requests for a key collapse onto
+    the in-flight execution in this process; across replicas the first INSERT claims
+    the key and the others wait up to IDEMPOTENCY_WAIT for its result. A claim whose
+    holder died is taken over after IDEMPOTENCY_CLAIM_TIMEOUT.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.inflight = {}
+        self.task = None
+        self.executed = 0
+        self.hits = 0
+        self.durable_hits = 0
+        self.collapsed = 0
+        self.conflicts = 0
+        self.evictions = 0
+        self.pruned = 0
+
+    def _check(self, fingerprint: str, stored: str):
+        if fingerprint != stored:
+            self.conflicts += 1
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+
+    def _remember(self, key: str, fingerprint: str, response):
+        self.entries[key] = (fingerprint, response)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    async def run(self, key: str, fingerprint: str, execute, persisted: bool = False):
+        """Result of execute() for this key, running it only if no earlier request did.
+
+        persisted means execute() itself stores the result in the key's row, in the
+        same transaction as its other writes.
+        """
+        entry = self.entries.get(key)
+        if entry is not None:
+            self._check(fingerprint, entry[0])
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+        pending = self.inflight.get(key)
+        if pending is not None:
+            self._check(fingerprint, pending[0])
+            self.collapsed += 1
+            return await asyncio.shield(pending[1])
+
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[key] = (fingerprint, future)
+        try:
+            response = await self._run_once(key, fingerprint, execute, persisted)
+            self._remember(key, fingerprint, response)
+            future.set_result(response)
+            return response
+        except BaseException as exc:
+            future.set_exception(exc)
+            future.exception()  # Mark retrieved when no other caller is waiting
+            raise
+        finally:
+            del self.inflight[key]
+
+    async def _claim(self, key: str, fingerprint: str) -> Claim:
+        """Take the key (or over a stale claim on it), else report who holds it"""
+        async with db_cursor() as cursor:
+            # The claim need not wait for its own fsync: the ledger commit that records the
+            # payment is synchronous and flushes the WAL up to and past this claim, so a
+            # claim can only be lost in a crash together with the payment it guards
+            await cursor.execute("SET LOCAL synchronous_commit TO OFF")
+            await cursor.execute("""
+                WITH claim AS (
+                    INSERT INTO payment_idempotency (key, fingerprint) VALUES (%s, %s)
+                    ON CONFLICT (key) DO UPDATE SET created_at = CURRENT_TIMESTAMP
+                    WHERE payment_idempotency.response IS NULL
+                      AND payment_idempotency.fingerprint = EXCLUDED.fingerprint
+                      AND payment_idempotency.created_at < CURRENT_TIMESTAMP - make_interval(secs => %s)
+                    RETURNING key
+                )
+                SELECT true, NULL, NULL FROM claim
+                UNION ALL
+                SELECT false, fingerprint, response FROM payment_idempotency
+                WHERE key = %s AND NOT EXISTS (SELECT 1 FROM claim)
+            """, (key, fingerprint, IDEMPOTENCY_CLAIM_TIMEOUT, key))
+            row = await cursor.fetchone()
+
+        if row is None:
+            # The conflicting claim committed after this statement's snapshot, or was
+            # released in between; the caller tries again
+            return Claim(ClaimState.IN_FLIGHT)
+        if row[0]:
+            return Claim(ClaimState.CLAIMED)
+        if row[2] is None:
+            return Claim(ClaimState.IN_FLIGHT, fingerprint=row[1])
+        return Claim(ClaimState.COMPLETED, fingerprint=row[1], response=row[2])
+
+    async def _run_once(self, key: str, fingerprint: str, execute, persisted: bool):
+        deadline = time.monotonic() + IDEMPOTENCY_WAIT
+        if request_deadline.get() is not None:
+            # Answer 409 while the caller is still listening, so it can retry
+            deadline = min(deadline, request_deadline.get() - IDEMPOTENCY_POLL_INTERVAL)
+        while True:
+            claim = await self._claim(key, fingerprint)
+            if claim.state is ClaimState.CLAIMED:
+                break
+            if claim.fingerprint is not None:
+                self._check(fingerprint, claim.fingerprint)
+            if claim.state is ClaimState.COMPLETED:
+                self.durable_hits += 1
+                return claim.response
+            if time.monotonic() >= deadline:
+                raise HTTPException(
+                    status_code=409,
+                    detail="A request with this Idempotency-Key is still in progress",
+                    headers={"Retry-After": "1"},
+                )
+            await asyncio.sleep(IDEMPOTENCY_POLL_INTERVAL)
+
+        try:
+            response = await execute()
+        except asyncio.CancelledError:
+            # The caller's deadline passed, but a payment already handed to the ledger still
+            # commits and fills in the claim; keep it, a stale one is taken over after
+            # IDEMPOTENCY_CLAIM_TIMEOUT
+            raise
+        except BaseException:
+            # Release the claim so that a retry executes again
+            try:
+                async with db_cursor() as cursor:
+                    await cursor.execute(
+                        "DELETE FROM payment_idempotency WHERE key = %s AND response IS NULL", (key,)
+                    )
+            except Exception as exc:
+                print(f"Idempotency claim release failed for {key}: {exc}")
+            raise
+
+        self.executed += 1
+        if persisted:
+            return response
+        try:
+            async with db_cursor() as cursor:
+                await cursor.execute(
+                    "UPDATE payment_idempotency SET response = %s WHERE key = %s", (Jsonb(response), key)
+                )
+        except Exception as exc:
+            # The result is still remembered in memory; other replicas see the claim
+            # until it times out
+            print(f"Idempotency result write failed for {key}: {exc}")
+        return response
+
+    async def prune(self):
+        while True:
+            async with db_cursor() as cursor:
+                await cursor.execute("""
+                    DELETE FROM payment_idempotency
+                    WHERE key IN (
+                        SELECT key FROM payment_idempotency
+                        WHERE created_at < CURRENT_TIMESTAMP - make_interval(hours => %s)
+                        LIMIT %s
+                    )
+                """, (IDEMPOTENCY_TTL_HOURS, IDEMPOTENCY_PRUNE_BATCH))
+                deleted = cursor.rowcount
+            self.pruned += deleted
+            if deleted < IDEMPOTENCY_PRUNE_BATCH:
+                return
+
+    def start(self):
+        self.task = asyncio.create_task(self.run_pruning())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    async def run_pruning(self):
+        while True:
+            try:
+                await self.prune()
+            except Exception as exc:
+                print(f"Idempotency key pruning failed: {exc}")
+            await asyncio.sleep(IDEMPOTENCY_PRUNE_INTERVAL)
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "inflight": len(self.inflight),
+            "executed": self.executed,
+            "hits": self.hits,
+            "durable_hits": self.durable_hits,
+            "collapsed": self.collapsed,
+            "conflicts": self.conflicts,
+            "evictions": self.evictions,
+            "pruned": self.pruned,
+        }
+
+idempotency_store = IdempotencyStore(IDEMPOTENCY_MAX_ENTRIES)
+stats_collector.register("idempotency", idempotency_store.stats)
+
+# Payment ledger: concurrent payments are queued and written in micro-batches, each batch
+# with one INSERT and one commit (group commit), so throughput is not bounded by fsyncs
+LEDGER_MAX_BATCH = int(os.getenv("LEDGER_MAX_BATCH", "256"))
+LEDGER_MAX_WAIT = float(os.getenv("LEDGER_MAX_WAIT", "0.002"))
+LEDGER_MAX_PENDING = int(os.getenv("LEDGER_MAX_PENDING", "10000"))
+LEDGER_WRITERS = int(os.getenv("LEDGER_WRITERS", "2"))
+LEDGER_RETRY_AFTER = int(os.getenv("LEDGER_RETRY_AFTER", "1"))
+
+class LedgerBusy(Exception):
+    pass
+
+class PaymentLedger:
+    """Records payments with group commit.
+
+    submit() queues a request and waits until the batch containing it has committed.
+    A batch is closed when it reaches max_batch payments or max_wait after its first
+    request arrived; up to `writers` batches commit at once, so the next batch fills
+    while the previous one is being written. The idempotency result of a keyed
+    request is written in the same transaction as its payments.
+    """
+
+    def __init__(self, max_batch: int, max_wait: float, max_pending: int, writers: int):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.max_pending = max_pending
+        self.queue = deque()  # (payments, idempotency key, many, future)
+        self.queued_payments = 0
+        self.ready = asyncio.Event()
+        self.full = asyncio.Event()
+        self.slots = asyncio.Semaphore(writers)
+        self.writing = set()
+        self.task = None
+        self.recorded = 0
+        self.batches = 0
+        self.failures = 0
+        self.rejected = 0
+        self.last_batch_size = 0
+        self.last_commit_ms = 0.0
+
+    async def submit(self, payments: list, idempotency_key: Optional[str] = None,
+                     many: bool = False):
+        """Ledger result for the payments once committed: a list if many, else the single result"""
+        if self.queued_payments + len(payments) > self.max_pending:
+            self.rejected += len(payments)
+            raise LedgerBusy()
+
+        future = asyncio.get_running_loop().create_future()
+        self.queue.append((payments, idempotency_key, many, future))
+        self.queued_payments += len(payments)
+        self.ready.set()
+        if self.queued_payments >= self.max_batch:
+            self.full.set()
+        return await future
+
+    def _take_batch(self):
+        batch = []
+        size = 0
+        while self.queue and (not batch or size + len(self.queue[0][0]) <= self.max_batch):
+            entry = self.queue.popleft()
+            batch.append(entry)
+            size += len(entry[0])
+        self.queued_payments -= size
+        if not self.queue:
+            self.ready.clear()
+        if self.queued_payments < self.max_batch:
+            self.full.clear()
+        return batch, size
+
+    async def write(self, batch, size: int):
+        start = time.perf_counter()
+        try:
+            results = []
+            rows = ([], [], [], [])
+            keyed = ([], [])
+            for payments, key, many, _ in batch:
+                items = []
+                for payment in payments:
+                    transaction_id = uuid4()
+                    items.append({
+                        "status": "SUCCESS",
+                        "ride_id": payment.ride_id,
+                        "amount": payment.amount,
+                        "transaction_id": str(transaction_id),
+                    })
+                    rows[0].append(transaction_id)
+                    rows[1].append(payment.ride_id)
+                    rows[2].append(payment.amount)
+                    rows[3].append("SUCCESS")
+                result = items if many else items[0]
+                results.append(result)
+                if key is not None:
+                    keyed[0].append(key)
+                    keyed[1].append(json.dumps(result))
+
+            async with db_cursor() as cursor:
+                await cursor.execute("""
+                    WITH new_payments AS (
+                        INSERT INTO payments (transaction_id, ride_id, amount, status)
+                        SELECT * FROM unnest(%s::uuid[], %s::int[], %s::numeric[], %s::text[])
+                    )
+                    UPDATE payment_idempotency p
+                    SET response = r.response::jsonb
+                    FROM unnest(%s::text[], %s::text[]) AS r(key, response)
+                    WHERE p.key = r.key
+                """, (*rows, *keyed))
+
+            self.recorded += size
+            self.batches += 1
+            self.last_batch_size = size
+            for (_, _, _, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        except BaseException as exc:
+            self.failures += 1
+            for _, _, _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+                    future.exception()  # Mark retrieved if the caller has gone away
+            if not isinstance(exc, Exception):
+                raise
+        finally:
+            self.last_commit_ms = (time.perf_counter() - start) * 1000
+            self.slots.release()
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """Commit everything already queued, then stop"""
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        while self.queue:
+            await self.slots.acquire()
+            await self.write(*self._take_batch())
+        await asyncio.gather(*self.writing, return_exceptions=True)
+
+    async def run(self):
+        while True:
+            await self.ready.wait()
+            if self.queued_payments < self.max_batch:
+                try:
+                    await asyncio.wait_for(self.full.wait(), self.max_wait)
+                except asyncio.TimeoutError:
+                    pass
+            await self.slots.acquire()
+            if not self.queue:
+                self.slots.release()
+                continue
+            task = asyncio.create_task(self.write(*self._take_batch()))
+            self.writing.add(task)
+            task.add_done_callback(self.writing.discard)
+
+    def stats(self):
+        return {
+            "queued": self.queued_payments,
+            "recorded": self.recorded,
+            "batches": self.batches,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "last_batch_size": self.last_batch_size,
+            "last_commit_ms": self.last_commit_ms,
+        }
+
+payment_ledger = PaymentLedger(LEDGER_MAX_BATCH, LEDGER_MAX_WAIT, LEDGER_MAX_PENDING, LEDGER_WRITERS)
+stats_collector.register("ledger", payment_ledger.stats)
+
+def ledger_busy_error():
+    return HTTPException(
+        status_code=503,
+        detail="Payment ledger is busy, please retry",
+        headers={"Retry-After": str(LEDGER_RETRY_AFTER)},
+    )
+
+def check_idempotency_key(key: str):
+    if not key or len(key) > 255:
+        raise HTTPException(status_code=400, detail="Idempotency-Key must be 1-255 characters")
+
 # Models
 class PaymentRequest(BaseModel):
     ride_id: int
@@ -25,22 +657,80 @@ class PaymentResponse(BaseModel):
     amount: float
     transaction_id: str
 
+@app.on_event("startup")
+async def startup():
+    # Tables and indexes are managed by backend/db-migrations, which runs once per deploy
+    await db_pool.open(wait=True)
+    payment_ledger.start()
+    idempotency_store.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await idempotency_store.stop()
+    await payment_ledger.stop()
+    await db_pool.close()
+
 @app.post("/payment/process", response_model=PaymentResponse)
-async def process_payment(payment: PaymentRequest):
-    """Dummy payment service - always returns SUCCESS"""
-    # Simulate instant payment success
-    transaction_id = f"TXN{payment.ride_id}{payment.amount}"
-    
-    return PaymentResponse(
-        status="SUCCESS",
-        ride_id=payment.ride_id,
-        amount=payment.amount,
-        transaction_id=transaction_id
-    )
+async def process_payment(payment: PaymentRequest, idempotency_key: Optional[str] = Header(None)):
+    """Charge for a ride; with an Idempotency-Key the charge runs once and retries replay its result"""
+    try:
+        if idempotency_key is None:
+            return await payment_ledger.submit([payment])
+
+        check_idempotency_key(idempotency_key)
+        fingerprint = request_fingerprint("/payment/process", payment.model_dump())
+        return await idempotency_store.run(
+            idempotency_key, fingerprint,
+            lambda: payment_ledger.submit([payment], idempotency_key),
+            persisted=True,
+        )
+    except HTTPException:
+        raise
+    except LedgerBusy:
+        raise ledger_busy_error()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/payment/process/batch", response_model=List[PaymentResponse])
+async def process_payment_batch(payments: List[PaymentRequest], idempotency_key: Optional[str] = Header(None)):
+    """Process many payments in one call; results are returned in request order.
+
+    An Idempotency-Key covers the whole batch.
+    """
+    if not payments:
+        return []
+
+    try:
+        if idempotency_key is None:
+            return await payment_ledger.submit(payments, many=True)
+
+        check_idempotency_key(idempotency_key)
+        fingerprint = request_fingerprint("/payment/process/batch", [payment.model_dump() for payment in payments])
+        return await idempotency_store.run(
+            idempotency_key, fingerprint,
+            lambda: payment_ledger.submit(payments, idempotency_key, many=True),
+            persisted=True,
+        )
+    except HTTPException:
+        raise
+    except LedgerBusy:
+        raise ledger_busy_error()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/metrics")
+async def metrics():
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
 
 @app.get("/health")
 async def health():
-    return {"status": "healthy", "service": "payment-service"}
+    return {
+        "status": "healthy",
+        "service": "payment-service",
+        "db_pool": db_pool_stats(),
+        "idempotency": idempotency_store.stats(),
+        "ledger": payment_ledger.stats(),
+    }
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8004)
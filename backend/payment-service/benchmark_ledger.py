@@ -0,0 +1,72 @@
+"""
+Payment ledger benchmark: group commit vs one commit per payment.
+
+Drives PaymentLedger directly (no HTTP) with BENCH_CONCURRENCY concurrent
+callers for BENCH_SECONDS per mode and reports payments/sec and latency.
+"unbatched" is the same ledger with batches of one and a writer per pool
+connection, i.e. an INSERT and a commit per payment; "batched" uses the
+LEDGER_* settings. Point it at a disposable local Postgres with migrations
+applied, e.g. the one in docker-compose-test.yml:
+
+    DB_HOST=localhost python benchmark_ledger.py
+
+Rows written by the benchmark (ride_id 0) are deleted afterwards.
+"""
+import asyncio
+import os
+import statistics
+import time
+
+import app
+
+BENCH_SECONDS = float(os.getenv("BENCH_SECONDS", "10"))
+BENCH_CONCURRENCY = int(os.getenv("BENCH_CONCURRENCY", "200"))
+BENCH_RIDE_ID = 0
+
+async def drive(ledger: app.PaymentLedger) -> dict:
+    latencies = []
+    stop_at = time.monotonic() + BENCH_SECONDS
+
+    async def caller():
+        payment = app.PaymentRequest(ride_id=BENCH_RIDE_ID, amount=100.0)
+        while time.monotonic() < stop_at:
+            start = time.perf_counter()
+            await ledger.submit([payment])
+            latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(caller() for _ in range(BENCH_CONCURRENCY)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "payments_per_sec": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000,
+        "avg_batch": ledger.recorded / max(ledger.batches, 1),
+    }
+
+async def main():
+    await app.db_pool.open(wait=True)
+    modes = [
+        ("unbatched", app.PaymentLedger(1, 0, BENCH_CONCURRENCY, app.DB_POOL_MAX_SIZE)),
+        ("batched", app.PaymentLedger(app.LEDGER_MAX_BATCH, app.LEDGER_MAX_WAIT, BENCH_CONCURRENCY, app.LEDGER_WRITERS)),
+    ]
+    print(f"{BENCH_CONCURRENCY} concurrent callers, {BENCH_SECONDS:.0f}s per mode")
+    results = {}
+    try:
+        for name, ledger in modes:
+            ledger.start()
+            results[name] = await drive(ledger)
+            await ledger.stop()
+            r = results[name]
+            print(f"{name:<10} {r['payments_per_sec']:>9.0f} payments/s   p50 {r['p50_ms']:6.1f} ms   "
+                  f"p99 {r['p99_ms']:6.1f} ms   avg batch {r['avg_batch']:6.1f}")
+        print(f"speedup    {results['batched']['payments_per_sec'] / results['unbatched']['payments_per_sec']:.1f}x")
+    finally:
+        async with app.db_cursor() as cursor:
+            await cursor.execute("DELETE FROM payments WHERE ride_id = %s", (BENCH_RIDE_ID,))
+        await app.db_pool.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,16 +1,38 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-import psycopg2
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+import psycopg
+from psycopg.conninfo import make_conninfo
+from psycopg_pool import AsyncConnectionPool, PoolTimeout
 import os
+import re
+import asyncio
+import hashlib
+import hmac
+import time
+from contextlib import asynccontextmanager
+from functools import lru_cache
 import httpx
 import json
 import base64
-from typing import Optional
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import List, Optional
+import numpy as np
 import uvicorn
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+import redis.asyncio
 from google.cloud import pubsub_v1
 from google.oauth2 import service_account
 
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
 app = FastAPI(title="Ride Service", version="1.0.0")
 
 # CORS middleware
@@ -20,7 +42,114 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
+)
+
+# Metrics (scraped from /metrics by Prometheus)
+SERVICE_NAME = "ride-service"
+
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests served", ["service", "method", "route", "status"])
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ["service", "method", "route"]
+)
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests being served", ["service"]).labels(SERVICE_NAME)
+DB_QUERY_SECONDS = Histogram(
+    "db_query_duration_seconds", "Database statement latency", ["service", "statement"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
 )
+DOWNSTREAM_SECONDS = Histogram(
+    "downstream_request_duration_seconds", "Latency of calls to other services",
+    ["service", "dependency", "outcome"]
+)
+
+@lru_cache(maxsize=512)
+def statement_label(query: str) -> str:
+    """Short label such as "select:rides" for a SQL statement"""
+    match = re.search(r"\b(INSERT\s+INTO|UPDATE|DELETE\s+FROM|FROM)\s+(\w+)", query, re.IGNORECASE)
+    if not match:
+        return "other"
+    verb = match.group(1).split()[0].lower()
+    return f"{'select' if verb == 'from' else verb}:{match.group(2).lower()}"
+
+class TimedCursor(psycopg.AsyncCursor):
+    """Cursor that records statement latency, labelled by statement_label()"""
+
+    async def execute(self, query, params=None, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await super().execute(query, params, **kwargs)
+        finally:
+            label = statement_label(query) if isinstance(query, str) else "other"
+            DB_QUERY_SECONDS.labels(SERVICE_NAME, label).observe(time.perf_counter() - start)
+
+    async def executemany(self, query, params_seq, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await super().executemany(query, params_seq, **kwargs)
+        finally:
+            label = statement_label(query) if isinstance(query, str) else "other"
+            DB_QUERY_SECONDS.labels(SERVICE_NAME, label).observe(time.perf_counter() - start)
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording per-route latency, status counts and in-flight requests"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            # The router stores the matched route in the scope; use its template to bound cardinality
+            route = scope.get("route")
+            path = route.path if route is not None else "unmatched"
+            HTTP_REQUEST_SECONDS.labels(SERVICE_NAME, scope["method"], path).observe(time.perf_counter() - start)
+            HTTP_REQUESTS.labels(SERVICE_NAME, scope["method"], path, str(status)).inc()
+
+class StatsCollector:
+    """Exposes components' stats() dicts as gauges, read at scrape time instead of on the hot path"""
+
+    def __init__(self):
+        self.sources = {}
+
+    def register(self, component: str, stats):
+        self.sources[component] = stats
+
+    def describe(self):
+        return []
+
+    def collect(self):
+        for component, stats in self.sources.items():
+            for key, value in stats().items():
+                name = f"{component}_{key}"
+                if isinstance(value, (bool, int, float)):
+                    family = GaugeMetricFamily(name, f"{component} {key}", labels=["service"])
+                    family.add_metric([SERVICE_NAME], float(value))
+                    yield family
+                elif isinstance(value, str):
+                    family = GaugeMetricFamily(name, f"{component} {key}", labels=["service", "value"])
+                    family.add_metric([SERVICE_NAME, value], 1.0)
+                    yield family
+
+stats_collector = StatsCollector()
+REGISTRY.register(stats_collector)
+
+app.add_middleware(MetricsMiddleware)
 
 # Database connection
 DB_HOST = os.getenv("DB_HOST", "localhost")
@@ -31,23 +160,355 @@ DB_PORT = os.getenv("DB_PORT", "5432")
 
 # Service URLs
 PAYMENT_SERVICE_URL = os.getenv("PAYMENT_SERVICE_URL", "http://payment-service:8004")
+DRIVER_SERVICE_URL = os.getenv("DRIVER_SERVICE_URL", "http://driver-service:8002")
 LAMBDA_API_URL = os.getenv("LAMBDA_API_URL", "")
 PUBSUB_PROJECT_ID = os.getenv("PUBSUB_PROJECT_ID", "")
 PUBSUB_RIDES_TOPIC = os.getenv("PUBSUB_RIDES_TOPIC", "")
 PUBSUB_CREDENTIALS_B64 = os.getenv("PUBSUB_PUBLISHER_CREDENTIALS", "")
 DISABLE_NOTIFICATIONS = os.getenv("DISABLE_NOTIFICATIONS", "false").lower() == "true"
 
-pubsub_publisher = None
-PUBSUB_TOPIC_PATH = None
+# Ride listing
+RIDES_PAGE_SIZE = int(os.getenv("RIDES_PAGE_SIZE", "50"))
+RIDES_MAX_PAGE_SIZE = int(os.getenv("RIDES_MAX_PAGE_SIZE", "500"))
+RIDES_EXPORT_BATCH_SIZE = int(os.getenv("RIDES_EXPORT_BATCH_SIZE", "2000"))
+RIDE_BATCH_MAX_SIZE = int(os.getenv("RIDE_BATCH_MAX_SIZE", "500"))
+
+# Live analytics: rolling per-city ride counts kept in memory
+ANALYTICS_WINDOWS = [int(w) for w in os.getenv("ANALYTICS_WINDOWS", "60,300,3600").split(",")]
+ANALYTICS_BUCKET_SECONDS = int(os.getenv("ANALYTICS_BUCKET_SECONDS", "1"))
+ANALYTICS_RESYNC_INTERVAL = float(os.getenv("ANALYTICS_RESYNC_INTERVAL", "60"))
+ANALYTICS_FIRESTORE_COLLECTION = os.getenv("ANALYTICS_FIRESTORE_COLLECTION", "")
+
+# Downstream HTTP clients (one keep-alive pool per dependency)
+PAYMENT_TIMEOUT = float(os.getenv("PAYMENT_TIMEOUT", "2.0"))
+# Payment calls carry an Idempotency-Key, so a slow attempt is abandoned and retried
+PAYMENT_ATTEMPT_TIMEOUT = float(os.getenv("PAYMENT_ATTEMPT_TIMEOUT", "0.5"))
+# Payment statuses that mean the charge was refused (the ride is cancelled)
+PAYMENT_DECLINED_STATUSES = set(os.getenv("PAYMENT_DECLINED_STATUSES", "FAILED,DECLINED").split(","))
+PAYMENT_MAX_CONNECTIONS = int(os.getenv("PAYMENT_MAX_CONNECTIONS", "100"))
+DRIVER_TIMEOUT = float(os.getenv("DRIVER_TIMEOUT", "2.0"))
+DRIVER_MAX_CONNECTIONS = int(os.getenv("DRIVER_MAX_CONNECTIONS", "100"))
+# Sent as X-Service-Token on driver reservation calls; same list as driver-service, first one is used
+SERVICE_TOKENS = [token for token in os.getenv("SERVICE_TOKENS", "").split(",") if token]
+NOTIFICATION_TIMEOUT = float(os.getenv("NOTIFICATION_TIMEOUT", "5.0"))
+NOTIFICATION_MAX_CONNECTIONS = int(os.getenv("NOTIFICATION_MAX_CONNECTIONS", "50"))
+# Ride notifications are queued per city, coalesced per ride and sent to the Lambda in batches
+NOTIFICATION_QUEUE_SIZE = int(os.getenv("NOTIFICATION_QUEUE_SIZE", "10000"))
+NOTIFICATION_BATCH_SIZE = int(os.getenv("NOTIFICATION_BATCH_SIZE", "100"))
+NOTIFICATION_FLUSH_INTERVAL = float(os.getenv("NOTIFICATION_FLUSH_INTERVAL", "0.5"))
+NOTIFICATION_SENDERS = int(os.getenv("NOTIFICATION_SENDERS", "4"))
+NOTIFICATION_DRAIN_TIMEOUT = float(os.getenv("NOTIFICATION_DRAIN_TIMEOUT", "10.0"))
+DOWNSTREAM_CONNECT_TIMEOUT = float(os.getenv("DOWNSTREAM_CONNECT_TIMEOUT", "1.0"))
+DOWNSTREAM_MAX_RETRIES = int(os.getenv("DOWNSTREAM_MAX_RETRIES", "2"))
+RETRY_BUDGET_RATIO = float(os.getenv("RETRY_BUDGET_RATIO", "0.2"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", "10.0"))
+
+# Side effects of starting a ride: "required" steps are awaited concurrently under the
+# request budget, "background" steps go to a bounded queue drained by worker tasks
+RIDE_START_BUDGET = float(os.getenv("RIDE_START_BUDGET", "3.0"))
+SIDE_EFFECT_STEPS = {
+    "payment": {
+        "criticality": os.getenv("PAYMENT_STEP_CRITICALITY", "required"),
+        "timeout": float(os.getenv("PAYMENT_STEP_TIMEOUT", "2.0")),
+    },
+    "driver_release": {
+        "criticality": "background",
+        "timeout": float(os.getenv("DRIVER_RELEASE_STEP_TIMEOUT", "5.0")),
+    },
+}
+SIDE_EFFECT_QUEUE_SIZE = int(os.getenv("SIDE_EFFECT_QUEUE_SIZE", "10000"))
+SIDE_EFFECT_WORKERS = int(os.getenv("SIDE_EFFECT_WORKERS", "32"))
+SIDE_EFFECT_DRAIN_TIMEOUT = float(os.getenv("SIDE_EFFECT_DRAIN_TIMEOUT", "10.0"))
+
+# Ride events are written to the outbox table and published by a background relay
+EVENT_PUBLISHER = os.getenv("EVENT_PUBLISHER", "auto")  # "pubsub", "local" or "auto"
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+OUTBOX_PUBLISH_CONCURRENCY = int(os.getenv("OUTBOX_PUBLISH_CONCURRENCY", "16"))
+OUTBOX_PUBLISH_TIMEOUT = float(os.getenv("OUTBOX_PUBLISH_TIMEOUT", "10"))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "1.0"))
+OUTBOX_MAX_BACKOFF = float(os.getenv("OUTBOX_MAX_BACKOFF", "300"))
+OUTBOX_RETENTION_HOURS = int(os.getenv("OUTBOX_RETENTION_HOURS", "24"))
 
-def get_db_connection():
-    return psycopg2.connect(
+event_publisher = None
+
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+DB_PREPARE_THRESHOLD = int(os.getenv("DB_PREPARE_THRESHOLD", "1"))
+
+async def configure_connection(conn):
+    # Server-side prepare hot statements after their first execution
+    conn.prepare_threshold = DB_PREPARE_THRESHOLD
+    conn.cursor_factory = TimedCursor
+
+db_pool = AsyncConnectionPool(
+    conninfo=make_conninfo(
         host=DB_HOST,
-        database=DB_NAME,
+        dbname=DB_NAME,
         user=DB_USER,
         password=DB_PASSWORD,
         port=DB_PORT
-    )
+    ),
+    min_size=DB_POOL_MIN_SIZE,
+    max_size=DB_POOL_MAX_SIZE,
+    timeout=DB_POOL_TIMEOUT,
+    configure=configure_connection,
+    check=AsyncConnectionPool.check_connection,
+    open=False,
+)
+
+@asynccontextmanager
+async def db_cursor():
+    """Borrow a pooled connection; commits on success, rolls back on error"""
+    try:
+        async with db_pool.connection() as conn:
+            async with conn.cursor() as cursor:
+                yield cursor
+    except PoolTimeout:
+        raise HTTPException(status_code=503, detail="Database busy, please retry")
+
+def db_pool_stats():
+    stats = db_pool.get_stats()
+    return {
+        "size": stats.get("pool_size", 0),
+        "available": stats.get("pool_available", 0),
+        "waiting": stats.get("requests_waiting", 0),
+        "max_size": DB_POOL_MAX_SIZE,
+    }
+
+stats_collector.register("db_pool", db_pool_stats)
+
+# Entity cache: in-process LRU with TTL in front of an optional shared Redis tier
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+CACHE_LOCAL_TTL = float(os.getenv("CACHE_LOCAL_TTL", "5"))
+CACHE_SHARED_TTL = float(os.getenv("CACHE_SHARED_TTL", "60"))
+CACHE_NEGATIVE_TTL = float(os.getenv("CACHE_NEGATIVE_TTL", "2"))
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "")
+
+class RedisCacheTier:
+    """Shared cache tier so replicas do not each go to Postgres for the same row"""
+
+    def __init__(self, url: str):
+        self.client = redis.asyncio.from_url(url)
+
+    async def get(self, key: str):
+        return await self.client.get(key)
+
+    async def set(self, key: str, value: str, ttl: float):
+        await self.client.set(key, value, px=int(ttl * 1000))
+
+    async def delete(self, key: str):
+        await self.client.delete(key)
+
+    async def close(self):
+        await self.client.aclose()
+
+class EntityCache:
+    """Read-through cache for rows looked up by id.
+
+    Not-found results are cached for CACHE_NEGATIVE_TTL, concurrent misses on the same
+    key share a single load, and writers call invalidate() after they commit.
+    """
+
+    def __init__(self, name: str, max_entries: int, ttl: float, negative_ttl: float):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.shared = None
+        self.entries = OrderedDict()
+        self.loading = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+
+    async def get_or_load(self, key, loader):
+        """Return the cached value for key, calling loader() on a miss; None means not found"""
+        key = f"{self.name}:{key}"
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+        pending = self.loading.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self.loading[key] = future
+        try:
+            value = await self._load(key, loader, future)
+            future.set_result(value)
+            return value
+        except BaseException as exc:
+            future.set_exception(exc)
+            future.exception()  # Mark retrieved when no other caller is waiting
+            raise
+        finally:
+            if self.loading.get(key) is future:
+                del self.loading[key]
+
+    async def _load(self, key: str, loader, future):
+        if self.shared is not None:
+            try:
+                raw = await self.shared.get(key)
+                if raw is not None:
+                    value = json.loads(raw)
+                    self._store(key, value, future)
+                    self.hits += 1
+                    return value
+            except Exception as exc:
+                print(f"Shared cache read failed for {key}: {exc}")
+
+        self.misses += 1
+        value = await loader()
+        # A write that invalidated this key while we were loading wins over our result
+        if self._store(key, value, future) and self.shared is not None:
+            try:
+                await self.shared.set(key, json.dumps(value), CACHE_SHARED_TTL if value is not None else self.negative_ttl)
+            except Exception as exc:
+                print(f"Shared cache write failed for {key}: {exc}")
+        return value
+
+    def _store(self, key: str, value, future) -> bool:
+        if self.loading.get(key) is not future:
+            return False
+        ttl = self.ttl if value is not None else self.negative_ttl
+        self.entries[key] = (time.monotonic() + ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+        return True
+
+    async def invalidate(self, key):
+        key = f"{self.name}:{key}"
+        self.entries.pop(key, None)
+        self.loading.pop(key, None)
+        if self.shared is not None:
+            try:
+                await self.shared.delete(key)
+            except Exception as exc:
+                print(f"Shared cache invalidation failed for {key}: {exc}")
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "coalesced": self.coalesced,
+            "shared": self.shared is not None,
+        }
+
+ride_cache = EntityCache("ride", CACHE_MAX_ENTRIES, CACHE_LOCAL_TTL, CACHE_NEGATIVE_TTL)
+stats_collector.register("cache", ride_cache.stats)
+
+# Session tokens are issued by user-service ("<kid>.<claims>.<signature>", HMAC-SHA256) and
+# verified here without a users lookup. SESSION_SIGNING_KEYS lists every key that may verify
+# ("kid:secret,..."), so it must match user-service's list across a rotation. Anonymous calls
+# are still accepted unless AUTH_REQUIRED is set.
+SESSION_SIGNING_KEYS = os.getenv("SESSION_SIGNING_KEYS", "dev:insecure-dev-session-key")
+SESSION_CACHE_MAX_ENTRIES = int(os.getenv("SESSION_CACHE_MAX_ENTRIES", "10000"))
+AUTH_REQUIRED = os.getenv("AUTH_REQUIRED", "false").lower() == "true"
+
+def parse_signing_keys(value: str) -> dict:
+    keys = {}
+    for entry in value.split(","):
+        kid, _, secret = entry.strip().partition(":")
+        if kid and secret:
+            keys[kid] = secret.encode()
+    return keys
+
+def b64url_decode(value: str) -> bytes:
+    return base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+
+class InvalidToken(Exception):
+    pass
+
+class SessionVerifier:
+    """Checks session token signatures and expiry locally.
+
+    Verified claims are kept in a bounded LRU keyed by the token string, so a client
+    presenting the same token again costs a dict lookup instead of an HMAC and a JSON
+    parse. Entries are dropped once their token expires.
+    """
+
+    def __init__(self, keys: dict, max_entries: int):
+        self.keys = keys
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+
+    def _check(self, token: str, now: float) -> dict:
+        try:
+            kid, body, signature = token.split(".")
+            key = self.keys.get(kid)
+            if key is None:
+                raise InvalidToken("Unknown signing key")
+            expected = hmac.new(key, f"{kid}.{body}".encode(), hashlib.sha256).digest()
+            if not hmac.compare_digest(expected, b64url_decode(signature)):
+                raise InvalidToken("Invalid token signature")
+            claims = json.loads(b64url_decode(body))
+        except ValueError:
+            raise InvalidToken("Malformed token")
+        if claims.get("exp", 0) <= now:
+            raise InvalidToken("Token expired")
+        return claims
+
+    def verify(self, token: str) -> dict:
+        now = time.time()
+        claims = self.entries.get(token)
+        if claims is not None:
+            if claims["exp"] > now:
+                self.entries.move_to_end(token)
+                self.hits += 1
+                return claims
+            del self.entries[token]
+
+        self.misses += 1
+        try:
+            claims = self._check(token, now)
+        except InvalidToken:
+            self.rejected += 1
+            raise
+
+        self.entries[token] = claims
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return claims
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "rejected": self.rejected,
+            "keys": len(self.keys),
+        }
+
+session_verifier = SessionVerifier(parse_signing_keys(SESSION_SIGNING_KEYS), SESSION_CACHE_MAX_ENTRIES)
+stats_collector.register("session", session_verifier.stats)
+
+def authenticate(authorization: Optional[str] = Header(None)) -> Optional[dict]:
+    """Session claims from the Authorization header; None for anonymous calls when AUTH_REQUIRED is off"""
+    if not authorization:
+        if AUTH_REQUIRED:
+            raise HTTPException(status_code=401, detail="Authentication required", headers={"WWW-Authenticate": "Bearer"})
+        return None
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(status_code=401, detail="Expected a Bearer token", headers={"WWW-Authenticate": "Bearer"})
+    try:
+        return session_verifier.verify(token.strip())
+    except InvalidToken as e:
+        raise HTTPException(status_code=401, detail=str(e), headers={"WWW-Authenticate": "Bearer"})
 
 # Models
 class RideStart(BaseModel):
@@ -56,6 +517,21 @@ class RideStart(BaseModel):
     pickup: str
     drop: str
     city: str
+    vehicle_type: Optional[str] = None
+    distance_km: Optional[float] = Field(None, ge=0)
+    pickup_lat: Optional[float] = None
+    pickup_lon: Optional[float] = None
+    drop_lat: Optional[float] = None
+    drop_lon: Optional[float] = None
+
+class FareQuoteRequest(BaseModel):
+    city: str
+    vehicle_type: Optional[str] = None
+    distance_km: Optional[float] = None
+    pickup_lat: Optional[float] = None
+    pickup_lon: Optional[float] = None
+    drop_lat: Optional[float] = None
+    drop_lon: Optional[float] = None
 
 class RideResponse(BaseModel):
     id: int
@@ -69,34 +545,66 @@ class RideResponse(BaseModel):
 
 @app.on_event("startup")
 async def startup():
-    # Initialize database table
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS rides (
-            id SERIAL PRIMARY KEY,
-            rider_id INTEGER NOT NULL,
-            driver_id INTEGER NOT NULL,
-            pickup VARCHAR(255) NOT NULL,
-            drop_location VARCHAR(255) NOT NULL,
-            city VARCHAR(100) NOT NULL,
-            status VARCHAR(50) DEFAULT 'started',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    conn.commit()
-    cursor.close()
-    conn.close()
+    # Tables and indexes are managed by backend/db-migrations, which runs once per deploy
+    await db_pool.open(wait=True)
+    if CACHE_REDIS_URL:
+        ride_cache.shared = RedisCacheTier(CACHE_REDIS_URL)
+
+    payment_client.open()
+    driver_client.open()
+    notification_client.open()
+    side_effects.start()
+    notifications.start()
+    init_event_publisher()
+    outbox_relay.start()
+
+    await ride_analytics.resync()
+    ride_analytics.start()
+    fare_engine.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await fare_engine.stop()
+    await ride_analytics.stop()
+    await side_effects.stop()
+    await notifications.stop()
+    await outbox_relay.stop()
+    await payment_client.close()
+    await driver_client.close()
+    await notification_client.close()
+    if ride_cache.shared is not None:
+        await ride_cache.shared.close()
+    await db_pool.close()
+
+class PubSubEventPublisher:
+    """Publishes ride events to the configured Google Pub/Sub topic"""
+
+    name = "pubsub"
+
+    def __init__(self, client, topic_path: str):
+        self.client = client
+        self.topic_path = topic_path
+
+    async def publish(self, data: bytes, city: str):
+        # The client batches and sends on its own threads; await without blocking the loop
+        await asyncio.wrap_future(self.client.publish(self.topic_path, data, city=city))
 
-    init_pubsub()
+class LocalEventPublisher:
+    """In-process stand-in for Pub/Sub, used for local runs and tests"""
+
+    name = "local"
+
+    def __init__(self, max_events: int = 1000):
+        self.events = deque(maxlen=max_events)
+
+    async def publish(self, data: bytes, city: str):
+        self.events.append({"city": city, "data": json.loads(data)})
 
 def init_pubsub():
     """Initialize Pub/Sub publisher client"""
-    global pubsub_publisher, PUBSUB_TOPIC_PATH
-
     if not PUBSUB_PROJECT_ID or not PUBSUB_RIDES_TOPIC:
         print("Pub/Sub configuration missing, skipping publisher init")
-        return
+        return None
 
     credentials = None
     if PUBSUB_CREDENTIALS_B64:
@@ -108,198 +616,1436 @@ def init_pubsub():
             print(f"Unable to parse Pub/Sub credentials: {exc}")
 
     try:
-        pubsub_publisher = pubsub_v1.PublisherClient(credentials=credentials)
-        PUBSUB_TOPIC_PATH = pubsub_publisher.topic_path(PUBSUB_PROJECT_ID, PUBSUB_RIDES_TOPIC)
-        print(f"Configured Pub/Sub publisher for topic {PUBSUB_TOPIC_PATH}")
+        client = pubsub_v1.PublisherClient(credentials=credentials)
+        topic_path = client.topic_path(PUBSUB_PROJECT_ID, PUBSUB_RIDES_TOPIC)
+        print(f"Configured Pub/Sub publisher for topic {topic_path}")
+        return PubSubEventPublisher(client, topic_path)
     except Exception as exc:
         print(f"Failed to initialize Pub/Sub publisher: {exc}")
-        pubsub_publisher = None
-        PUBSUB_TOPIC_PATH = None
+        return None
 
-async def publish_to_pubsub(ride_data: dict):
-    """Publish ride event to Google Pub/Sub"""
-    global pubsub_publisher, PUBSUB_TOPIC_PATH
+def init_event_publisher():
+    """Select the publisher used by the outbox relay"""
+    global event_publisher
 
-    if not pubsub_publisher or not PUBSUB_TOPIC_PATH:
-        print("Pub/Sub publisher not configured, skipping publish")
-        return
+    if EVENT_PUBLISHER != "local":
+        event_publisher = init_pubsub()
 
-    try:
-        future = pubsub_publisher.publish(
-            PUBSUB_TOPIC_PATH,
-            json.dumps(ride_data).encode("utf-8"),
-            city=ride_data.get("city", "unknown")
+    if event_publisher is None and EVENT_PUBLISHER != "pubsub":
+        print("Using local event publisher")
+        event_publisher = LocalEventPublisher()
+    elif event_publisher is None:
+        # Leave events pending in the outbox until Pub/Sub is reachable again
+        print("Pub/Sub publisher unavailable, ride events will stay in the outbox")
+
+class OutboxRelay:
+    """Background task that drains ride_outbox in batches and publishes the events"""
+
+    def __init__(self):
+        self.wakeup = asyncio.Event()
+        self.task = None
+        self.stopping = False
+        self.published = 0
+        self.failed = 0
+        self.last_purge = 0.0
+
+    def start(self):
+        self.stopping = False
+        self.task = asyncio.create_task(self.run())
+
+    def wake(self):
+        self.wakeup.set()
+
+    async def stop(self):
+        if self.task is None:
+            return
+        self.stopping = True
+        self.wakeup.set()
+        await self.task
+        self.task = None
+
+    async def run(self):
+        while not self.stopping:
+            self.wakeup.clear()
+            try:
+                drained = await self.drain_batch()
+                await self.purge_delivered()
+            except Exception as exc:
+                print(f"Outbox relay error: {exc}")
+                drained = 0
+
+            # A full batch means there is probably more waiting; otherwise sleep until woken
+            if drained < OUTBOX_BATCH_SIZE and not self.stopping:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), OUTBOX_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def drain_batch(self) -> int:
+        if event_publisher is None:
+            return 0
+
+        async with db_cursor() as cursor:
+            # SKIP LOCKED lets every replica run a relay without publishing the same row twice
+            await cursor.execute("""
+                SELECT id, city, payload
+                FROM ride_outbox
+                WHERE delivered_at IS NULL AND next_attempt_at <= CURRENT_TIMESTAMP
+                ORDER BY id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            """, (OUTBOX_BATCH_SIZE,))
+            rows = await cursor.fetchall()
+            if not rows:
+                return 0
+
+            semaphore = asyncio.Semaphore(OUTBOX_PUBLISH_CONCURRENCY)
+
+            async def publish(row):
+                async with semaphore:
+                    data = json.dumps(row[2]).encode("utf-8")
+                    start = time.perf_counter()
+                    outcome = "exception"
+                    try:
+                        await asyncio.wait_for(event_publisher.publish(data, row[1]), OUTBOX_PUBLISH_TIMEOUT)
+                        outcome = "ok"
+                    finally:
+                        DOWNSTREAM_SECONDS.labels(SERVICE_NAME, event_publisher.name, outcome).observe(
+                            time.perf_counter() - start
+                        )
+
+            results = await asyncio.gather(*(publish(row) for row in rows), return_exceptions=True)
+
+            delivered = [row[0] for row, error in zip(rows, results) if error is None]
+            failed = [
+                (repr(error), OUTBOX_MAX_BACKOFF, row[0])
+                for row, error in zip(rows, results) if error is not None
+            ]
+
+            if delivered:
+                await cursor.execute("""
+                    UPDATE ride_outbox SET delivered_at = CURRENT_TIMESTAMP
+                    WHERE id = ANY(%s)
+                """, (delivered,))
+            if failed:
+                await cursor.executemany("""
+                    UPDATE ride_outbox
+                    SET attempts = attempts + 1,
+                        last_error = %s,
+                        next_attempt_at = CURRENT_TIMESTAMP
+                            + LEAST(POWER(2, attempts), %s) * INTERVAL '1 second'
+                    WHERE id = %s
+                """, failed)
+
+        self.published += len(delivered)
+        self.failed += len(failed)
+        if failed:
+            print(f"Outbox relay: {len(failed)} of {len(rows)} events failed, will retry")
+        return len(rows)
+
+    async def purge_delivered(self):
+        if time.monotonic() - self.last_purge < 60:
+            return
+        self.last_purge = time.monotonic()
+
+        async with db_cursor() as cursor:
+            await cursor.execute("""
+                DELETE FROM ride_outbox
+                WHERE delivered_at < CURRENT_TIMESTAMP - %s * INTERVAL '1 hour'
+            """, (OUTBOX_RETENTION_HOURS,))
+
+    def stats(self):
+        return {
+            "publisher": event_publisher.name if event_publisher else None,
+            "published": self.published,
+            "failed": self.failed,
+        }
+
+outbox_relay = OutboxRelay()
+stats_collector.register("outbox", outbox_relay.stats)
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit breaker is open"""
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed -> open -> half_open (one trial call) -> closed"""
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.times_opened = 0
+
+    def allow(self) -> bool:
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.state = "half_open"
+            self.trial_in_flight = False
+        if self.state == "half_open":
+            if self.trial_in_flight:
+                return False
+            self.trial_in_flight = True
+        return True
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_in_flight = False
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                self.times_opened += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+class RetryBudget:
+    """Token bucket that caps retries at a fraction of recent requests"""
+
+    def __init__(self, ratio: float, max_tokens: float = 10.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+
+    def deposit(self):
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+class DownstreamClient:
+    """Long-lived keep-alive HTTP client for one dependency, with a breaker and retry budget"""
+
+    def __init__(self, name: str, base_url: str = "", timeout: float = 5.0,
+                 max_connections: int = 100, http2: bool = False, attempt_timeout: Optional[float] = None,
+                 headers: Optional[dict] = None):
+        self.name = name
+        self.base_url = base_url
+        self.headers = headers
+        self.timeout = timeout
+        self.attempt_timeout = attempt_timeout
+        self.max_connections = max_connections
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self.breaker = CircuitBreaker(BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_TIMEOUT)
+        self.retry_budget = RetryBudget(RETRY_BUDGET_RATIO)
+        self.client = None
+        self.requests = 0
+        self.connections_opened = 0
+        self.retries = 0
+        self.rejected = 0
+
+    def open(self):
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers=self.headers,
+            timeout=httpx.Timeout(self.timeout, connect=DOWNSTREAM_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections,
+                keepalive_expiry=30.0,
+            ),
+            http2=self.http2,
         )
-        future.result(timeout=10)
-        print(f"Published ride event to Pub/Sub: {ride_data}")
-    except Exception as e:
-        print(f"Error publishing to Pub/Sub: {str(e)}")
-        # Don't fail the request if Pub/Sub is unavailable
-
-async def call_notification_lambda(ride_id: int, city: str):
-    """Call notification Lambda via API Gateway"""
-    if DISABLE_NOTIFICATIONS or not LAMBDA_API_URL:
-        print("Notifications disabled or API URL not configured")
-        return
-    
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    async def _trace(self, event_name: str, info: dict):
+        # Every request that does not open a TCP connection reused a pooled one
+        if event_name == "connection.connect_tcp.complete":
+            self.connections_opened += 1
+
+    async def post(self, url: str, json, deadline: Optional[float] = None,
+                   idempotency_key: Optional[str] = None) -> httpx.Response:
+        """POST within a deadline (time.monotonic() based); the remaining budget is propagated.
+
+        With an idempotency_key the server runs the request at most once, so timeouts,
+        5xx and 409 (still in progress) are retried too, each attempt capped at
+        attempt_timeout.
+        """
+        if deadline is None:
+            deadline = time.monotonic() + self.timeout
+        if not self.breaker.allow():
+            self.rejected += 1
+            DOWNSTREAM_SECONDS.labels(SERVICE_NAME, self.name, "rejected").observe(0)
+            raise CircuitOpenError(f"{self.name} circuit is open")
+
+        start = time.perf_counter()
+        outcome = "exception"
+        try:
+            response = await self._post_with_retries(url, json, deadline, idempotency_key)
+            outcome = "error" if response.status_code >= 500 else "ok"
+            return response
+        except BaseException as exc:
+            # Transport errors are recorded by _post_with_retries; anything else, including
+            # cancellation by a caller's wait_for, must still release a half-open trial
+            if not isinstance(exc, httpx.RequestError):
+                self.breaker.record_failure()
+            raise
+        finally:
+            DOWNSTREAM_SECONDS.labels(SERVICE_NAME, self.name, outcome).observe(time.perf_counter() - start)
+
+    async def _post_with_retries(self, url: str, json, deadline: float,
+                                 idempotency_key: Optional[str] = None) -> httpx.Response:
+        self.retry_budget.deposit()
+        attempt = 0
+        headers = {"Idempotency-Key": idempotency_key} if idempotency_key else {}
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.breaker.record_failure()
+                raise httpx.TimeoutException(f"{self.name} deadline exceeded")
+            can_retry = attempt < DOWNSTREAM_MAX_RETRIES
+            attempt_timeout = remaining
+            if idempotency_key and self.attempt_timeout and can_retry:
+                attempt_timeout = min(remaining, self.attempt_timeout)
+
+            self.requests += 1
+            try:
+                response = await self.client.post(
+                    url,
+                    json=json,
+                    headers={**headers, "X-Request-Timeout-Ms": str(int(remaining * 1000))},
+                    timeout=httpx.Timeout(attempt_timeout, connect=min(attempt_timeout, DOWNSTREAM_CONNECT_TIMEOUT)),
+                    extensions={"trace": self._trace},
+                )
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout):
+                # The request never reached the server, so retrying cannot duplicate it
+                if can_retry and self.retry_budget.withdraw():
+                    attempt += 1
+                    self.retries += 1
+                    continue
+                self.breaker.record_failure()
+                raise
+            except httpx.RequestError:
+                # It may have reached the server; only safe to repeat under an idempotency key
+                if idempotency_key and can_retry and self.retry_budget.withdraw():
+                    attempt += 1
+                    self.retries += 1
+                    continue
+                self.breaker.record_failure()
+                raise
+
+            if idempotency_key and (response.status_code >= 500 or response.status_code == 409) \
+                    and can_retry and self.retry_budget.withdraw():
+                attempt += 1
+                self.retries += 1
+                continue
+            if response.status_code >= 500:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            return response
+
+    def stats(self):
+        return {
+            "breaker_state": self.breaker.state,
+            "breaker_opened": self.breaker.times_opened,
+            "requests": self.requests,
+            "connections_opened": self.connections_opened,
+            "retries": self.retries,
+            "rejected": self.rejected,
+            "http2": self.http2,
+        }
+
+payment_client = DownstreamClient(
+    "payment",
+    base_url=PAYMENT_SERVICE_URL,
+    timeout=PAYMENT_TIMEOUT,
+    max_connections=PAYMENT_MAX_CONNECTIONS,
+    attempt_timeout=PAYMENT_ATTEMPT_TIMEOUT,
+)
+driver_client = DownstreamClient(
+    "driver",
+    base_url=DRIVER_SERVICE_URL,
+    timeout=DRIVER_TIMEOUT,
+    max_connections=DRIVER_MAX_CONNECTIONS,
+    headers={"X-Service-Token": SERVICE_TOKENS[0]} if SERVICE_TOKENS else None,
+)
+notification_client = DownstreamClient(
+    "notification",
+    timeout=NOTIFICATION_TIMEOUT,
+    max_connections=NOTIFICATION_MAX_CONNECTIONS,
+    http2=True,
+)
+stats_collector.register("payment_client", payment_client.stats)
+stats_collector.register("driver_client", driver_client.stats)
+stats_collector.register("notification_client", notification_client.stats)
+
+class NotificationDispatcher:
+    """Sends ride notifications to the Lambda in batches, off the booking path.
+
+    notify() only enqueues and never blocks or fails a booking. Pending notifications
+    are kept per city and keyed by ride_id, so a repeated notification for a ride
+    replaces the queued one. A batch is sent once max_batch are pending or
+    flush_interval after the first one arrived, taking rides from each city in turn;
+    up to `senders` batches are in flight at once. When max_pending is reached the
+    oldest notification of the city with the largest backlog is shed, so a surge in
+    one city cannot crowd out the others.
+    """
+
+    def __init__(self, max_batch: int, flush_interval: float, max_pending: int, senders: int):
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.pending = {}  # city -> {ride_id: notification}, oldest first
+        self.depth = 0
+        self.ready = asyncio.Event()
+        self.full = asyncio.Event()
+        self.slots = asyncio.Semaphore(senders)
+        self.sending = set()
+        self.task = None
+        self.enqueued = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.sent = 0
+        self.failed = 0
+        self.batches = 0
+        self.last_batch_size = 0
+        self.last_flush_ms = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return not DISABLE_NOTIFICATIONS and bool(LAMBDA_API_URL)
+
+    def notify(self, ride_id: int, city: str):
+        if not self.enabled:
+            return
+        self.enqueued += 1
+        rides = self.pending.get(city)
+        if rides is not None and ride_id in rides:
+            rides[ride_id] = {"ride_id": ride_id, "city": city}
+            self.coalesced += 1
+            return
+
+        if self.depth >= self.max_pending:
+            # Shed a notification rather than slow down or fail the booking
+            largest = max(self.pending, key=lambda name: len(self.pending[name]))
+            self._pop(largest)
+            self.dropped += 1
+
+        self.pending.setdefault(city, {})[ride_id] = {"ride_id": ride_id, "city": city}
+        self.depth += 1
+        self.ready.set()
+        if self.depth >= self.max_batch:
+            self.full.set()
+
+    def _pop(self, city: str) -> dict:
+        rides = self.pending[city]
+        notification = rides.pop(next(iter(rides)))
+        if not rides:
+            del self.pending[city]
+        self.depth -= 1
+        return notification
+
+    def _take_batch(self) -> list:
+        batch = []
+        while self.pending and len(batch) < self.max_batch:
+            for city in list(self.pending):
+                batch.append(self._pop(city))
+                if city in self.pending:
+                    # Move to the back so the next batch starts with the cities skipped now
+                    self.pending[city] = self.pending.pop(city)
+                if len(batch) == self.max_batch:
+                    break
+        if not self.pending:
+            self.ready.clear()
+        if self.depth < self.max_batch:
+            self.full.clear()
+        return batch
+
+    async def send(self, batch: list):
+        start = time.perf_counter()
+        try:
+            response = await notification_client.post(LAMBDA_API_URL, json=batch)
+            if response.status_code != 200:
+                raise RuntimeError(f"HTTP {response.status_code}")
+            failed = response.json().get("failed", 0)
+            self.sent += len(batch) - failed
+            self.failed += failed
+            self.batches += 1
+            self.last_batch_size = len(batch)
+        except Exception as e:
+            # Notifications are best effort; the rides themselves are already committed
+            self.failed += len(batch)
+            print(f"Error calling Lambda for {len(batch)} notifications: {e!r}")
+        finally:
+            self.last_flush_ms = (time.perf_counter() - start) * 1000
+            self.slots.release()
+
+    def start(self):
+        if not self.enabled:
+            print("Notifications disabled or API URL not configured")
+            return
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """Send what is already queued (bounded by NOTIFICATION_DRAIN_TIMEOUT), then stop"""
+        if self.task is None:
+            return
+        self.task.cancel()
+        await asyncio.gather(self.task, return_exceptions=True)
+        self.task = None
+
+        async def drain():
+            while self.pending:
+                await self.slots.acquire()
+                await self.send(self._take_batch())
+            await asyncio.gather(*self.sending, return_exceptions=True)
+
+        try:
+            await asyncio.wait_for(drain(), NOTIFICATION_DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            print(f"Notification drain timed out with {self.depth} notifications pending")
+
+    async def run(self):
+        while True:
+            await self.ready.wait()
+            if self.depth < self.max_batch:
+                try:
+                    await asyncio.wait_for(self.full.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            await self.slots.acquire()
+            if not self.pending:
+                self.slots.release()
+                continue
+            task = asyncio.create_task(self.send(self._take_batch()))
+            self.sending.add(task)
+            task.add_done_callback(self.sending.discard)
+
+    def stats(self):
+        return {
+            "queue_depth": self.depth,
+            "queued_cities": len(self.pending),
+            "enqueued": self.enqueued,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "sent": self.sent,
+            "failed": self.failed,
+            "batches": self.batches,
+            "last_batch_size": self.last_batch_size,
+            "last_flush_ms": self.last_flush_ms,
+        }
+
+notifications = NotificationDispatcher(
+    NOTIFICATION_BATCH_SIZE, NOTIFICATION_FLUSH_INTERVAL, NOTIFICATION_QUEUE_SIZE, NOTIFICATION_SENDERS
+)
+stats_collector.register("notifications", notifications.stats)
+
+class SideEffectScheduler:
+    """Runs ride side effects by criticality: required steps concurrently under a shared
+    deadline, background steps fire-and-forget through a bounded queue"""
+
+    def __init__(self, steps: dict, queue_size: int, workers: int):
+        self.steps = steps
+        self.queue_size = queue_size
+        self.worker_count = workers
+        self.queue = None
+        self.workers = []
+        self.completed = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def start(self):
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self.workers = [asyncio.create_task(self.worker()) for _ in range(self.worker_count)]
+
+    async def stop(self):
+        """Drain queued background steps (bounded by SIDE_EFFECT_DRAIN_TIMEOUT), then stop workers"""
+        if self.queue is None:
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), SIDE_EFFECT_DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            print(f"Side effect drain timed out with {self.queue.qsize()} steps pending")
+        for task in self.workers:
+            task.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+    async def run(self, steps: dict, budget: float) -> dict:
+        """Execute steps ({name: async fn(deadline)}); returns {name: result or exception}
+        for the required ones, all of which finish within the budget"""
+        deadline = time.monotonic() + budget
+        required = {}
+        for name, step in steps.items():
+            config = self.steps[name]
+            if config["criticality"] == "required":
+                step_deadline = min(deadline, time.monotonic() + config["timeout"])
+                required[name] = asyncio.wait_for(step(step_deadline), max(0.0, step_deadline - time.monotonic()))
+            else:
+                self.run_background(name, step)
+
+        results = await asyncio.gather(*required.values(), return_exceptions=True)
+        return dict(zip(required, results))
+
+    def run_background(self, name: str, step):
+        try:
+            self.queue.put_nowait((name, step, self.steps[name]["timeout"]))
+        except asyncio.QueueFull:
+            # Shed the side effect rather than slow down the booking
+            self.dropped += 1
+            print(f"Side effect queue full, dropping {name}")
+
+    async def worker(self):
+        while True:
+            name, step, timeout = await self.queue.get()
+            try:
+                await asyncio.wait_for(step(time.monotonic() + timeout), timeout)
+                self.completed += 1
+            except Exception as exc:
+                self.failed += 1
+                print(f"Background step {name} failed: {exc!r}")
+            finally:
+                self.queue.task_done()
+
+    def stats(self):
+        return {
+            "queue_depth": self.queue.qsize() if self.queue else 0,
+            "completed": self.completed,
+            "failed": self.failed,
+            "dropped": self.dropped,
+        }
+
+side_effects = SideEffectScheduler(SIDE_EFFECT_STEPS, SIDE_EFFECT_QUEUE_SIZE, SIDE_EFFECT_WORKERS)
+stats_collector.register("side_effects", side_effects.stats)
+
+async def reserve_driver(driver_id: int) -> str:
+    """Book the driver through driver-service; returns the reservation id"""
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                LAMBDA_API_URL,
-                json={"ride_id": ride_id, "city": city},
-                timeout=5.0
-            )
-            print(f"Lambda notification sent: {response.status_code}")
+        response = await driver_client.post("/driver/reserve", json={"driver_id": driver_id})
     except Exception as e:
-        print(f"Error calling Lambda: {str(e)}")
-        # Don't fail the request if Lambda is unavailable
+        print(f"Driver reservation error: {e!r}")
+        raise HTTPException(status_code=503, detail="Driver reservation unavailable, please retry")
+
+    if response.status_code == 200:
+        return response.json()["reservation_id"]
+    if response.status_code in (404, 409):
+        raise HTTPException(status_code=response.status_code, detail=response.json().get("detail"))
+    print(f"Driver reservation error: HTTP {response.status_code}")
+    raise HTTPException(status_code=503, detail="Driver reservation unavailable, please retry")
+
+def payment_declined(status: Optional[str]) -> bool:
+    """Only an explicit decline cancels a ride; anything else is not a known failure"""
+    return status in PAYMENT_DECLINED_STATUSES
+
+def end_driver_reservation_later(action: str, driver_id: int, reservation_id: str):
+    """Queue /driver/release or /driver/complete; a 409 means it already happened"""
+    async def end(deadline):
+        response = await driver_client.post(
+            f"/driver/{action}",
+            json={"driver_id": driver_id, "reservation_id": reservation_id},
+            deadline=deadline
+        )
+        if response.status_code >= 500:
+            raise RuntimeError(f"driver {action} failed with HTTP {response.status_code}")
+
+    side_effects.run_background("driver_release", end)
 
 @app.post("/ride/start", response_model=dict)
-async def start_ride(ride: RideStart):
+async def start_ride(ride: RideStart, session: Optional[dict] = Depends(authenticate)):
     """Start a new ride - main service that orchestrates payment, notification, and event publishing"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
+    if session is not None and session["sub"] != ride.rider_id:
+        raise HTTPException(status_code=403, detail="Cannot book a ride for another rider")
+
+    # Priced before anything is reserved; rides booked without a route use FARE_DEFAULT_DISTANCE_KM
+    fares, _, _, valid = price_trips([ride], FARE_DEFAULT_DISTANCE_KM)
+    if not valid[0]:
+        raise HTTPException(status_code=400, detail=f"Cannot price ride: vehicle_type must be one of {fare_engine.vehicle_types}")
+    fare = fares.item(0)
+
     try:
-        # 1. Store ride in RDS
-        cursor.execute("""
-            INSERT INTO rides (rider_id, driver_id, pickup, drop_location, city, status)
-            VALUES (%s, %s, %s, %s, %s, 'started')
-            RETURNING id, created_at
-        """, (ride.rider_id, ride.driver_id, ride.pickup, ride.drop, ride.city))
-        
-        result = cursor.fetchone()
-        ride_id = result[0]
-        created_at = result[1]
-        conn.commit()
-        
-        # 2. Call Payment Service
+        # 1. Reserve the driver first; a driver already on a ride is rejected with 409
+        reservation_id = await reserve_driver(ride.driver_id)
+
+        # 2. Store ride in RDS together with its outbox event (one statement, one commit);
+        # the connection goes back to the pool before any downstream call
         try:
-            async with httpx.AsyncClient() as client:
-                payment_response = await client.post(
-                    f"{PAYMENT_SERVICE_URL}/payment/process",
-                    json={"ride_id": ride_id, "amount": 100.0},
-                    timeout=5.0
-                )
-                payment_data = payment_response.json()
-                if payment_data.get("status") != "SUCCESS":
-                    raise HTTPException(status_code=402, detail="Payment failed")
-        except httpx.RequestError as e:
-            print(f"Payment service error: {str(e)}")
+            async with db_cursor() as cursor:
+                await cursor.execute("""
+                    WITH new_ride AS (
+                        INSERT INTO rides (rider_id, driver_id, pickup, drop_location, city, status, driver_reservation_id)
+                        VALUES (%s, %s, %s, %s, %s, 'started', %s)
+                        RETURNING id, rider_id, driver_id, pickup, drop_location, city, created_at
+                    ), ride_event AS (
+                        INSERT INTO ride_outbox (event_type, city, payload)
+                        SELECT 'ride_started', city, jsonb_build_object(
+                            'ride_id', id,
+                            'rider_id', rider_id,
+                            'driver_id', driver_id,
+                            'pickup', pickup,
+                            'drop', drop_location,
+                            'city', city,
+                            'timestamp', to_char(created_at, 'YYYY-MM-DD"T"HH24:MI:SS.US')
+                        )
+                        FROM new_ride
+                    )
+                    SELECT id, pg_current_xact_id()::text::bigint FROM new_ride
+                """, (ride.rider_id, ride.driver_id, ride.pickup, ride.drop, ride.city, reservation_id))
+
+                result = await cursor.fetchone()
+        except BaseException:
+            end_driver_reservation_later("release", ride.driver_id, reservation_id)
+            raise
+
+        ride_id, xid = result
+        outbox_relay.wake()
+        ride_analytics.record(ride.city, xid=xid)
+        # Drop any cached "not found" for the new id
+        await ride_cache.invalidate(ride_id)
+
+        # 3. Side effects: payment is awaited within the request budget; the ride
+        # event is published by the outbox relay
+        async def charge(deadline):
+            return await payment_client.post(
+                "/payment/process",
+                json={"ride_id": ride_id, "amount": fare},
+                deadline=deadline,
+                idempotency_key=f"ride-{ride_id}"
+            )
+
+        results = await side_effects.run({"payment": charge}, RIDE_START_BUDGET)
+
+        payment_result = results.get("payment")
+        if isinstance(payment_result, Exception):
+            print(f"Payment service error: {payment_result!r}")
             # In demo mode, continue even if payment service is down
-        
-        # 3. Call Notification Lambda (if enabled)
-        await call_notification_lambda(ride_id, ride.city)
-        
-        
-        ride_event = {
-            "ride_id": ride_id,
-            "rider_id": ride.rider_id,
-            "driver_id": ride.driver_id,
-            "pickup": ride.pickup,
-            "drop": ride.drop,
-            "city": ride.city,
-            "timestamp": created_at.isoformat()
-        }
-        await publish_to_pubsub(ride_event)
-        
+        elif payment_result is not None and payment_result.status_code != 200:
+            # 409 (still in progress) or 5xx: the keyed charge may still commit, so the
+            # outcome is unknown; keep the ride and let a retry under ride-{id} settle it
+            print(f"Payment outcome unknown for ride {ride_id}: HTTP {payment_result.status_code}")
+        elif payment_result is not None and payment_declined(payment_result.json().get("status")):
+            async with db_cursor() as cursor:
+                await cursor.execute("UPDATE rides SET status = 'cancelled' WHERE id = %s", (ride_id,))
+            await ride_cache.invalidate(ride_id)
+            end_driver_reservation_later("release", ride.driver_id, reservation_id)
+            raise HTTPException(status_code=402, detail="Payment failed")
+
+        # Only a ride that survived payment is announced to the rider
+        notifications.notify(ride_id, ride.city)
+
         return {
             "message": "Ride started successfully",
             "ride_id": ride_id,
-            "status": "started"
+            "status": "started",
+            "fare": fare,
+            "currency": FARE_CURRENCY
         }
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        cursor.close()
-        conn.close()
 
-@app.get("/ride/all", response_model=list)
-async def get_all_rides():
-    """Get all rides"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
+@app.post("/ride/start/batch", response_model=dict)
+async def start_ride_batch(rides: List[RideStart], session: Optional[dict] = Depends(authenticate)):
+    """Start many rides at once: one reservation call, one INSERT, one batched payment call, per-item results"""
+    if not rides:
+        raise HTTPException(status_code=400, detail="Batch must contain at least one ride")
+    if len(rides) > RIDE_BATCH_MAX_SIZE:
+        raise HTTPException(status_code=400, detail=f"Batch size must not exceed {RIDE_BATCH_MAX_SIZE}")
+    if session is not None and any(ride.rider_id != session["sub"] for ride in rides):
+        raise HTTPException(status_code=403, detail="Cannot book a ride for another rider")
+
+    fares, _, _, valid = price_trips(rides, FARE_DEFAULT_DISTANCE_KM)
+    if not valid.all():
+        raise HTTPException(
+            status_code=400,
+            detail=f"Cannot price ride {int(np.argmin(valid))}: vehicle_type must be one of {fare_engine.vehicle_types}"
+        )
+    fares = fares.tolist()
+
     try:
-        cursor.execute("""
-            SELECT id, rider_id, driver_id, pickup, drop_location, city, status, created_at
-            FROM rides
-            ORDER BY created_at DESC
-        """)
-        
-        rides = []
-        for row in cursor.fetchall():
-            rides.append({
-                "id": row[0],
-                "rider_id": row[1],
-                "driver_id": row[2],
-                "pickup": row[3],
-                "drop": row[4],
-                "city": row[5],
-                "status": row[6],
-                "created_at": row[7].isoformat() if row[7] else None
+        # 1. Reserve every requested driver in one call; rides whose driver is taken are not created
+        try:
+            response = await driver_client.post(
+                "/driver/reserve/batch",
+                json=[{"driver_id": ride.driver_id} for ride in rides]
+            )
+        except Exception as e:
+            print(f"Driver reservation error: {e!r}")
+            raise HTTPException(status_code=503, detail="Driver reservation unavailable, please retry")
+        if response.status_code != 200:
+            print(f"Driver reservation batch error: HTTP {response.status_code}")
+            raise HTTPException(status_code=503, detail="Driver reservation unavailable, please retry")
+
+        reservations = response.json()["results"]
+        booked = [index for index, item in enumerate(reservations) if item["status"] == "busy"]
+
+        # 2. Store the booked rides and their outbox events in a single statement. Ids are drawn
+        # per input row so every result maps back to its position in the request.
+        ride_ids = []
+        if booked:
+            try:
+                async with db_cursor() as cursor:
+                    await cursor.execute("""
+                        WITH input AS (
+                            SELECT t.*, nextval(pg_get_serial_sequence('rides', 'id')) AS id
+                            FROM unnest(%s::int[], %s::int[], %s::text[], %s::text[], %s::text[], %s::uuid[])
+                                WITH ORDINALITY AS t(rider_id, driver_id, pickup, drop_location, city,
+                                                     driver_reservation_id, ord)
+                        ), new_rides AS (
+                            INSERT INTO rides (id, rider_id, driver_id, pickup, drop_location, city, status,
+                                               driver_reservation_id)
+                            SELECT id, rider_id, driver_id, pickup, drop_location, city, 'started',
+                                   driver_reservation_id
+                            FROM input
+                            ORDER BY ord
+                            RETURNING id, rider_id, driver_id, pickup, drop_location, city, created_at
+                        ), ride_events AS (
+                            INSERT INTO ride_outbox (event_type, city, payload)
+                            SELECT 'ride_started', city, jsonb_build_object(
+                                'ride_id', id,
+                                'rider_id', rider_id,
+                                'driver_id', driver_id,
+                                'pickup', pickup,
+                                'drop', drop_location,
+                                'city', city,
+                                'timestamp', to_char(created_at, 'YYYY-MM-DD"T"HH24:MI:SS.US')
+                            )
+                            FROM new_rides
+                        )
+                        SELECT id, pg_current_xact_id()::text::bigint FROM input ORDER BY ord
+                    """, (
+                        [rides[i].rider_id for i in booked],
+                        [rides[i].driver_id for i in booked],
+                        [rides[i].pickup for i in booked],
+                        [rides[i].drop for i in booked],
+                        [rides[i].city for i in booked],
+                        [reservations[i]["reservation_id"] for i in booked],
+                    ))
+
+                    rows = await cursor.fetchall()
+                    ride_ids = [row[0] for row in rows]
+                    xid = rows[0][1]
+            except BaseException:
+                for i in booked:
+                    end_driver_reservation_later("release", rides[i].driver_id, reservations[i]["reservation_id"])
+                raise
+
+            outbox_relay.wake()
+            for i in booked:
+                ride_analytics.record(rides[i].city, xid=xid)
+            # Drop any cached "not found" for the new ids
+            await asyncio.gather(*(ride_cache.invalidate(ride_id) for ride_id in ride_ids))
+
+        # 3. Charge every ride with one call to the payment service
+        async def charge(deadline):
+            return await payment_client.post(
+                "/payment/process/batch",
+                json=[{"ride_id": ride_id, "amount": fares[i]} for ride_id, i in zip(ride_ids, booked)],
+                deadline=deadline,
+                idempotency_key=f"ride-batch-{ride_ids[0]}-{len(ride_ids)}"
+            )
+
+        payment_status = {}
+        if ride_ids:
+            step_results = await side_effects.run({"payment": charge}, RIDE_START_BUDGET)
+            payment_result = step_results.get("payment")
+            if isinstance(payment_result, Exception):
+                print(f"Payment service error: {payment_result!r}")
+                # In demo mode, continue even if payment service is down
+            elif payment_result is not None and payment_result.status_code == 200:
+                payment_status = {item["ride_id"]: item["status"] for item in payment_result.json()}
+            elif payment_result is not None:
+                print(f"Payment service batch error: HTTP {payment_result.status_code}")
+
+        # Declined items are cancelled and their drivers released, as in POST /ride/start
+        declined = [(ride_id, i) for ride_id, i in zip(ride_ids, booked) if payment_declined(payment_status.get(ride_id))]
+        if declined:
+            async with db_cursor() as cursor:
+                await cursor.execute(
+                    "UPDATE rides SET status = 'cancelled' WHERE id = ANY(%s)",
+                    ([ride_id for ride_id, _ in declined],)
+                )
+            for ride_id, i in declined:
+                await ride_cache.invalidate(ride_id)
+                end_driver_reservation_later("release", rides[i].driver_id, reservations[i]["reservation_id"])
+        cancelled = {ride_id for ride_id, _ in declined}
+        for ride_id, i in zip(ride_ids, booked):
+            if ride_id not in cancelled:
+                notifications.notify(ride_id, rides[i].city)
+
+        ride_id_by_index = dict(zip(booked, ride_ids))
+        results = []
+        for index, reservation in enumerate(reservations):
+            ride_id = ride_id_by_index.get(index)
+            if ride_id is None:
+                status = f"driver_{reservation['status']}"
+            else:
+                status = "cancelled" if ride_id in cancelled else "started"
+            results.append({
+                "index": index,
+                "ride_id": ride_id,
+                "status": status,
+                "payment_status": payment_status.get(ride_id, "UNAVAILABLE") if ride_id is not None else None,
+                "fare": fares[index] if ride_id is not None else None,
             })
-        
-        return rides
+        return {
+            "message": f"{len(ride_ids) - len(cancelled)} of {len(rides)} rides started successfully",
+            "results": results,
+        }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        cursor.close()
-        conn.close()
 
-@app.get("/ride/{ride_id}", response_model=RideResponse)
-async def get_ride(ride_id: int):
-    """Get ride by ID"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
+@app.post("/ride/{ride_id}/complete", response_model=dict)
+async def complete_ride(ride_id: int):
+    """Finish a started ride and make its driver available again"""
     try:
-        cursor.execute("""
+        async with db_cursor() as cursor:
+            await cursor.execute("""
+                UPDATE rides SET status = 'completed'
+                WHERE id = %s AND status = 'started'
+                RETURNING driver_id, driver_reservation_id
+            """, (ride_id,))
+
+            result = await cursor.fetchone()
+            if not result:
+                await cursor.execute("SELECT status FROM rides WHERE id = %s", (ride_id,))
+                current = await cursor.fetchone()
+
+        await ride_cache.invalidate(ride_id)
+
+        if not result:
+            if current:
+                raise HTTPException(status_code=409, detail=f"Ride is already {current[0]}")
+            raise HTTPException(status_code=404, detail="Ride not found")
+
+        driver_id, reservation_id = result
+        # Rides booked before reservations existed have no driver to free
+        if reservation_id is not None:
+            try:
+                response = await driver_client.post(
+                    "/driver/complete",
+                    json={"driver_id": driver_id, "reservation_id": str(reservation_id)}
+                )
+                if response.status_code >= 500:
+                    raise RuntimeError(f"HTTP {response.status_code}")
+            except Exception as e:
+                print(f"Driver completion error, retrying in background: {e!r}")
+                end_driver_reservation_later("complete", driver_id, str(reservation_id))
+
+        return {"message": "Ride completed", "ride_id": ride_id, "status": "completed"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def ride_row_to_dict(row) -> dict:
+    return {
+        "id": row[0],
+        "rider_id": row[1],
+        "driver_id": row[2],
+        "pickup": row[3],
+        "drop": row[4],
+        "city": row[5],
+        "status": row[6],
+        "created_at": row[7].isoformat() if row[7] else None
+    }
+
+def encode_ride_cursor(row) -> str:
+    """Opaque keyset cursor pointing just past (created_at, id) of the given row"""
+    return base64.urlsafe_b64encode(f"{row[7].isoformat()}|{row[0]}".encode("utf-8")).decode("ascii")
+
+def decode_ride_cursor(cursor: str):
+    try:
+        created_at, ride_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").split("|")
+        return datetime.fromisoformat(created_at), int(ride_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def build_rides_query(cursor: Optional[str], city: Optional[str], rider_id: Optional[int],
+                      driver_id: Optional[int], status: Optional[str]):
+    """Keyset query over rides ordered newest first; all clauses are constant SQL fragments"""
+    clauses = []
+    params = []
+    if cursor:
+        clauses.append("(created_at, id) < (%s, %s)")
+        params.extend(decode_ride_cursor(cursor))
+    if city:
+        clauses.append("city = %s")
+        params.append(city)
+    if rider_id is not None:
+        clauses.append("rider_id = %s")
+        params.append(rider_id)
+    if driver_id is not None:
+        clauses.append("driver_id = %s")
+        params.append(driver_id)
+    if status:
+        clauses.append("status = %s")
+        params.append(status)
+
+    query = """
+        SELECT id, rider_id, driver_id, pickup, drop_location, city, status, created_at
+        FROM rides
+    """
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+    query += " ORDER BY created_at DESC, id DESC"
+    return query, params
+
+async def stream_rides_ndjson(query: str, params: list):
+    """Yield rides as NDJSON from a server-side cursor, so exports run in constant memory"""
+    # The connection is taken when the stream starts and held until it ends, so a
+    # response that never starts (client gone) never takes a pool slot
+    async with db_pool.connection() as conn:
+        async with conn.cursor(name="rides_export") as cursor:
+            cursor.itersize = RIDES_EXPORT_BATCH_SIZE
+            await cursor.execute(query, params)
+            while True:
+                rows = await cursor.fetchmany(RIDES_EXPORT_BATCH_SIZE)
+                if not rows:
+                    break
+                yield "".join(json.dumps(ride_row_to_dict(row)) + "\n" for row in rows)
+
+@app.get("/ride/all", response_model=list)
+async def get_all_rides(
+    response: Response,
+    limit: int = Query(RIDES_PAGE_SIZE, ge=1, le=RIDES_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    city: Optional[str] = None,
+    rider_id: Optional[int] = None,
+    driver_id: Optional[int] = None,
+    status: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+):
+    """Get rides newest first, one page at a time (X-Next-Cursor) or as an NDJSON stream"""
+    query, params = build_rides_query(cursor, city, rider_id, driver_id, status)
+
+    if format == "ndjson":
+        # Once streaming has begun the status can no longer change, so a saturated pool
+        # is turned away here rather than left to time out mid-stream
+        stats = db_pool_stats()
+        if stats["available"] == 0 and stats["size"] >= stats["max_size"]:
+            raise HTTPException(status_code=503, detail="Database busy, please retry")
+        return StreamingResponse(stream_rides_ndjson(query, params), media_type="application/x-ndjson")
+
+    try:
+        async with db_cursor() as db:
+            # Fetch one extra row to learn whether another page exists
+            await db.execute(query + " LIMIT %s", params + [limit + 1])
+            rows = await db.fetchall()
+
+        if len(rows) > limit:
+            rows = rows[:limit]
+            response.headers["X-Next-Cursor"] = encode_ride_cursor(rows[-1])
+
+        return [ride_row_to_dict(row) for row in rows]
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def load_ride(ride_id: int):
+    async with db_cursor() as cursor:
+        await cursor.execute("""
             SELECT id, rider_id, driver_id, pickup, drop_location, city, status, created_at
             FROM rides
             WHERE id = %s
         """, (ride_id,))
-        
-        result = cursor.fetchone()
-        if not result:
+
+        result = await cursor.fetchone()
+
+    return ride_row_to_dict(result) if result else None
+
+@app.get("/ride/{ride_id}", response_model=RideResponse)
+async def get_ride(ride_id: int):
+    """Get ride by ID"""
+    try:
+        ride = await ride_cache.get_or_load(ride_id, lambda: load_ride(ride_id))
+        if ride is None:
             raise HTTPException(status_code=404, detail="Ride not found")
-        
-        return RideResponse(
-            id=result[0],
-            rider_id=result[1],
-            driver_id=result[2],
-            pickup=result[3],
-            drop=result[4],
-            city=result[5],
-            status=result[6],
-            created_at=result[7].isoformat() if result[7] else None
-        )
+
+        return RideResponse(**ride)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        cursor.close()
-        conn.close()
+
+class CityRideCounter:
+    """Ring buffer of per-bucket ride counts for one city, with a running total per window"""
+
+    def __init__(self, windows: list, head: int):
+        self.windows = windows  # window lengths in buckets
+        self.size = max(windows)
+        self.buckets = [0] * self.size
+        self.totals = [0] * len(windows)
+        self.head = head
+
+    def advance(self, bucket: int):
+        if bucket <= self.head:
+            return
+        if bucket - self.head >= self.size:
+            self.buckets = [0] * self.size
+            self.totals = [0] * len(self.windows)
+            self.head = bucket
+            return
+        for b in range(self.head + 1, bucket + 1):
+            # Bucket b - w slides out of window w as bucket b slides in
+            for i, window in enumerate(self.windows):
+                self.totals[i] -= self.buckets[(b - window) % self.size]
+            self.buckets[b % self.size] = 0
+        self.head = bucket
+
+    def add(self, bucket: int, count: int = 1):
+        self.advance(bucket)
+        age = self.head - bucket
+        if age >= self.size:
+            return
+        self.buckets[bucket % self.size] += count
+        for i, window in enumerate(self.windows):
+            if age < window:
+                self.totals[i] += count
+
+def xid_visible(xid: int, snapshot: str) -> bool:
+    """Whether a committed transaction is visible to a pg_snapshot given as xmin:xmax:xip,..."""
+    xmin, xmax, xip = snapshot.split(":")
+    if xid < int(xmin):
+        return True
+    if xid >= int(xmax):
+        return False
+    return str(xid) not in xip.split(",")
+
+class RideAnalytics:
+    """Incremental per-city ride counts over ANALYTICS_WINDOWS, updated by start_ride.
+
+    Counters are seeded from the rides table on startup and rebuilt every
+    ANALYTICS_RESYNC_INTERVAL so rides started on other replicas are picked up.
+    Reads never touch the database.
+    """
+
+    def __init__(self, windows: list, bucket_seconds: int):
+        self.bucket_seconds = bucket_seconds
+        self.windows = windows
+        self.window_buckets = [max(1, window // bucket_seconds) for window in windows]
+        self.counters = {}
+        self.pending = None  # (city, bucket, count, xid) recorded while a resync is in flight
+        self.stream_counts = {}
+        self.firestore = None
+        self.task = None
+
+    def current_bucket(self) -> int:
+        return int(time.time()) // self.bucket_seconds
+
+    def record(self, city: str, count: int = 1, xid: Optional[int] = None):
+        """Count a committed ride; xid is the id of the transaction that inserted it"""
+        bucket = self.current_bucket()
+        counter = self.counters.get(city)
+        if counter is None:
+            counter = self.counters[city] = CityRideCounter(self.window_buckets, bucket)
+        counter.add(bucket, count)
+        if self.pending is not None:
+            self.pending.append((city, bucket, count, xid))
+
+    def snapshot(self, window: int) -> list:
+        index = self.windows.index(window)
+        bucket = self.current_bucket()
+        timestamp = datetime.utcnow().isoformat() + "Z"
+        results = []
+        for city, counter in self.counters.items():
+            counter.advance(bucket)
+            item = {"city": city, "count": counter.totals[index], "timestamp": timestamp}
+            stream = self.stream_counts.get(city)
+            if stream is not None:
+                item["stream_count"] = stream["count"]
+                item["stream_window_end"] = stream["windowEnd"]
+            if item["count"] or stream is not None:
+                results.append(item)
+        results.sort(key=lambda item: item["count"], reverse=True)
+        return results
+
+    async def resync(self):
+        """Rebuild all counters from the rides table and swap them in"""
+        max_age = max(self.windows)
+        # Rides recorded while the query is in flight are replayed onto the rebuilt
+        # counters before the swap, unless their transaction is visible to its snapshot
+        self.pending = []
+        try:
+            rows, snapshot = await self.fetch_recent(max_age)
+            pending = [
+                (city, recorded, count) for city, recorded, count, xid in self.pending
+                if xid is None or not xid_visible(xid, snapshot)
+            ]
+        finally:
+            self.pending = None
+
+        bucket = self.current_bucket()
+        counters = {}
+        for city, recorded, count in [(city, bucket - max(age, 0), count) for city, age, count in rows] + pending:
+            counter = counters.get(city)
+            if counter is None:
+                counter = counters[city] = CityRideCounter(self.window_buckets, bucket)
+            counter.add(recorded, count)
+        self.counters = counters
+
+    async def fetch_recent(self, max_age: int) -> tuple:
+        """Per-city ride counts by bucket age over the last max_age seconds, and the snapshot they were read in"""
+        async with db_cursor() as cursor:
+            # REPEATABLE READ so both statements see the same snapshot
+            await cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+            await cursor.execute("SELECT pg_current_snapshot()::text")
+            snapshot = (await cursor.fetchone())[0]
+            await cursor.execute("""
+                SELECT city,
+                       FLOOR(EXTRACT(EPOCH FROM (LOCALTIMESTAMP - created_at)) / %s)::int AS age,
+                       COUNT(*)
+                FROM rides
+                WHERE created_at >= LOCALTIMESTAMP - %s * INTERVAL '1 second'
+                GROUP BY 1, 2
+            """, (self.bucket_seconds, max_age))
+            return await cursor.fetchall(), snapshot
+
+    async def refresh_stream_counts(self):
+        """Pull the latest per-city window written by ride_analytics_standalone.py"""
+        from google.cloud import firestore
+
+        def fetch():
+            if self.firestore is None:
+                self.firestore = firestore.Client(project=PUBSUB_PROJECT_ID or None)
+            client = self.firestore
+            cutoff = datetime.now().timestamp() - 2 * 60
+            latest = {}
+            query = client.collection(ANALYTICS_FIRESTORE_COLLECTION).where(
+                "timestamp", ">=", datetime.fromtimestamp(cutoff).isoformat()
+            )
+            for doc in query.stream():
+                data = doc.to_dict()
+                current = latest.get(data["city"])
+                if current is None or data["windowEnd"] > current["windowEnd"]:
+                    latest[data["city"]] = data
+            return latest
+
+        self.stream_counts = await asyncio.to_thread(fetch)
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(ANALYTICS_RESYNC_INTERVAL)
+            try:
+                await self.resync()
+                if ANALYTICS_FIRESTORE_COLLECTION:
+                    await self.refresh_stream_counts()
+            except Exception as exc:
+                print(f"Analytics refresh failed: {exc}")
+
+ride_analytics = RideAnalytics(ANALYTICS_WINDOWS, ANALYTICS_BUCKET_SECONDS)
+
+# Fares: the pricing table lives in NumPy arrays indexed by vehicle type, so a whole batch
+# of quotes is priced with a few vectorized operations. Surge multipliers per city come
+# from demand (rides started in the last SURGE_WINDOW seconds) against supply (online
+# drivers) and are recomputed every SURGE_INTERVAL seconds, never per request.
+DEFAULT_FARE_TABLE = {
+    "bike": {"base": 20, "per_km": 6, "per_min": 1.0, "minimum": 30},
+    "auto": {"base": 30, "per_km": 10, "per_min": 1.0, "minimum": 40},
+    "hatchback": {"base": 50, "per_km": 12, "per_min": 1.5, "minimum": 80},
+    "sedan": {"base": 60, "per_km": 14, "per_min": 1.5, "minimum": 100},
+    "suv": {"base": 80, "per_km": 18, "per_min": 2.0, "minimum": 150},
+}
+FARE_TABLE = json.loads(os.getenv("FARE_TABLE", "") or "null") or DEFAULT_FARE_TABLE
+FARE_CURRENCY = os.getenv("FARE_CURRENCY", "INR")
+FARE_DEFAULT_VEHICLE = os.getenv("FARE_DEFAULT_VEHICLE", "sedan")
+FARE_DEFAULT_DISTANCE_KM = float(os.getenv("FARE_DEFAULT_DISTANCE_KM", "5"))  # rides booked without a route
+FARE_ROAD_FACTOR = float(os.getenv("FARE_ROAD_FACTOR", "1.3"))  # road distance per great-circle km
+FARE_AVG_SPEED_KMH = float(os.getenv("FARE_AVG_SPEED_KMH", "25"))
+FARE_QUOTE_MAX_BATCH = int(os.getenv("FARE_QUOTE_MAX_BATCH", "10000"))
+SURGE_INTERVAL = float(os.getenv("SURGE_INTERVAL", "15"))
+SURGE_WINDOW = int(os.getenv("SURGE_WINDOW", str(ANALYTICS_WINDOWS[0])))  # one of ANALYTICS_WINDOWS
+SURGE_THRESHOLD = float(os.getenv("SURGE_THRESHOLD", "0.5"))  # rides per online driver before surge starts
+SURGE_SENSITIVITY = float(os.getenv("SURGE_SENSITIVITY", "0.5"))
+SURGE_MAX = float(os.getenv("SURGE_MAX", "3.0"))
+SURGE_STEP = float(os.getenv("SURGE_STEP", "0.1"))
+
+def trip_distance_km(distance_km, pickup_lat, pickup_lon, drop_lat, drop_lon):
+    """distance_km where given, else great-circle distance times FARE_ROAD_FACTOR; NaN when neither is known"""
+    lat1, lon1, lat2, lon2 = (np.radians(a) for a in (pickup_lat, pickup_lon, drop_lat, drop_lon))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    great_circle = 2 * 6371.0 * np.arcsin(np.sqrt(a))
+    return np.where(np.isnan(distance_km), great_circle * FARE_ROAD_FACTOR, distance_km)
+
+class FareEngine:
+    """Prices trips from distance, vehicle type and the current surge table, a batch at a time"""
+
+    def __init__(self, table: dict):
+        self.vehicle_types = list(table)
+        self.vehicle_index = {vehicle_type: i for i, vehicle_type in enumerate(self.vehicle_types)}
+        self.base = np.array([table[v]["base"] for v in self.vehicle_types], dtype=np.float64)
+        self.per_km = np.array([table[v]["per_km"] for v in self.vehicle_types], dtype=np.float64)
+        self.per_min = np.array([table[v]["per_min"] for v in self.vehicle_types], dtype=np.float64)
+        self.minimum = np.array([table[v]["minimum"] for v in self.vehicle_types], dtype=np.float64)
+        # (city -> row, multipliers); row 0 is the 1.0 used for cities without data. Replaced
+        # as a whole, so a quote never sees a half-updated table.
+        self.surge = ({}, np.ones(1))
+        self.surge_computed_at = None
+        self.task = None
+        self.quotes = 0
+        self.recomputes = 0
+        self.recompute_failures = 0
+
+    def quote(self, cities: list, vehicle_types: list, distance_km: np.ndarray):
+        """(fares, surge multipliers, valid mask); invalid rows have an unknown vehicle type or no distance"""
+        count = len(cities)
+        city_rows, multipliers = self.surge
+        city = np.fromiter((city_rows.get(name, 0) for name in cities), dtype=np.intp, count=count)
+        vehicle = np.fromiter((self.vehicle_index.get(name, -1) for name in vehicle_types), dtype=np.intp, count=count)
+
+        valid = (vehicle >= 0) & np.isfinite(distance_km) & (distance_km >= 0)
+        vehicle = np.where(valid, vehicle, 0)
+        distance = np.where(valid, distance_km, 0.0)
+        minutes = distance / FARE_AVG_SPEED_KMH * 60
+        surge = multipliers[city]
+        fares = np.maximum(
+            self.base[vehicle] + self.per_km[vehicle] * distance + self.per_min[vehicle] * minutes,
+            self.minimum[vehicle],
+        ) * surge
+        self.quotes += count
+        return np.round(fares, 2), surge, valid
+
+    async def recompute_surge(self):
+        response = await driver_client.client.get("/driver/supply", timeout=DRIVER_TIMEOUT)
+        response.raise_for_status()
+        supply = {city: counts.get("online", 0) for city, counts in response.json()["cities"].items()}
+        demand = {item["city"]: item["count"] for item in ride_analytics.snapshot(SURGE_WINDOW)}
+
+        cities = sorted(set(supply) | set(demand))
+        rides = np.array([demand.get(city, 0) for city in cities], dtype=np.float64)
+        drivers = np.array([supply.get(city, 0) for city in cities], dtype=np.float64)
+        pressure = rides / (drivers + 1)
+        multipliers = np.clip(1 + SURGE_SENSITIVITY * (pressure - SURGE_THRESHOLD), 1.0, SURGE_MAX)
+        multipliers = np.round(multipliers / SURGE_STEP) * SURGE_STEP
+
+        self.surge = ({city: i + 1 for i, city in enumerate(cities)}, np.concatenate(([1.0], multipliers)))
+        self.surge_computed_at = datetime.utcnow().isoformat() + "Z"
+        self.recomputes += 1
+
+    def multipliers(self) -> dict:
+        city_rows, multipliers = self.surge
+        return {city: float(multipliers[row]) for city, row in city_rows.items() if multipliers[row] > 1.0}
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    async def run(self):
+        while True:
+            try:
+                await self.recompute_surge()
+            except Exception as exc:
+                # Keep the previous multipliers until supply is readable again
+                self.recompute_failures += 1
+                print(f"Surge recompute failed: {exc}")
+            await asyncio.sleep(SURGE_INTERVAL)
+
+    def stats(self):
+        return {
+            "quotes": self.quotes,
+            "recomputes": self.recomputes,
+            "recompute_failures": self.recompute_failures,
+            "surging_cities": len(self.multipliers()),
+        }
+
+fare_engine = FareEngine(FARE_TABLE)
+stats_collector.register("fares", fare_engine.stats)
+
+def price_trips(trips: list, default_distance_km: float = float("nan")):
+    """Vectorized quote for RideStart / FareQuoteRequest items: (fares, surge, distance_km, valid)"""
+    def column(name):
+        return np.array([getattr(trip, name) for trip in trips], dtype=np.float64)
+
+    distance_km = trip_distance_km(
+        column("distance_km"), column("pickup_lat"), column("pickup_lon"), column("drop_lat"), column("drop_lon")
+    )
+    distance_km = np.where(np.isnan(distance_km), default_distance_km, distance_km)
+    vehicle_types = [trip.vehicle_type or FARE_DEFAULT_VEHICLE for trip in trips]
+    fares, surge, valid = fare_engine.quote([trip.city for trip in trips], vehicle_types, distance_km)
+    return fares, surge, distance_km, valid
+
+def fare_quote_payload(quotes: list) -> dict:
+    fares, surge, distance_km, valid = price_trips(quotes)
+    results = []
+    for index, (quote, fare, multiplier, distance, ok) in enumerate(zip(
+            quotes, fares.tolist(), surge.tolist(), distance_km.tolist(), valid.tolist())):
+        if ok:
+            results.append({"index": index, "fare": fare, "surge": multiplier, "distance_km": round(distance, 2)})
+        elif (quote.vehicle_type or FARE_DEFAULT_VEHICLE) not in fare_engine.vehicle_index:
+            results.append({"index": index, "fare": None, "detail": f"Unknown vehicle_type, expected one of {fare_engine.vehicle_types}"})
+        elif quote.distance_km is not None and not quote.distance_km >= 0:
+            results.append({"index": index, "fare": None, "detail": "distance_km must be greater than or equal to 0"})
+        else:
+            results.append({"index": index, "fare": None, "detail": "Give distance_km or pickup and drop coordinates"})
+    return {"currency": FARE_CURRENCY, "surge_computed_at": fare_engine.surge_computed_at, "results": results}
+
+@app.post("/fare/quote")
+async def quote_fares(quotes: List[FareQuoteRequest]):
+    """Price many trips in one vectorized call; per-item results in request order"""
+    if not quotes:
+        raise HTTPException(status_code=400, detail="Batch must contain at least one quote")
+    if len(quotes) > FARE_QUOTE_MAX_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {FARE_QUOTE_MAX_BATCH} quotes per batch")
+
+    # Serialized directly: running 10k plain dicts through the response encoder costs
+    # more than pricing them
+    return Response(json.dumps(fare_quote_payload(quotes)), media_type="application/json")
+
+@app.get("/fare/surge")
+async def get_surge():
+    """Cities currently priced above 1.0x"""
+    return {"surge_computed_at": fare_engine.surge_computed_at, "multipliers": fare_engine.multipliers()}
 
 @app.get("/analytics/latest")
-async def get_analytics():
-    """Get latest analytics data (mock endpoint - in production would query Cosmos DB)"""
-    # In production, this would query Cosmos DB
-    # For demo, return mock data
-    return [
-        {"city": "Bangalore", "count": 45, "timestamp": "2024-01-15T10:30:00Z"},
-        {"city": "Mumbai", "count": 32, "timestamp": "2024-01-15T10:30:00Z"},
-        {"city": "Delhi", "count": 28, "timestamp": "2024-01-15T10:30:00Z"},
-        {"city": "Hyderabad", "count": 15, "timestamp": "2024-01-15T10:30:00Z"},
-        {"city": "Chennai", "count": 12, "timestamp": "2024-01-15T10:30:00Z"},
-    ]
+async def get_analytics(window: int = ANALYTICS_WINDOWS[0]):
+    """Rides per city over the last `window` seconds, served from in-memory counters"""
+    if window not in ANALYTICS_WINDOWS:
+        raise HTTPException(status_code=400, detail=f"window must be one of {ANALYTICS_WINDOWS}")
+    return ride_analytics.snapshot(window)
+
+@app.get("/metrics")
+async def metrics():
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
 
 @app.get("/health")
 async def health():
-    return {"status": "healthy", "service": "ride-service"}
+    return {
+        "status": "healthy",
+        "service": "ride-service",
+        "db_pool": db_pool_stats(),
+        "outbox": outbox_relay.stats(),
+        "side_effects": side_effects.stats(),
+        "notifications": notifications.stats(),
+        "cache": ride_cache.stats(),
+        "session": session_verifier.stats(),
+        "fares": fare_engine.stats(),
+        "downstream": {
+            "payment": payment_client.stats(),
+            "driver": driver_client.stats(),
+            "notification": notification_client.stats(),
+        },
+    }
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8003)
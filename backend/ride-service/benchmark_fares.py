@@ -0,0 +1,76 @@
+"""
+Fare engine benchmark: quotes per second by batch size.
+
+For each batch size in BENCH_BATCH_SIZES it prices synthetic trips (random
+cities, vehicle types and coordinates, half of the cities surging) for about
+BENCH_SECONDS and reports two rates:
+
+    engine    FareEngine.quote() on ready-made columns (the vectorized part)
+    request   what POST /fare/quote does per call: JSON body validation,
+              distance calculation, pricing and response serialization
+
+No database or downstream service is needed:
+
+    python benchmark_fares.py
+"""
+import json
+import os
+import random
+import time
+from typing import List
+
+import numpy as np
+from pydantic import TypeAdapter
+
+import app
+
+BENCH_BATCH_SIZES = [int(size) for size in os.getenv("BENCH_BATCH_SIZES", "1,10,100,1000,10000").split(",")]
+BENCH_SECONDS = float(os.getenv("BENCH_SECONDS", "1"))
+BENCH_CITIES = ["Bangalore", "Mumbai", "Delhi", "Hyderabad", "Chennai", "Pune", "Kolkata", "Jaipur"]
+
+def random_trips(count: int) -> list:
+    trips = []
+    for _ in range(count):
+        lat, lon = random.uniform(12.8, 13.1), random.uniform(77.4, 77.8)
+        trips.append({
+            "city": random.choice(BENCH_CITIES),
+            "vehicle_type": random.choice(app.fare_engine.vehicle_types),
+            "pickup_lat": lat,
+            "pickup_lon": lon,
+            "drop_lat": lat + random.uniform(-0.1, 0.1),
+            "drop_lon": lon + random.uniform(-0.1, 0.1),
+        })
+    return trips
+
+def rate(run, batch_size: int) -> float:
+    """Quotes per second, calling run() repeatedly for about BENCH_SECONDS"""
+    run()  # warm up
+    calls = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < BENCH_SECONDS:
+        run()
+        calls += 1
+    return calls * batch_size / (time.perf_counter() - start)
+
+def main():
+    surging = BENCH_CITIES[: len(BENCH_CITIES) // 2]
+    app.fare_engine.surge = (
+        {city: i + 1 for i, city in enumerate(surging)},
+        np.concatenate(([1.0], np.linspace(1.2, 2.0, len(surging)))),
+    )
+    parse = TypeAdapter(List[app.FareQuoteRequest]).validate_json
+
+    print(f"{'batch':>7} {'engine quotes/s':>17} {'request quotes/s':>18}")
+    for batch_size in BENCH_BATCH_SIZES:
+        trips = random_trips(batch_size)
+        body = json.dumps(trips)
+        cities = [trip["city"] for trip in trips]
+        vehicle_types = [trip["vehicle_type"] for trip in trips]
+        distance_km = np.random.uniform(1, 30, batch_size)
+
+        engine = rate(lambda: app.fare_engine.quote(cities, vehicle_types, distance_km), batch_size)
+        request = rate(lambda: json.dumps(app.fare_quote_payload(parse(body))), batch_size)
+        print(f"{batch_size:>7} {engine:>17,.0f} {request:>18,.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,30 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-import psycopg2
+import psycopg
+from psycopg.conninfo import make_conninfo
+from psycopg_pool import AsyncConnectionPool, PoolTimeout
 import os
-from typing import Optional
+import re
+import asyncio
+import base64
+import codecs
+import csv
+import hashlib
+import hmac
+import json
+import time
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
 import uvicorn
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+import redis.asyncio
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
 
 app = FastAPI(title="User Service", version="1.0.0")
 
@@ -17,6 +37,108 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Metrics (scraped from /metrics by Prometheus)
+SERVICE_NAME = "user-service"
+
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests served", ["service", "method", "route", "status"])
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ["service", "method", "route"]
+)
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests being served", ["service"]).labels(SERVICE_NAME)
+DB_QUERY_SECONDS = Histogram(
+    "db_query_duration_seconds", "Database statement latency", ["service", "statement"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+
+@lru_cache(maxsize=512)
+def statement_label(query: str) -> str:
+    """Short label such as "select:rides" for a SQL statement"""
+    match = re.search(r"\b(INSERT\s+INTO|UPDATE|DELETE\s+FROM|FROM)\s+(\w+)", query, re.IGNORECASE)
+    if not match:
+        return "other"
+    verb = match.group(1).split()[0].lower()
+    return f"{'select' if verb == 'from' else verb}:{match.group(2).lower()}"
+
+class TimedCursor(psycopg.AsyncCursor):
+    """Cursor that records statement latency, labelled by statement_label()"""
+
+    async def execute(self, query, params=None, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await super().execute(query, params, **kwargs)
+        finally:
+            label = statement_label(query) if isinstance(query, str) else "other"
+            DB_QUERY_SECONDS.labels(SERVICE_NAME, label).observe(time.perf_counter() - start)
+
+    async def executemany(self, query, params_seq, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await super().executemany(query, params_seq, **kwargs)
+        finally:
+            label = statement_label(query) if isinstance(query, str) else "other"
+            DB_QUERY_SECONDS.labels(SERVICE_NAME, label).observe(time.perf_counter() - start)
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording per-route latency, status counts and in-flight requests"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            # The router stores the matched route in the scope; use its template to bound cardinality
+            route = scope.get("route")
+            path = route.path if route is not None else "unmatched"
+            HTTP_REQUEST_SECONDS.labels(SERVICE_NAME, scope["method"], path).observe(time.perf_counter() - start)
+            HTTP_REQUESTS.labels(SERVICE_NAME, scope["method"], path, str(status)).inc()
+
+class StatsCollector:
+    """Exposes components' stats() dicts as gauges, read at scrape time instead of on the hot path"""
+
+    def __init__(self):
+        self.sources = {}
+
+    def register(self, component: str, stats):
+        self.sources[component] = stats
+
+    def describe(self):
+        return []
+
+    def collect(self):
+        for component, stats in self.sources.items():
+            for key, value in stats().items():
+                name = f"{component}_{key}"
+                if isinstance(value, (bool, int, float)):
+                    family = GaugeMetricFamily(name, f"{component} {key}", labels=["service"])
+                    family.add_metric([SERVICE_NAME], float(value))
+                    yield family
+                elif isinstance(value, str):
+                    family = GaugeMetricFamily(name, f"{component} {key}", labels=["service", "value"])
+                    family.add_metric([SERVICE_NAME, value], 1.0)
+                    yield family
+
+stats_collector = StatsCollector()
+REGISTRY.register(stats_collector)
+
+app.add_middleware(MetricsMiddleware)
+
 # Database connection
 DB_HOST = os.getenv("DB_HOST", "localhost")
 DB_NAME = os.getenv("DB_NAME", "ridebooking")
@@ -24,15 +146,386 @@ DB_USER = os.getenv("DB_USER", "admin")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "password")
 DB_PORT = os.getenv("DB_PORT", "5432")
 
-def get_db_connection():
-    return psycopg2.connect(
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+DB_PREPARE_THRESHOLD = int(os.getenv("DB_PREPARE_THRESHOLD", "1"))
+
+async def configure_connection(conn):
+    # Server-side prepare hot statements after their first execution
+    conn.prepare_threshold = DB_PREPARE_THRESHOLD
+    conn.cursor_factory = TimedCursor
+
+db_pool = AsyncConnectionPool(
+    conninfo=make_conninfo(
         host=DB_HOST,
-        database=DB_NAME,
+        dbname=DB_NAME,
         user=DB_USER,
         password=DB_PASSWORD,
         port=DB_PORT
+    ),
+    min_size=DB_POOL_MIN_SIZE,
+    max_size=DB_POOL_MAX_SIZE,
+    timeout=DB_POOL_TIMEOUT,
+    configure=configure_connection,
+    check=AsyncConnectionPool.check_connection,
+    open=False,
+)
+
+@asynccontextmanager
+async def db_cursor():
+    """Borrow a pooled connection; commits on success, rolls back on error"""
+    try:
+        async with db_pool.connection() as conn:
+            async with conn.cursor() as cursor:
+                yield cursor
+    except PoolTimeout:
+        raise HTTPException(status_code=503, detail="Database busy, please retry")
+
+def db_pool_stats():
+    stats = db_pool.get_stats()
+    return {
+        "size": stats.get("pool_size", 0),
+        "available": stats.get("pool_available", 0),
+        "waiting": stats.get("requests_waiting", 0),
+        "max_size": DB_POOL_MAX_SIZE,
+    }
+
+stats_collector.register("db_pool", db_pool_stats)
+
+# Entity cache: in-process LRU with TTL in front of an optional shared Redis tier
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+CACHE_LOCAL_TTL = float(os.getenv("CACHE_LOCAL_TTL", "5"))
+CACHE_SHARED_TTL = float(os.getenv("CACHE_SHARED_TTL", "60"))
+CACHE_NEGATIVE_TTL = float(os.getenv("CACHE_NEGATIVE_TTL", "2"))
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "")
+
+class RedisCacheTier:
+    """Shared cache tier so replicas do not each go to Postgres for the same row"""
+
+    def __init__(self, url: str):
+        self.client = redis.asyncio.from_url(url)
+
+    async def get(self, key: str):
+        return await self.client.get(key)
+
+    async def set(self, key: str, value: str, ttl: float):
+        await self.client.set(key, value, px=int(ttl * 1000))
+
+    async def delete(self, key: str):
+        await self.client.delete(key)
+
+    async def close(self):
+        await self.client.aclose()
+
+class EntityCache:
+    """Read-through cache for rows looked up by id.
+
+    Not-found results are cached for CACHE_NEGATIVE_TTL, concurrent misses on the same
+    key share a single load, and writers call invalidate() after they commit.
+    """
+
+    def __init__(self, name: str, max_entries: int, ttl: float, negative_ttl: float):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.shared = None
+        self.entries = OrderedDict()
+        self.loading = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+
+    async def get_or_load(self, key, loader):
+        """Return the cached value for key, calling loader() on a miss; None means not found"""
+        key = f"{self.name}:{key}"
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+        pending = self.loading.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self.loading[key] = future
+        try:
+            value = await self._load(key, loader, future)
+            future.set_result(value)
+            return value
+        except BaseException as exc:
+            future.set_exception(exc)
+            future.exception()  # Mark retrieved when no other caller is waiting
+            raise
+        finally:
+            if self.loading.get(key) is future:
+                del self.loading[key]
+
+    async def _load(self, key: str, loader, future):
+        if self.shared is not None:
+            try:
+                raw = await self.shared.get(key)
+                if raw is not None:
+                    value = json.loads(raw)
+                    self._store(key, value, future)
+                    self.hits += 1
+                    return value
+            except Exception as exc:
+                print(f"Shared cache read failed for {key}: {exc}")
+
+        self.misses += 1
+        value = await loader()
+        # A write that invalidated this key while we were loading wins over our result
+        if self._store(key, value, future) and self.shared is not None:
+            try:
+                await self.shared.set(key, json.dumps(value), CACHE_SHARED_TTL if value is not None else self.negative_ttl)
+            except Exception as exc:
+                print(f"Shared cache write failed for {key}: {exc}")
+        return value
+
+    def _store(self, key: str, value, future) -> bool:
+        if self.loading.get(key) is not future:
+            return False
+        ttl = self.ttl if value is not None else self.negative_ttl
+        self.entries[key] = (time.monotonic() + ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+        return True
+
+    async def invalidate(self, key):
+        key = f"{self.name}:{key}"
+        self.entries.pop(key, None)
+        self.loading.pop(key, None)
+        if self.shared is not None:
+            try:
+                await self.shared.delete(key)
+            except Exception as exc:
+                print(f"Shared cache invalidation failed for {key}: {exc}")
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "coalesced": self.coalesced,
+            "shared": self.shared is not None,
+        }
+
+user_cache = EntityCache("user", CACHE_MAX_ENTRIES, CACHE_LOCAL_TTL, CACHE_NEGATIVE_TTL)
+stats_collector.register("cache", user_cache.stats)
+
+# Password hashing: argon2id, run off the event loop in a bounded thread pool
+# (argon2-cffi releases the GIL while hashing, so threads scale across cores)
+PASSWORD_HASH_TIME_COST = int(os.getenv("PASSWORD_HASH_TIME_COST", "3"))
+PASSWORD_HASH_MEMORY_COST = int(os.getenv("PASSWORD_HASH_MEMORY_COST", "65536"))  # KiB
+PASSWORD_HASH_PARALLELISM = int(os.getenv("PASSWORD_HASH_PARALLELISM", "1"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "64"))
+PASSWORD_HASH_RETRY_AFTER = int(os.getenv("PASSWORD_HASH_RETRY_AFTER", "1"))
+
+class HasherBusy(Exception):
+    pass
+
+class PasswordHasherPool:
+    """argon2id hashing and verification on a fixed set of worker threads.
+
+    At most `workers` hashes run at once and at most `max_queue` more wait; beyond
+    that calls fail fast with HasherBusy so a login burst cannot queue unbounded
+    work (or memory: each running hash holds memory_cost KiB).
+    """
+
+    def __init__(self, workers: int, max_queue: int):
+        self.hasher = PasswordHasher(
+            time_cost=PASSWORD_HASH_TIME_COST,
+            memory_cost=PASSWORD_HASH_MEMORY_COST,
+            parallelism=PASSWORD_HASH_PARALLELISM,
+        )
+        self.workers = workers
+        self.max_queue = max_queue
+        self.executor = None
+        self.pending = 0
+        self.hashed = 0
+        self.verified = 0
+        self.rehashed = 0
+        self.rejected = 0
+        self.dummy_hash = None
+
+    def start(self):
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+        # Verified against when an email is unknown, so response time does not reveal which emails exist
+        self.dummy_hash = self.hasher.hash("not-a-real-password")
+
+    def stop(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+
+    async def _run(self, fn, *args):
+        if self.pending >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise HasherBusy()
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        hashed = await self._run(self.hasher.hash, password)
+        self.hashed += 1
+        return hashed
+
+    def _verify(self, stored: str, password: str) -> bool:
+        if not stored.startswith("$argon2"):
+            # Plaintext row from before hashing was introduced; upgraded on successful login
+            return hmac.compare_digest(stored.encode(), password.encode())
+        try:
+            return self.hasher.verify(stored, password)
+        except (VerificationError, InvalidHashError):
+            return False
+
+    async def verify(self, stored: Optional[str], password: str) -> bool:
+        valid = await self._run(self._verify, stored or self.dummy_hash, password)
+        self.verified += 1
+        return valid and stored is not None
+
+    def needs_rehash(self, stored: str) -> bool:
+        return not stored.startswith("$argon2") or self.hasher.check_needs_rehash(stored)
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "pending": self.pending,
+            "hashed": self.hashed,
+            "verified": self.verified,
+            "rehashed": self.rehashed,
+            "rejected": self.rejected,
+        }
+
+password_hasher = PasswordHasherPool(PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_QUEUE)
+stats_collector.register("password_hasher", password_hasher.stats)
+
+def hasher_busy_error():
+    return HTTPException(
+        status_code=503,
+        detail="Too many concurrent logins, please retry",
+        headers={"Retry-After": str(PASSWORD_HASH_RETRY_AFTER)},
     )
 
+# Session tokens: "<kid>.<claims>.<signature>" with HMAC-SHA256 over "<kid>.<claims>".
+# ride-service and driver-service verify them locally, so authenticating a request needs no
+# users lookup. SESSION_SIGNING_KEYS is "kid:secret,kid:secret,..."; the first key signs and
+# every listed key verifies, so a key is rotated by prepending the new one and dropping the
+# old one once SESSION_TOKEN_TTL has passed.
+SESSION_SIGNING_KEYS = os.getenv("SESSION_SIGNING_KEYS", "dev:insecure-dev-session-key")
+SESSION_TOKEN_TTL = int(os.getenv("SESSION_TOKEN_TTL", "3600"))
+
+def parse_signing_keys(value: str) -> dict:
+    keys = {}
+    for entry in value.split(","):
+        kid, _, secret = entry.strip().partition(":")
+        if kid and secret:
+            keys[kid] = secret.encode()
+    return keys
+
+def b64url_encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+class SessionIssuer:
+    """Signs session tokens with the current (first) signing key"""
+
+    def __init__(self, keys: dict, ttl: int):
+        if not keys:
+            raise RuntimeError("SESSION_SIGNING_KEYS has no usable kid:secret entries")
+        self.kid, self.key = next(iter(keys.items()))
+        self.ttl = ttl
+        self.issued = 0
+
+    def issue(self, user_id: int, user_type: str, city: Optional[str]):
+        now = int(time.time())
+        claims = {"sub": user_id, "typ": user_type, "city": city, "iat": now, "exp": now + self.ttl}
+        signed = f"{self.kid}.{b64url_encode(json.dumps(claims, separators=(',', ':')).encode())}"
+        signature = hmac.new(self.key, signed.encode(), hashlib.sha256).digest()
+        self.issued += 1
+        return f"{signed}.{b64url_encode(signature)}", claims["exp"]
+
+    def stats(self):
+        return {"kid": self.kid, "ttl": self.ttl, "issued": self.issued}
+
+session_issuer = SessionIssuer(parse_signing_keys(SESSION_SIGNING_KEYS), SESSION_TOKEN_TTL)
+stats_collector.register("session_issuer", session_issuer.stats)
+
+# City registry: every city name in the cities table, held in memory. Registration only
+# writes a city row when the name is new to this replica, and GET /cities is served
+# without touching the database. Other replicas' additions are picked up by a periodic
+# refresh that reloads the whole (small) table and merges in any names not seen yet.
+CITY_REFRESH_INTERVAL = float(os.getenv("CITY_REFRESH_INTERVAL", "60"))
+CITY_LIST_MAX_AGE = int(os.getenv("CITY_LIST_MAX_AGE", "60"))
+
+class CityRegistry:
+    """In-process copy of the cities table"""
+
+    def __init__(self):
+        self.names = set()
+        self.sorted_names = []
+        self.task = None
+        self.hits = 0
+        self.inserts = 0
+
+    def known(self, name: str) -> bool:
+        if name in self.names:
+            self.hits += 1
+            return True
+        return False
+
+    def add(self, name: str):
+        if name not in self.names:
+            self.names.add(name)
+            self.sorted_names = sorted(self.names)
+
+    async def refresh(self):
+        # The table is small, so read all of it: serial ids commit out of order, and a
+        # "WHERE id > last_id" watermark would skip a city whose insert committed late
+        async with db_cursor() as cursor:
+            await cursor.execute("SELECT name FROM cities")
+            rows = await cursor.fetchall()
+
+        names = {name for (name,) in rows}
+        if not names <= self.names:
+            self.names.update(names)
+            self.sorted_names = sorted(self.names)
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(CITY_REFRESH_INTERVAL)
+            try:
+                await self.refresh()
+            except Exception as exc:
+                print(f"City registry refresh failed: {exc}")
+
+    def stats(self):
+        return {"cities": len(self.names), "hits": self.hits, "inserts": self.inserts}
+
+city_registry = CityRegistry()
+stats_collector.register("cities", city_registry.stats)
+
 # Models
 class UserRegister(BaseModel):
     name: str
@@ -52,140 +545,407 @@ class UserResponse(BaseModel):
     user_type: str
     city: Optional[str] = None
 
+class SessionResponse(UserResponse):
+    token: str
+    expires_at: int
+
+def session_response(row) -> SessionResponse:
+    token, expires_at = session_issuer.issue(row[0], row[3], row[4])
+    return SessionResponse(
+        id=row[0],
+        name=row[1],
+        email=row[2],
+        user_type=row[3],
+        city=row[4],
+        token=token,
+        expires_at=expires_at
+    )
+
 @app.on_event("startup")
 async def startup():
-    # Initialize database tables
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id SERIAL PRIMARY KEY,
-            name VARCHAR(255) NOT NULL,
-            email VARCHAR(255) UNIQUE NOT NULL,
-            password VARCHAR(255) NOT NULL,
-            user_type VARCHAR(50) NOT NULL,
-            city VARCHAR(100),
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS cities (
-            id SERIAL PRIMARY KEY,
-            name VARCHAR(100) UNIQUE NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    conn.commit()
-    cursor.close()
-    conn.close()
+    # Tables and indexes are managed by backend/db-migrations, which runs once per deploy
+    await db_pool.open(wait=True)
+    if CACHE_REDIS_URL:
+        user_cache.shared = RedisCacheTier(CACHE_REDIS_URL)
+    password_hasher.start()
+    await city_registry.refresh()
+    city_registry.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await city_registry.stop()
+    password_hasher.stop()
+    if user_cache.shared is not None:
+        await user_cache.shared.close()
+    await db_pool.close()
 
-@app.post("/user/register", response_model=UserResponse)
+@app.post("/user/register", response_model=SessionResponse)
 async def register_user(user: UserRegister):
     """Register a new user (rider or driver)"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
     try:
-        # Insert user
-        cursor.execute("""
-            INSERT INTO users (name, email, password, user_type, city)
-            VALUES (%s, %s, %s, %s, %s)
-            RETURNING id, name, email, user_type, city
-        """, (user.name, user.email, user.password, user.user_type, user.city))
-        
-        result = cursor.fetchone()
-        conn.commit()
-        
-        # Insert city if provided
+        password_hash = await password_hasher.hash(user.password)
+
+        async with db_cursor() as cursor:
+            if not user.city or city_registry.known(user.city):
+                await cursor.execute("""
+                    INSERT INTO users (name, email, password, user_type, city)
+                    VALUES (%s, %s, %s, %s, %s)
+                    RETURNING id, name, email, user_type, city
+                """, (user.name, user.email, password_hash, user.user_type, user.city))
+            else:
+                # New city: record it in the same statement (and transaction) as the user
+                await cursor.execute("""
+                    WITH new_user AS (
+                        INSERT INTO users (name, email, password, user_type, city)
+                        VALUES (%s, %s, %s, %s, %s)
+                        RETURNING id, name, email, user_type, city
+                    ), new_city AS (
+                        INSERT INTO cities (name)
+                        SELECT city FROM new_user
+                        ON CONFLICT (name) DO NOTHING
+                    )
+                    SELECT id, name, email, user_type, city FROM new_user
+                """, (user.name, user.email, password_hash, user.user_type, user.city))
+                city_registry.inserts += 1
+
+            result = await cursor.fetchone()
+
         if user.city:
-            cursor.execute("""
-                INSERT INTO cities (name) VALUES (%s)
-                ON CONFLICT (name) DO NOTHING
-            """, (user.city,))
-            conn.commit()
-        
-        return UserResponse(
-            id=result[0],
-            name=result[1],
-            email=result[2],
-            user_type=result[3],
-            city=result[4]
-        )
-    except psycopg2.IntegrityError:
+            city_registry.add(user.city)
+
+        # Drop any cached "not found" for the new id
+        await user_cache.invalidate(result[0])
+
+        return session_response(result)
+    except HTTPException:
+        raise
+    except HasherBusy:
+        raise hasher_busy_error()
+    except psycopg.IntegrityError:
         raise HTTPException(status_code=400, detail="Email already exists")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        cursor.close()
-        conn.close()
 
-@app.post("/user/login", response_model=UserResponse)
+@app.post("/user/login", response_model=SessionResponse)
 async def login_user(credentials: UserLogin):
-    """Login user (mock authentication)"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
+    """Login user with their email and password"""
     try:
-        cursor.execute("""
-            SELECT id, name, email, user_type, city
-            FROM users
-            WHERE email = %s AND password = %s
-        """, (credentials.email, credentials.password))
-        
-        result = cursor.fetchone()
-        if not result:
+        async with db_cursor() as cursor:
+            await cursor.execute("""
+                SELECT id, name, email, user_type, city, password
+                FROM users
+                WHERE email = %s
+            """, (credentials.email,))
+
+            result = await cursor.fetchone()
+
+        stored = result[5] if result else None
+        if not await password_hasher.verify(stored, credentials.password):
             raise HTTPException(status_code=401, detail="Invalid credentials")
-        
-        return UserResponse(
-            id=result[0],
-            name=result[1],
-            email=result[2],
-            user_type=result[3],
-            city=result[4]
+
+        # Upgrade plaintext rows and hashes made with older parameters while we have the password
+        if password_hasher.needs_rehash(stored):
+            try:
+                new_hash = await password_hasher.hash(credentials.password)
+                async with db_cursor() as cursor:
+                    await cursor.execute(
+                        "UPDATE users SET password = %s WHERE id = %s AND password = %s",
+                        (new_hash, result[0], stored)
+                    )
+                password_hasher.rehashed += 1
+            except Exception as e:
+                print(f"Password rehash failed for user {result[0]}: {e!r}")
+
+        return session_response(result)
+    except HTTPException:
+        raise
+    except HasherBusy:
+        raise hasher_busy_error()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Bulk import: the body is parsed line by line as it arrives and COPYed into a staging
+# table in chunks, so memory stays flat however large the file is
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+IMPORT_MAX_LINE_LENGTH = int(os.getenv("IMPORT_MAX_LINE_LENGTH", "65536"))
+IMPORT_MAX_REPORTED_ERRORS = int(os.getenv("IMPORT_MAX_REPORTED_ERRORS", "100"))
+IMPORT_MAX_CONCURRENT = int(os.getenv("IMPORT_MAX_CONCURRENT", "2"))
+IMPORT_RETRY_AFTER = int(os.getenv("IMPORT_RETRY_AFTER", "30"))
+USER_TYPES = ("rider", "driver")
+
+import_stats = {"running": 0, "imports": 0, "imported": 0, "invalid": 0, "duplicates": 0}
+stats_collector.register("user_import", lambda: import_stats)
+
+# Imports hash plaintext passwords on at most this many pool workers, leaving the rest for logins
+import_hash_slots = asyncio.Semaphore(max(1, PASSWORD_HASH_WORKERS // 2))
+
+async def stream_lines(request: Request):
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    buffer = ""
+    async for chunk in request.stream():
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+        if len(buffer) > IMPORT_MAX_LINE_LENGTH:
+            raise HTTPException(status_code=400, detail=f"Lines must not exceed {IMPORT_MAX_LINE_LENGTH} characters")
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer.rstrip("\r")
+
+async def import_records(request: Request, fmt: str):
+    """(line number, record dict or None, parse error or None) for each non-blank line"""
+    header = None
+    line_no = 0
+    async for line in stream_lines(request):
+        line_no += 1
+        if not line.strip():
+            continue
+        if fmt == "csv":
+            values = next(csv.reader([line]))
+            if header is None:
+                header = [column.strip().lower() for column in values]
+                continue
+            if len(values) != len(header):
+                yield line_no, None, f"expected {len(header)} columns, got {len(values)}"
+                continue
+            yield line_no, dict(zip(header, values)), None
+        else:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                yield line_no, None, "invalid JSON"
+                continue
+            if not isinstance(record, dict):
+                yield line_no, None, "expected a JSON object"
+                continue
+            yield line_no, record, None
+
+def validate_import_record(record: dict):
+    """(name, email, password, password_hash, user_type, city), or a reason the record is rejected"""
+    fields = {key: str(record.get(key) or "").strip() for key in ("name", "email", "user_type", "city", "password_hash")}
+    password = str(record.get("password") or "")
+    if not fields["name"] or len(fields["name"]) > 255:
+        return None, "name is required (at most 255 characters)"
+    if "@" not in fields["email"] or len(fields["email"]) > 255:
+        return None, "email is invalid"
+    if fields["user_type"] not in USER_TYPES:
+        return None, "user_type must be 'rider' or 'driver'"
+    if len(fields["city"]) > 100:
+        return None, "city must be at most 100 characters"
+    if fields["password_hash"]:
+        if not fields["password_hash"].startswith("$argon2") or len(fields["password_hash"]) > 255:
+            return None, "password_hash must be an argon2 hash"
+    elif not password:
+        return None, "password or password_hash is required"
+    return (fields["name"], fields["email"], password, fields["password_hash"],
+            fields["user_type"], fields["city"] or None), None
+
+async def hash_import_password(password: str) -> str:
+    async with import_hash_slots:
+        while True:
+            try:
+                return await password_hasher.hash(password)
+            except HasherBusy:
+                await asyncio.sleep(PASSWORD_HASH_RETRY_AFTER)
+
+class UserImport:
+    """One import run: stages valid records with COPY, then merges them into users in one statement"""
+
+    def __init__(self):
+        self.received = 0
+        self.invalid = 0
+        self.errors = []
+
+    def reject(self, line: int, reason: str, email: Optional[str] = None):
+        self.invalid += 1
+        if len(self.errors) < IMPORT_MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "email": email, "reason": reason})
+
+    async def stage(self, copy, chunk: list):
+        # Plaintext passwords are hashed here; pre-hashed rows pass through untouched
+        stored = [password_hash for _, (_, _, _, password_hash, _, _) in chunk]
+        plaintext = [index for index, password_hash in enumerate(stored) if not password_hash]
+        hashes = await asyncio.gather(*(hash_import_password(chunk[index][1][2]) for index in plaintext))
+        for index, password_hash in zip(plaintext, hashes):
+            stored[index] = password_hash
+        for (line, (name, email, _, _, user_type, city)), password_hash in zip(chunk, stored):
+            await copy.write_row((line, name, email, password_hash, user_type, city))
+
+    async def run(self, records) -> dict:
+        async with db_cursor() as cursor:
+            await cursor.execute("""
+                CREATE TEMP TABLE user_import (
+                    line INTEGER NOT NULL,
+                    name TEXT NOT NULL,
+                    email TEXT NOT NULL,
+                    password TEXT NOT NULL,
+                    user_type TEXT NOT NULL,
+                    city TEXT
+                ) ON COMMIT DROP
+            """)
+
+            async with cursor.copy("COPY user_import (line, name, email, password, user_type, city) FROM STDIN") as copy:
+                chunk = []
+                async for line, record, error in records:
+                    self.received += 1
+                    if error is None:
+                        row, error = validate_import_record(record)
+                    if error is not None:
+                        self.reject(line, error, record.get("email") if record else None)
+                        continue
+                    chunk.append((line, row))
+                    if len(chunk) >= IMPORT_CHUNK_SIZE:
+                        await self.stage(copy, chunk)
+                        chunk = []
+                if chunk:
+                    await self.stage(copy, chunk)
+
+            # The first occurrence of an email in the file is inserted unless the email is
+            # already registered; later occurrences are reported as duplicates. Cities of
+            # the inserted users are upserted once, in the same statement.
+            await cursor.execute("""
+                WITH firsts AS (
+                    SELECT DISTINCT ON (email) line, name, email, password, user_type, city
+                    FROM user_import
+                    ORDER BY email, line
+                ), inserted AS (
+                    INSERT INTO users (name, email, password, user_type, city)
+                    SELECT name, email, password, user_type, city FROM firsts ORDER BY line
+                    ON CONFLICT (email) DO NOTHING
+                    RETURNING email, city
+                ), new_cities AS (
+                    INSERT INTO cities (name)
+                    SELECT DISTINCT city FROM inserted WHERE city IS NOT NULL
+                    ON CONFLICT (name) DO NOTHING
+                    RETURNING name
+                ), rejected AS (
+                    SELECT s.line, s.email,
+                           CASE WHEN f.line <> s.line THEN 'duplicate email in file'
+                                ELSE 'email already exists' END AS reason
+                    FROM user_import s JOIN firsts f ON f.email = s.email
+                    WHERE f.line <> s.line OR NOT EXISTS (SELECT 1 FROM inserted i WHERE i.email = s.email)
+                )
+                SELECT (SELECT count(*) FROM inserted),
+                       (SELECT count(*) FROM new_cities),
+                       (SELECT count(*) FROM rejected),
+                       (SELECT coalesce(json_agg(r ORDER BY r.line), '[]'::json)
+                        FROM (SELECT * FROM rejected ORDER BY line LIMIT %s) r)
+            """, (IMPORT_MAX_REPORTED_ERRORS - len(self.errors),))
+
+            imported, cities_added, duplicates, reported = await cursor.fetchone()
+
+        self.errors.extend(reported)
+        return {
+            "received": self.received,
+            "imported": imported,
+            "invalid": self.invalid,
+            "duplicates": duplicates,
+            "cities_added": cities_added,
+            "errors": sorted(self.errors, key=lambda error: error["line"]),
+            "errors_truncated": self.invalid + duplicates > len(self.errors),
+        }
+
+@app.post("/user/import", response_model=dict)
+async def import_users(request: Request):
+    """Bulk-create users from a streamed CSV (header row first) or NDJSON body.
+
+    Columns: name, email, user_type, city and either password (hashed here) or
+    password_hash (an existing argon2 hash). Invalid rows and duplicate emails are
+    reported per line; everything else is inserted in a single transaction.
+    """
+    content_type = request.headers.get("content-type", "")
+    if "csv" in content_type:
+        fmt = "csv"
+    elif "ndjson" in content_type or "jsonl" in content_type:
+        fmt = "ndjson"
+    else:
+        raise HTTPException(status_code=415, detail="Send text/csv or application/x-ndjson")
+
+    if import_stats["running"] >= IMPORT_MAX_CONCURRENT:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many imports in progress, please retry",
+            headers={"Retry-After": str(IMPORT_RETRY_AFTER)},
         )
+
+    import_stats["running"] += 1
+    try:
+        report = await UserImport().run(import_records(request, fmt))
+
+        import_stats["imports"] += 1
+        import_stats["imported"] += report["imported"]
+        import_stats["invalid"] += report["invalid"]
+        import_stats["duplicates"] += report["duplicates"]
+        if report["cities_added"]:
+            try:
+                await city_registry.refresh()
+            except Exception as exc:
+                print(f"City registry refresh after import failed: {exc}")
+        return report
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        cursor.close()
-        conn.close()
+        import_stats["running"] -= 1
 
-@app.get("/user/{user_id}", response_model=UserResponse)
-async def get_user(user_id: int):
-    """Get user by ID"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    try:
-        cursor.execute("""
+async def load_user(user_id: int):
+    async with db_cursor() as cursor:
+        await cursor.execute("""
             SELECT id, name, email, user_type, city
             FROM users
             WHERE id = %s
         """, (user_id,))
-        
-        result = cursor.fetchone()
-        if not result:
+
+        result = await cursor.fetchone()
+
+    if not result:
+        return None
+
+    return {
+        "id": result[0],
+        "name": result[1],
+        "email": result[2],
+        "user_type": result[3],
+        "city": result[4]
+    }
+
+@app.get("/user/{user_id}", response_model=UserResponse)
+async def get_user(user_id: int):
+    """Get user by ID"""
+    try:
+        user = await user_cache.get_or_load(user_id, lambda: load_user(user_id))
+        if user is None:
             raise HTTPException(status_code=404, detail="User not found")
-        
-        return UserResponse(
-            id=result[0],
-            name=result[1],
-            email=result[2],
-            user_type=result[3],
-            city=result[4]
-        )
+
+        return UserResponse(**user)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        cursor.close()
-        conn.close()
+
+@app.get("/cities", response_model=List[str])
+async def list_cities(response: Response):
+    """Known city names, served from the in-process registry"""
+    response.headers["Cache-Control"] = f"public, max-age={CITY_LIST_MAX_AGE}"
+    return city_registry.sorted_names
+
+@app.get("/metrics")
+async def metrics():
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
 
 @app.get("/health")
 async def health():
-    return {"status": "healthy", "service": "user-service"}
+    return {
+        "status": "healthy",
+        "service": "user-service",
+        "db_pool": db_pool_stats(),
+        "cache": user_cache.stats(),
+        "password_hasher": password_hasher.stats(),
+        "session_issuer": session_issuer.stats(),
+        "cities": city_registry.stats(),
+    }
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8001)
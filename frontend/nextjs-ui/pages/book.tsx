@@ -13,8 +13,10 @@ export default function BookRide() {
   })
   const [loading, setLoading] = useState(false)
   const [message, setMessage] = useState('')
+  const [cities, setCities] = useState<string[]>([])
 
   const API_BASE = process.env.NEXT_PUBLIC_API_BASE_URL || 'http://localhost:8003'
+  const USER_API_BASE = process.env.NEXT_PUBLIC_API_BASE_URL || 'http://localhost:8001'
 
   useEffect(() => {
     const userData = localStorage.getItem('user')
@@ -23,6 +25,9 @@ export default function BookRide() {
       return
     }
     setUser(JSON.parse(userData))
+    axios.get(`${USER_API_BASE}/cities`)
+      .then((response) => setCities(response.data))
+      .catch(() => setCities([]))
   }, [router])
 
   const handleSubmit = async (e: React.FormEvent) => {
@@ -37,6 +42,8 @@ export default function BookRide() {
         pickup: formData.pickup,
         drop: formData.drop,
         city: formData.city
+      }, {
+        headers: user.token ? { Authorization: `Bearer ${user.token}` } : {}
       })
       setMessage(`Ride started successfully! Ride ID: ${response.data.ride_id}`)
       setFormData({ pickup: '', drop: '', city: '', driver_id: 1 })
@@ -87,11 +94,17 @@ export default function BookRide() {
             <input
               type="text"
               placeholder="City"
+              list="cities"
               value={formData.city}
               onChange={(e) => setFormData({ ...formData, city: e.target.value })}
               className="w-full px-4 py-2 border rounded-lg focus:outline-none focus:ring-2 focus:ring-blue-500"
               required
             />
+            <datalist id="cities">
+              {cities.map((city) => (
+                <option key={city} value={city} />
+              ))}
+            </datalist>
             
             <input
               type="number"
@@ -17,6 +17,7 @@ export default function MyRides() {
   const router = useRouter()
   const [rides, setRides] = useState<Ride[]>([])
   const [loading, setLoading] = useState(true)
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
 
   const API_BASE = process.env.NEXT_PUBLIC_API_BASE_URL || 'http://localhost:8003'
 
@@ -29,10 +30,13 @@ export default function MyRides() {
     fetchRides()
   }, [router])
 
-  const fetchRides = async () => {
+  const fetchRides = async (cursor?: string) => {
     try {
-      const response = await axios.get(`${API_BASE}/ride/all`)
-      setRides(response.data)
+      const response = await axios.get(`${API_BASE}/ride/all`, {
+        params: cursor ? { cursor } : {},
+      })
+      setRides((previous) => (cursor ? [...previous, ...response.data] : response.data))
+      setNextCursor(response.headers['x-next-cursor'] || null)
     } catch (err) {
       console.error('Failed to fetch rides:', err)
     } finally {
@@ -93,6 +97,17 @@ export default function MyRides() {
             </div>
           )}
 
+          {nextCursor && (
+            <div className="mt-4">
+              <button
+                onClick={() => fetchRides(nextCursor)}
+                className="text-blue-600 hover:text-blue-800"
+              >
+                Load more
+              </button>
+            </div>
+          )}
+
           <div className="mt-6">
             <button
               onClick={() => router.push('/book')}
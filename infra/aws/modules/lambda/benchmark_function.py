@@ -0,0 +1,87 @@
+"""
+Local harness for the notification Lambda: cold and warm latency, items/sec.
+
+cold   BENCH_COLD_RUNS fresh interpreters each import function.py and make
+       one invocation, like a new execution environment; reports module
+       init and first-invocation latency (interpreter startup excluded)
+warm   for each batch size in BENCH_BATCH_SIZES, repeated invocations in one
+       process for about BENCH_SECONDS, as an API Gateway request with an
+       array body and as an SQS event; batch size 1 is the old
+       one-ride-per-invocation pattern
+
+CloudWatch output (stdout) is discarded while measuring. No AWS access is
+needed:
+
+    python benchmark_function.py
+"""
+import contextlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import function
+
+BENCH_COLD_RUNS = int(os.getenv("BENCH_COLD_RUNS", "20"))
+BENCH_BATCH_SIZES = [int(size) for size in os.getenv("BENCH_BATCH_SIZES", "1,10,100,1000").split(",")]
+BENCH_SECONDS = float(os.getenv("BENCH_SECONDS", "1"))
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+COLD_START = """
+import json, sys, time
+start = time.perf_counter()
+import function
+imported = time.perf_counter()
+function.lambda_handler({"body": '{"ride_id": 1, "city": "Bangalore"}'}, None)
+invoked = time.perf_counter()
+sys.stderr.write(json.dumps([imported - start, invoked - imported]))
+"""
+
+def api_event(size: int) -> dict:
+    return {"body": json.dumps([{"ride_id": i, "city": "Bangalore"} for i in range(size)])}
+
+def sqs_event(size: int) -> dict:
+    return {"Records": [
+        {"messageId": str(i), "body": json.dumps({"ride_id": i, "city": "Bangalore"})}
+        for i in range(size)
+    ]}
+
+def cold_starts() -> dict:
+    inits, firsts = [], []
+    for _ in range(BENCH_COLD_RUNS):
+        run = subprocess.run([sys.executable, "-c", COLD_START], cwd=HERE, capture_output=True, text=True, check=True)
+        init, first = json.loads(run.stderr)
+        inits.append(init)
+        firsts.append(first)
+    return {"init_ms": statistics.median(inits) * 1000, "first_invoke_ms": statistics.median(firsts) * 1000}
+
+def warm(event: dict, size: int) -> dict:
+    function.lambda_handler(event, None)  # warm up
+    latencies = []
+    start = time.perf_counter()
+    while time.perf_counter() - start < BENCH_SECONDS:
+        invoked = time.perf_counter()
+        function.lambda_handler(event, None)
+        latencies.append(time.perf_counter() - invoked)
+    elapsed = time.perf_counter() - start
+    return {"p50_ms": statistics.median(latencies) * 1000, "items_per_sec": len(latencies) * size / elapsed}
+
+def main():
+    cold = cold_starts()
+    print(f"cold start (median of {BENCH_COLD_RUNS}): init {cold['init_ms']:.2f} ms   "
+          f"first invocation {cold['first_invoke_ms']:.3f} ms")
+
+    print(f"{'batch':>6} {'event':>6} {'warm p50 ms':>12} {'items/s':>12}")
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        rows = [
+            (size, name, warm(make_event(size), size))
+            for size in BENCH_BATCH_SIZES
+            for name, make_event in (("api", api_event), ("sqs", sqs_event))
+        ]
+    for size, name, r in rows:
+        print(f"{size:>6} {name:>6} {r['p50_ms']:>12.3f} {r['items_per_sec']:>12,.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -1,48 +1,122 @@
+import base64
 import json
 import os
 
+# Module-level state is built once per execution environment (on cold start)
+# and reused by every warm invocation, so the handler itself does no setup.
+# Keep imports to the standard library: every import is paid on cold start.
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_NOTIFICATIONS = LOG_LEVEL in ('DEBUG', 'INFO')
+MESSAGE_TEMPLATE = 'Notification: Ride {ride_id} started successfully in {city}'
+HEADERS = {
+    'Content-Type': 'application/json',
+    'Access-Control-Allow-Origin': '*'
+}
+encode_json = json.JSONEncoder(separators=(',', ':')).encode
+
+def parse_notification(item):
+    """A notification is a JSON object, given as a dict or as JSON text"""
+    if isinstance(item, (str, bytes)):
+        item = json.loads(item)
+    if not isinstance(item, dict):
+        raise ValueError('notification must be a JSON object')
+    return item
+
+def record_notification(record):
+    """The notification carried by an SQS, SNS or Kinesis record"""
+    if 'kinesis' in record:
+        return parse_notification(base64.b64decode(record['kinesis']['data']))
+    if 'Sns' in record:
+        return parse_notification(record['Sns']['Message'])
+    return parse_notification(record['body'])
+
+def record_id(record, index):
+    """Identifier Lambda expects back in batchItemFailures for this record"""
+    if 'kinesis' in record:
+        return record['kinesis'].get('sequenceNumber', str(index))
+    if 'Sns' in record:
+        return record['Sns'].get('MessageId', str(index))
+    return record.get('messageId', str(index))
+
+def notify_all(items, decode=parse_notification):
+    """
+    Send every notification and return per-item results in input order.
+    A malformed item fails on its own; messages are logged with one write.
+    """
+    results = []
+    messages = []
+    for index, item in enumerate(items):
+        try:
+            notification = decode(item)
+        except (ValueError, TypeError, KeyError) as e:
+            results.append({'index': index, 'status': 'failed', 'error': f'{type(e).__name__}: {e}'})
+            continue
+
+        ride_id = notification.get('ride_id', 'unknown')
+        city = notification.get('city', 'unknown')
+        message = MESSAGE_TEMPLATE.format(ride_id=ride_id, city=city)
+        messages.append(message)
+        results.append({'index': index, 'status': 'sent', 'ride_id': ride_id, 'city': city, 'message': message})
+
+    # Log to CloudWatch
+    if messages and LOG_NOTIFICATIONS:
+        print('\n'.join(messages))
+    return results
+
+def http_response(status_code, body):
+    return {
+        'statusCode': status_code,
+        'headers': HEADERS,
+        'body': encode_json(body)
+    }
+
+def records_response(records):
+    """SQS/SNS/Kinesis batch: only failed records are reported back for retry"""
+    results = notify_all(records, record_notification)
+    failures = []
+    for result in results:
+        if result['status'] == 'failed':
+            print(f"Error: record {result['index']}: {result['error']}")
+            failures.append({'itemIdentifier': record_id(records[result['index']], result['index'])})
+    return {'batchItemFailures': failures, 'results': results}
+
 def lambda_handler(event, context):
     """
     Notification Lambda function
-    Logs ride notification to CloudWatch
+    Logs ride notifications to CloudWatch. Accepts one notification or an
+    array of them, either as an API Gateway request body or as the event
+    itself, and SQS/SNS/Kinesis 'Records' events (ReportBatchItemFailures).
     """
     try:
+        if isinstance(event, dict) and 'Records' in event:
+            return records_response(event['Records'])
+
         # Parse request body
-        if isinstance(event.get('body'), str):
-            body = json.loads(event['body'])
-        else:
-            body = event.get('body', {})
-        
-        ride_id = body.get('ride_id', 'unknown')
-        city = body.get('city', 'unknown')
-        
-        message = f"Notification: Ride {ride_id} started successfully in {city}"
-        
-        # Log to CloudWatch
-        print(message)
-        
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({
-                'message': message,
-                'ride_id': ride_id,
-                'city': city
-            })
-        }
+        body = event.get('body') if isinstance(event, dict) and 'body' in event else event
+        if isinstance(event, dict) and event.get('isBase64Encoded') and isinstance(body, str):
+            body = base64.b64decode(body)
+        if isinstance(body, (str, bytes)):
+            try:
+                body = json.loads(body)
+            except ValueError as e:
+                return http_response(400, {'error': f'Invalid JSON body: {e}'})
+        if body is None:
+            # A request without a body (null) is the legacy single notification with no fields
+            body = {}
+
+        if isinstance(body, list):
+            results = notify_all(body)
+            failed = sum(result['status'] == 'failed' for result in results)
+            return http_response(200, {'sent': len(results) - failed, 'failed': failed, 'results': results})
+
+        result = notify_all([body])[0]
+        if result['status'] == 'failed':
+            return http_response(400, {'error': result['error']})
+        return http_response(200, {
+            'message': result['message'],
+            'ride_id': result['ride_id'],
+            'city': result['city']
+        })
     except Exception as e:
         print(f"Error: {str(e)}")
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({
-                'error': str(e)
-            })
-        }
-
+        return http_response(500, {'error': str(e)})
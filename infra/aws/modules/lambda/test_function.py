@@ -0,0 +1,42 @@
+"""
+Handler compatibility checks for the notification Lambda, run locally:
+
+    python -m unittest test_function
+"""
+import contextlib
+import io
+import json
+import unittest
+
+import function
+
+def invoke(event):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return function.lambda_handler(event, None)
+
+class LambdaHandlerTest(unittest.TestCase):
+    def test_null_body_is_a_single_notification(self):
+        response = invoke({'body': None})
+        self.assertEqual(response['statusCode'], 200)
+        self.assertEqual(json.loads(response['body']), {
+            'message': 'Notification: Ride unknown started successfully in unknown',
+            'ride_id': 'unknown',
+            'city': 'unknown'
+        })
+
+    def test_single_notification(self):
+        response = invoke({'body': json.dumps({'ride_id': 7, 'city': 'Pune'})})
+        self.assertEqual(response['statusCode'], 200)
+        self.assertEqual(json.loads(response['body'])['ride_id'], 7)
+
+    def test_batch(self):
+        response = invoke({'body': json.dumps([{'ride_id': 1, 'city': 'Pune'}, 'not json'])})
+        self.assertEqual(response['statusCode'], 200)
+        self.assertEqual(json.loads(response['body'])['sent'], 1)
+        self.assertEqual(json.loads(response['body'])['failed'], 1)
+
+    def test_invalid_json_body(self):
+        self.assertEqual(invoke({'body': '{'})['statusCode'], 400)
+
+if __name__ == '__main__':
+    unittest.main()
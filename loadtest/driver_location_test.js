@@ -0,0 +1,60 @@
+import http from 'k6/http';
+import { check } from 'k6';
+import { Counter, Rate } from 'k6/metrics';
+
+// Sustained driver location ingestion through POST /driver/location/batch
+const pingsAccepted = new Counter('pings_accepted');
+const backpressure = new Rate('backpressure');
+const errorRate = new Rate('errors');
+
+const DRIVERS = parseInt(__ENV.DRIVERS || '20000');
+const BATCH_SIZE = parseInt(__ENV.BATCH_SIZE || '500');
+
+export let options = {
+  scenarios: {
+    ingest: {
+      executor: 'constant-vus',
+      vus: parseInt(__ENV.VUS || '20'),
+      duration: __ENV.DURATION || '1m',
+    },
+  },
+  thresholds: {
+    pings_accepted: ['count>0'],
+    errors: ['rate<0.01'],
+  },
+};
+
+const BASE_URL = __ENV.DRIVER_SERVICE_URL || 'http://driver-service:80';
+const params = { headers: { 'Content-Type': 'application/json' } };
+
+function randomPing() {
+  // Drivers spread over roughly 40x40 km around Bangalore
+  return {
+    driver_id: Math.floor(Math.random() * DRIVERS) + 1,
+    lat: 12.8 + Math.random() * 0.4,
+    lon: 77.4 + Math.random() * 0.4,
+  };
+}
+
+export default function () {
+  const pings = [];
+  for (let i = 0; i < BATCH_SIZE; i++) {
+    pings.push(randomPing());
+  }
+
+  const response = http.post(`${BASE_URL}/driver/location/batch`, JSON.stringify(pings), params);
+  // 503 is the service shedding load while its buffer is full, not a failure
+  backpressure.add(response.status === 503);
+  const success = check(response, { 'status is 202 or 503': (r) => r.status === 202 || r.status === 503 });
+  errorRate.add(!success);
+  if (response.status === 202) {
+    pingsAccepted.add(JSON.parse(response.body).accepted);
+  }
+}
+
+// pings/sec = pings_accepted count / test duration
+export function handleSummary(data) {
+  return {
+    'stdout': JSON.stringify(data),
+  };
+}
@@ -0,0 +1,76 @@
+import http from 'k6/http';
+import { check, sleep } from 'k6';
+import { Counter, Rate } from 'k6/metrics';
+import { randomDriver, setupDrivers } from './drivers.js';
+
+// Hundreds of parallel bookings competing for a small pool of drivers. Every booking that
+// succeeds checks that its driver has no other started ride, then completes the ride.
+const bookings = new Counter('bookings');
+const conflicts = new Counter('driver_conflicts');
+const doubleAssignments = new Counter('double_assignments');
+const errorRate = new Rate('errors');
+
+const DRIVERS = parseInt(__ENV.DRIVERS || '100');
+
+export let options = {
+  scenarios: {
+    contention: {
+      executor: 'constant-vus',
+      vus: parseInt(__ENV.VUS || '300'),
+      duration: __ENV.DURATION || '1m',
+    },
+  },
+  thresholds: {
+    bookings: ['count>0'],
+    double_assignments: ['count==0'],
+    errors: ['rate<0.01'],
+  },
+};
+
+const RIDE_URL = __ENV.RIDE_SERVICE_URL || 'http://ride-service:80';
+const params = { headers: { 'Content-Type': 'application/json' } };
+
+export function setup() {
+  return { driverIds: setupDrivers(DRIVERS) };
+}
+
+export default function (data) {
+  const driverId = randomDriver(data.driverIds);
+  const response = http.post(`${RIDE_URL}/ride/start`, JSON.stringify({
+    rider_id: Math.floor(Math.random() * 1000) + 1,
+    driver_id: driverId,
+    pickup: 'Koramangala',
+    drop: 'Airport',
+    city: 'Bangalore',
+  }), params);
+
+  // 409 is the reservation doing its job: someone else booked this driver first
+  const success = check(response, { 'status is 200 or 409': (r) => r.status === 200 || r.status === 409 });
+  errorRate.add(!success);
+  if (response.status === 409) {
+    conflicts.add(1);
+    return;
+  }
+  if (response.status !== 200) {
+    return;
+  }
+  bookings.add(1);
+
+  // While we hold the driver, any other started ride for them is a double assignment
+  const rideId = JSON.parse(response.body).ride_id;
+  const started = http.get(`${RIDE_URL}/ride/all?driver_id=${driverId}&status=started`);
+  if (JSON.parse(started.body).length !== 1) {
+    doubleAssignments.add(1);
+  }
+
+  sleep(Math.random() * 0.5);
+  const completed = http.post(`${RIDE_URL}/ride/${rideId}/complete`);
+  errorRate.add(completed.status !== 200);
+}
+
+// bookings/sec = bookings count / test duration; double_assignments must stay at 0
+export function handleSummary(data) {
+  return {
+    'stdout': JSON.stringify(data),
+  };
+}
@@ -0,0 +1,25 @@
+import http from 'k6/http';
+
+// Shared k6 setup: bookings reserve their driver, so load tests need a pool of online drivers
+const DRIVER_URL = __ENV.DRIVER_SERVICE_URL || 'http://driver-service:80';
+const params = { headers: { 'Content-Type': 'application/json' } };
+
+export function setupDrivers(count) {
+  const driverIds = [];
+  for (let i = 0; i < count; i++) {
+    const created = http.post(`${DRIVER_URL}/driver/create`, JSON.stringify({
+      user_id: i + 1,
+      vehicle_number: `KA01-LT${i}`,
+      vehicle_type: 'sedan',
+      license_number: `LT${i}`,
+    }), params);
+    const driverId = JSON.parse(created.body).id;
+    http.put(`${DRIVER_URL}/driver/status`, JSON.stringify({ driver_id: driverId, status: 'online' }), params);
+    driverIds.push(driverId);
+  }
+  return driverIds;
+}
+
+export function randomDriver(driverIds) {
+  return driverIds[Math.floor(Math.random() * driverIds.length)];
+}
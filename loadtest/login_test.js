@@ -0,0 +1,83 @@
+import http from 'k6/http';
+import { check } from 'k6';
+import { Counter, Rate } from 'k6/metrics';
+
+// Login throughput with argon2 hashing, plus a probe showing the event loop stays responsive:
+// /health must stay fast while the hashing pool is saturated.
+const logins = new Counter('logins');
+const shed = new Counter('logins_shed');
+const errorRate = new Rate('errors');
+
+const USERS = parseInt(__ENV.USERS || '100');
+const LOGIN_RATE = parseInt(__ENV.LOGIN_RATE || '50');  // Target peak logins/sec
+
+export let options = {
+  scenarios: {
+    logins: {
+      executor: 'constant-arrival-rate',
+      exec: 'login',
+      rate: LOGIN_RATE,
+      timeUnit: '1s',
+      duration: __ENV.DURATION || '1m',
+      preAllocatedVUs: LOGIN_RATE * 2,
+    },
+    probe: {
+      executor: 'constant-arrival-rate',
+      exec: 'probe',
+      rate: 10,
+      timeUnit: '1s',
+      duration: __ENV.DURATION || '1m',
+      preAllocatedVUs: 5,
+    },
+  },
+  thresholds: {
+    logins: ['count>0'],
+    errors: ['rate<0.01'],
+    'http_req_duration{scenario:probe}': ['p(99)<50'],
+  },
+};
+
+const BASE_URL = __ENV.USER_SERVICE_URL || 'http://user-service:80';
+const params = { headers: { 'Content-Type': 'application/json' } };
+const PASSWORD = 'load-test-password';
+
+export function setup() {
+  const emails = [];
+  const run = Date.now();
+  for (let i = 0; i < USERS; i++) {
+    const email = `login-${run}-${i}@example.com`;
+    http.post(`${BASE_URL}/user/register`, JSON.stringify({
+      name: `Login Test ${i}`,
+      email: email,
+      password: PASSWORD,
+      user_type: 'rider',
+    }), params);
+    emails.push(email);
+  }
+  return { emails };
+}
+
+export function login(data) {
+  const email = data.emails[Math.floor(Math.random() * data.emails.length)];
+  const response = http.post(`${BASE_URL}/user/login`, JSON.stringify({ email: email, password: PASSWORD }), params);
+  // 503 is the hashing pool shedding load above its queue limit, not a failure
+  const success = check(response, { 'status is 200 or 503': (r) => r.status === 200 || r.status === 503 });
+  errorRate.add(!success);
+  if (response.status === 200) {
+    logins.add(1);
+  } else if (response.status === 503) {
+    shed.add(1);
+  }
+}
+
+export function probe() {
+  const response = http.get(`${BASE_URL}/health`);
+  errorRate.add(response.status !== 200);
+}
+
+// logins/sec = logins count / duration; compare http_req_duration{scenario:probe} with and without load
+export function handleSummary(data) {
+  return {
+    'stdout': JSON.stringify(data),
+  };
+}
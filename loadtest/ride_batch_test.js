@@ -0,0 +1,93 @@
+import http from 'k6/http';
+import { check } from 'k6';
+import { Counter, Rate } from 'k6/metrics';
+import { randomDriver, setupDrivers } from './drivers.js';
+
+// Compares ride creation throughput: N calls to /ride/start vs /ride/start/batch
+const ridesCreated = new Counter('rides_created');
+const errorRate = new Rate('errors');
+
+const BATCH_SIZE = parseInt(__ENV.BATCH_SIZE || '100');
+const DRIVERS = parseInt(__ENV.DRIVERS || '2000');
+
+export let options = {
+  scenarios: {
+    single: {
+      executor: 'constant-vus',
+      exec: 'single',
+      vus: 50,
+      duration: '1m',
+      tags: { mode: 'single' },
+    },
+    batch: {
+      executor: 'constant-vus',
+      exec: 'batch',
+      vus: 5,
+      duration: '1m',
+      startTime: '1m10s',  // Run after the single scenario so they do not compete
+      tags: { mode: 'batch' },
+    },
+  },
+  thresholds: {
+    'rides_created{mode:single}': ['count>0'],
+    'rides_created{mode:batch}': ['count>0'],
+    errors: ['rate<0.1'],
+  },
+};
+
+const BASE_URL = __ENV.RIDE_SERVICE_URL || 'http://ride-service:80';
+const params = { headers: { 'Content-Type': 'application/json' } };
+
+export function setup() {
+  return { driverIds: setupDrivers(DRIVERS) };
+}
+
+function randomRide(driverIds) {
+  const cities = ['Bangalore', 'Mumbai', 'Delhi', 'Hyderabad', 'Chennai'];
+  return {
+    rider_id: Math.floor(Math.random() * 10) + 1,
+    driver_id: randomDriver(driverIds),
+    pickup: 'Koramangala',
+    drop: 'Airport',
+    city: cities[Math.floor(Math.random() * cities.length)],
+  };
+}
+
+// Completing rides frees their drivers for the next iteration
+function completeRides(rideIds) {
+  http.batch(rideIds.map((rideId) => ['POST', `${BASE_URL}/ride/${rideId}/complete`, null, params]));
+}
+
+export function single(data) {
+  const response = http.post(`${BASE_URL}/ride/start`, JSON.stringify(randomRide(data.driverIds)), params);
+  // 409 means the driver was taken by another booking
+  const success = check(response, { 'status is 200 or 409': (r) => r.status === 200 || r.status === 409 });
+  errorRate.add(!success);
+  if (response.status === 200) {
+    ridesCreated.add(1);
+    completeRides([JSON.parse(response.body).ride_id]);
+  }
+}
+
+export function batch(data) {
+  const rides = [];
+  for (let i = 0; i < BATCH_SIZE; i++) {
+    rides.push(randomRide(data.driverIds));
+  }
+
+  const response = http.post(`${BASE_URL}/ride/start/batch`, JSON.stringify(rides), params);
+  const success = check(response, { 'status is 200': (r) => r.status === 200 });
+  errorRate.add(!success);
+  if (success) {
+    const started = JSON.parse(response.body).results.filter((r) => r.ride_id !== null);
+    ridesCreated.add(started.length);
+    completeRides(started.map((r) => r.ride_id));
+  }
+}
+
+// rides/sec per mode = rides_created{mode} count / 60s
+export function handleSummary(data) {
+  return {
+    'stdout': JSON.stringify(data),
+  };
+}
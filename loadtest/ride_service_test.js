@@ -1,6 +1,7 @@
 import http from 'k6/http';
 import { sleep, check } from 'k6';
 import { Rate } from 'k6/metrics';
+import { randomDriver, setupDrivers } from './drivers.js';
 
 // Custom metrics
 const errorRate = new Rate('errors');
@@ -19,8 +20,13 @@ export let options = {
 };
 
 const BASE_URL = __ENV.RIDE_SERVICE_URL || 'http://ride-service:80';
+const DRIVERS = parseInt(__ENV.DRIVERS || '200');
 
-export default function () {
+export function setup() {
+  return { driverIds: setupDrivers(DRIVERS) };
+}
+
+export default function (data) {
   // Generate random ride data
   const cities = ['Bangalore', 'Mumbai', 'Delhi', 'Hyderabad', 'Chennai'];
   const pickups = ['Koramangala', 'HSR Layout', 'Whitefield', 'Indiranagar', 'Marathahalli'];
@@ -32,7 +38,7 @@ export default function () {
   
   const payload = JSON.stringify({
     rider_id: Math.floor(Math.random() * 10) + 1,
-    driver_id: Math.floor(Math.random() * 5) + 1,
+    driver_id: randomDriver(data.driverIds),
     pickup: pickup,
     drop: drop,
     city: city,
@@ -49,6 +55,12 @@ export default function () {
 
   const response = http.post(`${BASE_URL}/ride/start`, payload, params);
   
+  // 409: the driver is on another ride, which is expected under load
+  if (response.status === 409) {
+    sleep(1);
+    return;
+  }
+
   const success = check(response, {
     'status is 200': (r) => r.status === 200,
     'response has ride_id': (r) => {
@@ -62,8 +74,13 @@ export default function () {
   });
 
   errorRate.add(!success);
-  
+
   sleep(1);
+
+  // Finish the ride so the driver can be booked again
+  if (success) {
+    http.post(`${BASE_URL}/ride/${JSON.parse(response.body).ride_id}/complete`, null, { tags: { name: 'CompleteRide' } });
+  }
 }
 
 export function handleSummary(data) {
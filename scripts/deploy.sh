@@ -99,7 +99,7 @@ echo -e "${GREEN}✓ Secrets created${NC}"
 echo -e "${BLUE}Building Docker images...${NC}"
 read -p "Docker registry URL (e.g., your-registry.com): " REGISTRY
 
-SERVICES=("user-service" "driver-service" "ride-service" "payment-service")
+SERVICES=("db-migrations" "user-service" "driver-service" "ride-service" "payment-service")
 
 for service in "${SERVICES[@]}"; do
     echo "Building $service..."